@@ -0,0 +1,205 @@
+"""
+Потоковий експорт вимірювань (GET /export).
+
+CSV формує сам PostgreSQL — COPY (SELECT …) TO STDOUT; Python лише
+переносить байти з з'єднання у відповідь (за потреби стискає gzip або
+перекодовує в Parquet по record batch). COPY пише в pipe у фоновому
+потоці, відповідь читає його шматками: пам'ять не залежить від довжини
+періоду, а повільний клієнт пригальмовує COPY замість накопичувати дані.
+
+Період ріжеться на добові вікна UTC (як партиції measurements) —
+кожен COPY сортує не більше однієї доби.
+
+Розкладка:
+    long  time, channel_id, value — рядок на вимірювання (як GET /data Outbound)
+    wide  time, <канал>, <канал>, … — рядок на момент часу; порожня клітинка —
+          значення в цей момент не записувалось (deadband) або null
+"""
+
+import io
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Iterator
+
+from psycopg2 import sql
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:     # Parquet — опційно (pip install pyarrow)
+    pa = None
+
+LAYOUTS = ("long", "wide")
+FORMATS = ("csv", "csv.gz", "parquet")
+MEDIA_TYPES = {
+    "csv":     "text/csv; charset=utf-8",
+    "csv.gz":  "application/gzip",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+_CHUNK = 256 * 1024
+# Час у CSV — як у API (ISO 8601 UTC з мілісекундами); у Parquet — мікросекунди епохи
+_TIME_ISO = "to_char(m.time AT TIME ZONE 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS.MS\"Z\"')"
+_TIME_US = "(extract(epoch FROM m.time) * 1000000)::bigint"
+
+
+def day_windows(from_: datetime, to: datetime) -> list[tuple[datetime, datetime]]:
+    """[from_, to) → добові вікна по межах UTC-діб."""
+    out = []
+    lo = from_
+    while lo < to:
+        midnight = lo.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        hi = min(midnight + timedelta(days=1), to)
+        out.append((lo, hi))
+        lo = hi
+    return out
+
+
+def column_names(layout: str, channels: list[tuple[int, str]]) -> list[str]:
+    """Заголовок: long — фіксований; wide — "<channel_id>_<назва>" на канал."""
+    if layout == "long":
+        return ["time", "channel_id", "value"]
+    return ["time"] + [f"{cid}_{name}" for cid, name in channels]
+
+
+def copy_statements(cur, layout: str, channels: list[tuple[int, str]],
+                    from_: datetime, to: datetime, parquet: bool = False) -> list[str]:
+    """
+    COPY на кожне добове вікно. HEADER — лише в першому (CSV);
+    Parquet отримує назви колонок окремо.
+    """
+    time_expr = _TIME_US if parquet else _TIME_ISO
+    ids = [cid for cid, _ in channels]
+    if layout == "long":
+        select = (f"SELECT {time_expr} AS time, m.channel_id, m.value "
+                  f"FROM measurements_all m "
+                  f"WHERE m.time >= %(lo)s AND m.time < %(hi)s AND m.channel_id = ANY(%(ids)s) "
+                  f"ORDER BY m.time, m.channel_id")
+    else:
+        names = column_names(layout, channels)[1:]
+        cols = ", ".join(
+            f"max(m.value) FILTER (WHERE m.channel_id = {int(cid)}) AS "
+            f"{sql.Identifier(name).as_string(cur)}"
+            for cid, name in zip(ids, names))
+        select = (f"SELECT {time_expr} AS time, {cols} "
+                  f"FROM measurements_all m "
+                  f"WHERE m.time >= %(lo)s AND m.time < %(hi)s AND m.channel_id = ANY(%(ids)s) "
+                  f"GROUP BY m.time ORDER BY m.time")
+    out = []
+    for i, (lo, hi) in enumerate(day_windows(from_, to)):
+        query = cur.mogrify(select, {"lo": lo, "hi": hi, "ids": ids}).decode()
+        header = ", HEADER" if i == 0 and not parquet else ""
+        out.append(f"COPY ({query}) TO STDOUT WITH (FORMAT csv{header})")
+    return out
+
+
+@contextmanager
+def copy_pipe(conn, statements: list[str]) -> Iterator[io.BufferedReader]:
+    """
+    Виконує COPY у фоновому потоці в pipe; повертає кінець pipe для читання.
+
+    Читач закрив pipe раніше (клієнт відключився) — запит скасовується.
+    Помилка COPY після повного читання піднімається тут.
+    """
+    r, w = os.pipe()
+    errors: list[Exception] = []
+
+    def run():
+        try:
+            with os.fdopen(w, "wb") as out, conn.cursor() as cur:
+                for statement in statements:
+                    cur.copy_expert(statement, out)
+        except Exception as e:
+            errors.append(e)
+
+    worker = threading.Thread(target=run, name="export-copy", daemon=True)
+    worker.start()
+    src = os.fdopen(r, "rb")
+    cancelled = False
+    try:
+        yield src
+    finally:
+        src.close()
+        if worker.is_alive():
+            cancelled = True
+            conn.cancel()
+        worker.join()
+    # Читач зупинився раніше: BrokenPipe / скасований запит — очікувані
+    if errors and not cancelled and not isinstance(errors[0], BrokenPipeError):
+        raise errors[0]
+
+
+def csv_chunks(src: io.BufferedReader, gzip: bool = False) -> Iterator[bytes]:
+    """CSV з pipe шматками по _CHUNK; gzip — стиснення на льоту (формат .gz)."""
+    comp = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    while True:
+        data = src.read(_CHUNK)
+        if not data:
+            break
+        if comp is not None:
+            data = comp.compress(data)
+            if not data:
+                continue
+        yield data
+    if comp is not None:
+        yield comp.flush()
+
+
+class _Sink(io.RawIOBase):
+    """Файл для ParquetWriter: записане забирається шматками через take()."""
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._parts.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def parquet_chunks(src: io.BufferedReader, columns: list[str]) -> Iterator[bytes]:
+    """
+    CSV з pipe (без заголовка, перша колонка — мікросекунди епохи) → Parquet:
+    один row group на record batch, відданий клієнту одразу після запису.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow не встановлено")
+    ts = pa.timestamp("us", tz="UTC")
+    types = {name: pa.float64() for name in columns}
+    types[columns[0]] = pa.int64()
+    if "channel_id" in types:
+        types["channel_id"] = pa.int32()
+    schema = pa.schema([(name, ts if i == 0 else types[name]) for i, name in enumerate(columns)])
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    # Порожній період: open_csv не приймає порожній потік — лише схема без row group
+    if src.peek(1):
+        reader = pa_csv.open_csv(
+            src,
+            read_options=pa_csv.ReadOptions(column_names=columns, block_size=4 << 20),
+            convert_options=pa_csv.ConvertOptions(column_types=types),
+        )
+        for batch in reader:
+            arrays = [batch.column(0).cast(ts)] + batch.columns[1:]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            data = sink.take()
+            if data:
+                yield data
+    writer.close()
+    yield sink.take()
@@ -1,15 +1,108 @@
 """
-FastAPI: експорт даних (CSV), керування та статус системи.
+FastAPI: експорт даних (CSV/Parquet), керування та статус системи.
+
+Запуск (з auto_telemetry/): python -m uvicorn api.main:app --port 8000
 """
 
-from fastapi import FastAPI
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+_ROOT = Path(__file__).parent.parent
+
+import psycopg2
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from api import export
+
+load_dotenv(_ROOT / ".env")
 
 app = FastAPI(title="Auto Telemetry API")
 
 
+def _dsn() -> str:
+    return (
+        f"host={os.getenv('DB_HOST', 'localhost')} "
+        f"port={os.getenv('DB_PORT', '5432')} "
+        f"dbname={os.getenv('DB_NAME', 'telemetry')} "
+        f"user={os.getenv('DB_USER', 'telemetry')} "
+        f"password={os.getenv('DB_PASSWORD', '')}"
+    )
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
-# TODO: ендпоінти для вивантаження CSV за період та керування
+@app.get("/export")
+def export_data(
+    from_:      datetime  = Query(..., alias="from"),
+    to:         datetime  = Query(...),
+    channel_id: list[int] = Query([]),
+    layout:     str       = Query("long"),
+    format:     str       = Query("csv"),
+):
+    """
+    Вимірювання за [from, to) потоком з PostgreSQL (api/export.py).
+
+    layout: long (time, channel_id, value) | wide (колонка на канал);
+    format: csv | csv.gz | parquet (потребує pyarrow).
+    channel_id — можна кілька; без нього — усі канали channel_config.
+    """
+    if from_.tzinfo is None:
+        from_ = from_.replace(tzinfo=timezone.utc)
+    if to.tzinfo is None:
+        to = to.replace(tzinfo=timezone.utc)
+    if from_ >= to:
+        raise HTTPException(status_code=400, detail="from must be before to")
+    if layout not in export.LAYOUTS:
+        raise HTTPException(status_code=400, detail=f"layout: {' | '.join(export.LAYOUTS)}")
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format: {' | '.join(export.FORMATS)}")
+    if format == "parquet" and export.pa is None:
+        raise HTTPException(status_code=501, detail="Parquet недоступний: pyarrow не встановлено")
+
+    try:
+        conn = psycopg2.connect(_dsn())
+    except Exception:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT channel_id, name FROM channel_config "
+                "WHERE %(all)s OR channel_id = ANY(%(ids)s) ORDER BY channel_id",
+                {"all": not channel_id, "ids": channel_id},
+            )
+            channels = cur.fetchall()
+            if not channels:
+                raise HTTPException(status_code=404, detail="Канали не знайдено")
+            parquet = format == "parquet"
+            statements = export.copy_statements(cur, layout, channels, from_, to, parquet)
+        conn.commit()
+    except BaseException:
+        conn.close()
+        raise
+
+    columns = export.column_names(layout, channels)
+
+    def body():
+        try:
+            with export.copy_pipe(conn, statements) as src:
+                if parquet:
+                    yield from export.parquet_chunks(src, columns)
+                else:
+                    yield from export.csv_chunks(src, gzip=format == "csv.gz")
+        finally:
+            conn.close()
+
+    utc = timezone.utc
+    stamp = f"{from_.astimezone(utc):%Y%m%dT%H%M%S}-{to.astimezone(utc):%Y%m%dT%H%M%S}"
+    return StreamingResponse(
+        body(),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition":
+                 f'attachment; filename="measurements_{layout}_{stamp}.{format}"'},
+    )
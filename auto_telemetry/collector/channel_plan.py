@@ -0,0 +1,70 @@
+import threading
+
+from db import ChannelConfig
+
+
+class ChannelPlan:
+    """
+    План декодування: увімкнені канали, згруповані за модулями.
+
+    Оновлюється диффом на місці (ConfigListener) — перебудовуються лише списки
+    модулів, яких торкнулась зміна. Цикл опитування бере знімок під lock.
+    """
+
+    def __init__(self, configs: list[ChannelConfig]):
+        self._lock = threading.Lock()
+        self._by_id: dict[int, ChannelConfig] = {}
+        self._by_module: dict[str, list[ChannelConfig]] = {}
+        self._ids: tuple[int, ...] = ()
+        self.apply({c.channel_id: c for c in configs}, full=True)
+
+    def apply(self, changed: dict[int, ChannelConfig | None], full: bool = False) -> list[int]:
+        """
+        Застосувати зміни {channel_id: config | None (прибрати)}.
+
+        full=True — changed містить повний набір, відсутні канали прибираються.
+        Повертає channel_id, конфіг яких дійсно змінився.
+        """
+        with self._lock:
+            if full:
+                changed = {**{cid: None for cid in self._by_id}, **changed}
+            diff = [cid for cid, cfg in changed.items() if self._by_id.get(cid) != cfg]
+            modules: set[str] = set()
+            for cid in diff:
+                old = self._by_id.pop(cid, None)
+                new = changed[cid]
+                if old is not None:
+                    modules.add(old.module)
+                if new is not None:
+                    self._by_id[cid] = new
+                    modules.add(new.module)
+            for module in modules:
+                cfgs = sorted((c for c in self._by_id.values() if c.module == module),
+                              key=lambda c: c.channel_id)
+                if cfgs:
+                    self._by_module[module] = cfgs
+                else:
+                    self._by_module.pop(module, None)
+            if diff:
+                self._ids = tuple(sorted(self._by_id))
+        return diff
+
+    def for_modules(self, modules) -> list[ChannelConfig]:
+        """Канали вказаних модулів (знімок для одного тіку)."""
+        with self._lock:
+            return [c for m in modules for c in self._by_module.get(m, ())]
+
+    def configs(self) -> list[ChannelConfig]:
+        with self._lock:
+            return sorted(self._by_id.values(), key=lambda c: c.channel_id)
+
+    def channel_ids(self) -> tuple[int, ...]:
+        """Відсортовані channel_id — розкладка рядка measurements_wide."""
+        return self._ids
+
+    def modules(self) -> set[str]:
+        with self._lock:
+            return set(self._by_module)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
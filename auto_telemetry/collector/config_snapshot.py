@@ -0,0 +1,52 @@
+"""
+Локальний знімок channel_config для холодного старту без БД.
+
+Колектор пише знімок після кожного успішного завантаження/зміни конфігу
+і стартує з нього, якщо PostgreSQL ще недоступний (після power cycle).
+"""
+
+import dataclasses
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+from db import ChannelConfig
+
+logger = logging.getLogger(__name__)
+
+_FIELDS = {f.name for f in dataclasses.fields(ChannelConfig)}
+
+
+def save_snapshot(path: Path, configs: list[ChannelConfig]) -> None:
+    """Атомарний запис (tmp + rename): обрив живлення не лишить половину файлу."""
+    payload = {
+        'saved_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'channels': [dataclasses.asdict(c) for c in configs],
+    }
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.error('Знімок конфігу не збережено (%s): %s', path, e)
+
+
+def load_snapshot(path: Path) -> list[ChannelConfig] | None:
+    """Знімок з диску або None (немає / пошкоджений)."""
+    try:
+        payload = json.loads(path.read_text(encoding='utf-8'))
+        configs = [ChannelConfig(**{k: v for k, v in ch.items() if k in _FIELDS})
+                   for ch in payload['channels']]
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.error('Знімок конфігу пошкоджено (%s): %s', path, e)
+        return None
+    logger.info('Знімок конфігу: %d каналів, збережено %s', len(configs), payload.get('saved_at'))
+    return configs
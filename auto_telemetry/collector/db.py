@@ -8,8 +8,13 @@ from datetime import datetime
 import psycopg2
 import psycopg2.extras
 
+from notify_batch import NotifyBatch
+
 logger = logging.getLogger(__name__)
 
+# Маркер «значення не записано» у measurements_wide.vals
+_NOT_STORED = float('nan')
+
 
 @dataclass(frozen=True)
 class ChannelConfig:
@@ -21,17 +26,27 @@ class ChannelConfig:
     raw_max: float
     phys_min: float
     phys_max: float
+    # Політика зберігання (deadband); NULL → зберігати кожен цикл
+    deadband_abs: float | None = None
+    deadband_rel: float | None = None
+    heartbeat_sec: float | None = None
+    # Мінімальний інтервал між записами в БД; NULL → кожне опитування модуля
+    store_period_sec: float | None = None
 
 
-def load_channel_configs(conn) -> list[ChannelConfig]:
+def load_channel_configs(conn, channel_ids=None) -> list[ChannelConfig]:
+    """Увімкнені канали; channel_ids — обмежити вибірку (інкрементальне оновлення)."""
+    ids_filter = 'AND channel_id = ANY(%(ids)s)' if channel_ids is not None else ''
     with conn.cursor() as cur:
-        cur.execute("""
+        cur.execute(f"""
             SELECT channel_id, module, channel_index, signal_type,
-                   raw_min, raw_max, phys_min, phys_max
+                   raw_min, raw_max, phys_min, phys_max,
+                   deadband_abs, deadband_rel, heartbeat_sec, store_period_sec
             FROM channel_config
             WHERE enabled = TRUE
+            {ids_filter}
             ORDER BY channel_id
-        """)
+        """, {'ids': list(channel_ids or ())})
         return [ChannelConfig(*row) for row in cur.fetchall()]
 
 
@@ -49,32 +64,160 @@ def batch_insert(conn, cycle_time: datetime, readings: list[dict]) -> None:
     conn.commit()
 
 
+def ensure_layout(conn, channel_ids: tuple[int, ...]) -> int:
+    """layout_id розкладки measurements_wide для набору каналів (створює, якщо немає)."""
+    with conn.cursor() as cur:
+        # DO UPDATE (а не DO NOTHING) — щоб RETURNING повернув існуючий рядок
+        cur.execute("""
+            INSERT INTO measurement_layouts (channel_ids) VALUES (%s)
+            ON CONFLICT (channel_ids) DO UPDATE SET channel_ids = EXCLUDED.channel_ids
+            RETURNING layout_id
+        """, (list(channel_ids),))
+        layout_id = cur.fetchone()[0]
+    conn.commit()
+    return layout_id
+
+
+class WideWriter:
+    """
+    Широкий формат (STORAGE_LAYOUT=wide): один рядок measurements_wide на цикл.
+
+    vals[i] — значення каналу channel_ids[i]; NaN — канал у цьому рядку
+    не записувався (не опитувався в тіку або відсіяний StoragePolicy),
+    NULL — помилка читання. layout_id кешується на набір каналів.
+    """
+
+    def __init__(self):
+        self._layouts: dict[tuple[int, ...], tuple[int, dict[int, int]]] = {}
+
+    def insert(self, conn, cycle_time: datetime, channel_ids: tuple[int, ...],
+               readings: list[dict]) -> None:
+        if not readings:
+            return
+        cached = self._layouts.get(channel_ids)
+        if cached is None:
+            cached = (ensure_layout(conn, channel_ids),
+                      {cid: i for i, cid in enumerate(channel_ids)})
+            self._layouts[channel_ids] = cached
+        layout_id, pos = cached
+        vals = [_NOT_STORED] * len(channel_ids)
+        for r in readings:
+            i = pos.get(r['channel_id'])   # канал додано/прибрано посеред тіку
+            if i is not None:
+                vals[i] = r['value']
+        with conn.cursor() as cur:
+            cur.execute(
+                'INSERT INTO measurements_wide (time, layout_id, vals) VALUES (%s, %s, %s::float8[])',
+                (cycle_time, layout_id, vals),
+            )
+        conn.commit()
+
+
 class ConfigListener(threading.Thread):
     """
-    Фоновий потік: LISTEN config_changed → on_change().
-    При розриві з'єднання автоматично перепідключається.
+    Фоновий потік: LISTEN config_changed → on_change(changed, full).
+
+    Повідомлення об'єднуються (NotifyBatch), змінені рядки дочитуються на тому ж
+    з'єднанні: changed = {channel_id: ChannelConfig | None (вимкнено/видалено)}.
+    Після (пере)підключення — повне завантаження з full=True, бо повідомлення
+    за час розриву втрачено.
     """
 
-    def __init__(self, dsn: str, on_change):
+    def __init__(self, dsn: str, on_change, debounce: float = 0.3, max_delay: float = 2.0):
         super().__init__(daemon=True, name='config-listener')
         self._dsn = dsn
         self._on_change = on_change
+        self._debounce = debounce
+        self._max_delay = max_delay
 
     def run(self):
         while True:
+            conn = None
             try:
                 conn = psycopg2.connect(self._dsn)
                 conn.set_isolation_level(0)  # autocommit — обов'язково для LISTEN
                 with conn.cursor() as cur:
                     cur.execute('LISTEN config_changed;')
                 logger.info('ConfigListener: LISTEN config_changed')
-                while True:
-                    if select.select([conn], [], [], 5.0)[0]:
-                        conn.poll()
-                        while conn.notifies:
-                            n = conn.notifies.pop()
-                            logger.info('pg_notify config_changed: channel_id=%s', n.payload)
-                            self._on_change()
+                self._apply(conn, set(), full=True)
+                self._listen(conn)
             except Exception as e:
                 logger.error('ConfigListener: %s — reconnect in 5s', e)
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
                 time.sleep(5)
+
+    def _listen(self, conn) -> None:
+        batch = NotifyBatch(self._debounce, self._max_delay)
+        while True:
+            deadline = batch.deadline()
+            timeout = 5.0 if deadline is None else max(0.0, deadline - time.monotonic())
+            if select.select([conn], [], [], timeout)[0]:
+                conn.poll()
+                now = time.monotonic()
+                for n in conn.notifies:
+                    batch.add(n.payload, now)
+                conn.notifies.clear()
+            deadline = batch.deadline()
+            if deadline is not None and time.monotonic() >= deadline:
+                ids, full = batch.take()
+                self._apply(conn, ids, full)
+
+    def _apply(self, conn, ids: set[int], full: bool) -> None:
+        rows = load_channel_configs(conn, None if full else ids)
+        changed: dict[int, ChannelConfig | None] = {cid: None for cid in ids}
+        changed.update((c.channel_id, c) for c in rows)
+        logger.info('ConfigListener: %s', 'повне завантаження channel_config' if full
+                    else f'config_changed channel_id={sorted(ids)}')
+        self._on_change(changed, full)
+
+
+class PartitionMaintainer(threading.Thread):
+    """
+    Фоновий потік: денні партиції measurements наперед і retention
+    через DROP цілих партицій (SQL-функції ensure_/drop_old_measurement_partitions).
+
+    Окреме з'єднання на кожен прохід — DROP бере ACCESS EXCLUSIVE на
+    measurements лише на мить і не чіпає з'єднання циклу опитування.
+    local_retention_days — видаляється тільки підтверджене Fleet Server
+    (POST /sync/ack) і старше за N діб, до першого підтвердження — нічого;
+    None — підтвердження ігноруються, діє retention_days (0 — не видаляти).
+    """
+
+    def __init__(self, dsn: str, days_ahead: int, retention_days: int,
+                 local_retention_days: int | None = None, interval: float = 3600.0):
+        super().__init__(daemon=True, name='partition-maintainer')
+        self._dsn = dsn
+        self._days_ahead = days_ahead
+        self._retention_days = retention_days
+        self._local_retention_days = local_retention_days
+        self._interval = interval
+
+    def run(self):
+        while True:
+            try:
+                created, dropped = self.run_once()
+                if created or dropped:
+                    logger.info('Партиції measurements: створено %d, видалено %d', created, dropped)
+                delay = self._interval
+            except Exception as e:
+                logger.error('PartitionMaintainer: %s — повтор через 60s', e)
+                delay = 60.0
+            time.sleep(delay)
+
+    def run_once(self) -> tuple[int, int]:
+        conn = psycopg2.connect(self._dsn, connect_timeout=5)
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT ensure_measurement_partitions(%s)', (self._days_ahead,))
+                created = cur.fetchone()[0]
+                cur.execute('SELECT drop_old_measurement_partitions(%s, %s)',
+                            (self._retention_days, self._local_retention_days))
+                dropped = cur.fetchone()[0]
+            conn.commit()
+        finally:
+            conn.close()
+        return created, dropped
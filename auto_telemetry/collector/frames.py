@@ -0,0 +1,78 @@
+"""
+Компактний бінарний формат пакета шини даних (ADR-001, topic b'bdata').
+
+Модуль самодостатній (тільки stdlib) — його імпортують і колектор,
+і підписники (portal, monitor): `from collector.frames import decode_frame`.
+
+Розкладка (little-endian):
+    header  16 байт  magic b'TF' | version u8 | reserved u8 | count u32 | cycle_time_ns i64
+    values  count × f64   нормалізовані значення; NaN = null
+    ids     count × u16   channel_id у тому ж порядку
+"""
+
+import math
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta, timezone
+
+TOPIC_JSON = b'data'
+# Не може починатись з b'data' — SUB-фільтр ZeroMQ префіксний
+TOPIC_BINARY = b'bdata'
+
+MAGIC = b'TF'
+VERSION = 1
+
+_HEADER = struct.Struct('<2sBxIq')
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_NAN = float('nan')
+_SWAP = sys.byteorder != 'little'
+
+
+def datetime_to_ns(dt: datetime) -> int:
+    """timezone-aware datetime → наносекунди від епохи (без втрати мікросекунд)."""
+    return (dt - _EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def ns_to_iso(ns: int) -> str:
+    """Наносекунди від епохи → ISO 8601 UTC з мілісекундами (як cycle_time у JSON)."""
+    dt = _EPOCH + timedelta(microseconds=ns // 1000)
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.') + f'{dt.microsecond // 1000:03d}Z'
+
+
+def encode_frame(cycle_time_ns: int, readings: list[dict]) -> bytes:
+    """readings [{channel_id, value|None}] → бінарний пакет."""
+    values = array('d', [_NAN if r['value'] is None else r['value'] for r in readings])
+    ids = array('H', [r['channel_id'] for r in readings])
+    if _SWAP:
+        values.byteswap()
+        ids.byteswap()
+    return _HEADER.pack(MAGIC, VERSION, len(ids), cycle_time_ns) + values.tobytes() + ids.tobytes()
+
+
+def decode_frame(buf: bytes) -> tuple[int, array, array]:
+    """
+    Бінарний пакет → (cycle_time_ns, ids: array('H'), values: array('d')).
+
+    NaN у values означає null. Raises ValueError для чужого/пошкодженого пакета.
+    """
+    if len(buf) < _HEADER.size:
+        raise ValueError('frame too short')
+    magic, version, count, cycle_time_ns = _HEADER.unpack_from(buf)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'unsupported frame: magic={magic!r} version={version}')
+    end_values = _HEADER.size + count * 8
+    if len(buf) != end_values + count * 2:
+        raise ValueError('frame length mismatch')
+    values = array('d', buf[_HEADER.size:end_values])
+    ids = array('H', buf[end_values:])
+    if _SWAP:
+        values.byteswap()
+        ids.byteswap()
+    return cycle_time_ns, ids, values
+
+
+def iter_readings(ids: array, values: array):
+    """Пари (channel_id, value|None) — NaN перетворюється на None."""
+    for cid, v in zip(ids, values):
+        yield cid, None if math.isnan(v) else v
@@ -9,9 +9,8 @@ Collector — сервіс збору даних.
 
 import logging
 import sys
-import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
 
@@ -20,11 +19,19 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 import psycopg2
 
-from db import ChannelConfig, ConfigListener, batch_insert, load_channel_configs
-from modbus_reader import ModbusModule, decode_et7017, decode_et7284
-from normalizer import normalize
+from channel_plan import ChannelPlan
+from config_snapshot import load_snapshot, save_snapshot
+from db import (ChannelConfig, ConfigListener, PartitionMaintainer, WideWriter, batch_insert,
+                load_channel_configs)
+from frames import datetime_to_ns
+from metrics import Metrics, serve_metrics
+from modbus_reader import MODULE_TYPES, ModbusConnection, ReadBlock, plan_reads
+from pipeline import normalize_cycle
 from publisher import Publisher
+from scheduler import RateScheduler
 from settings import Settings, load_settings
+from shm_ring import RingWriter
+from storage_policy import StoragePolicy
 
 logging.basicConfig(
     level=logging.INFO,
@@ -35,31 +42,37 @@ logger = logging.getLogger('collector')
 
 # ── Допоміжні функції ──────────────────────────────────────────────────────────
 
-def _extract_raw(cfg: ChannelConfig,
-                 r1: list[int] | None,
-                 r2: list[int] | None,
-                 r3: list[int] | None) -> int | float | None:
-    """Повертає сире значення каналу з відповідного набору регістрів."""
-    if cfg.module == 'et7017_1':
-        return decode_et7017(r1, cfg.channel_index)
-    if cfg.module == 'et7017_2':
-        return decode_et7017(r2, cfg.channel_index)
-    if cfg.module == 'et7284':
-        return decode_et7284(r3, cfg.channel_index)
-    logger.error('Невідомий модуль: %s (channel_id=%d)', cfg.module, cfg.channel_id)
-    return None
+def _read_blocks(conn: ModbusConnection, blocks: list[ReadBlock],
+                 metrics: Metrics) -> dict[str, list[int] | None]:
+    """Послідовно читає блоки одного з'єднання → регістри кожного модуля."""
+    regs: dict[str, list[int] | None] = {}
+    for b in blocks:
+        t = time.perf_counter()
+        registers = conn.read_input_registers(b.unit_id, b.address, b.count)
+        metrics.observe(f'modbus_rtt.{b.name}', time.perf_counter() - t)
+        if registers is None:
+            metrics.inc(f'modbus_errors.{b.name}')
+        regs.update(b.split(registers))
+    return regs
+
+
+def _warn_unknown_modules(configs, decoders) -> None:
+    for cfg in configs:
+        if cfg.module not in decoders:
+            logger.error('Невідомий модуль: %s (channel_id=%d)', cfg.module, cfg.channel_id)
 
 
-def _connect_db(dsn: str):
+def _connect_db(dsn: str, attempts: int = 5):
     """Підключитися до БД з ретраями. Повертає з'єднання або None."""
-    for attempt in range(1, 6):
+    for attempt in range(1, attempts + 1):
         try:
-            conn = psycopg2.connect(dsn)
+            conn = psycopg2.connect(dsn, connect_timeout=5)
             logger.info('DB підключено')
             return conn
         except Exception as e:
             logger.error('DB підключення #%d: %s', attempt, e)
-            time.sleep(5)
+            if attempt < attempts:
+                time.sleep(5)
     logger.critical('DB недоступна — продовжую без запису в БД')
     return None
 
@@ -69,85 +82,149 @@ def _connect_db(dsn: str):
 def main():
     s: Settings = load_settings()
 
-    # ── БД ──────────────────────────────────────────────────────────────────
-    db_conn = _connect_db(s.dsn)
-    if db_conn is None:
-        logger.critical('Неможливо стартувати без БД (потрібна channel_config)')
-        sys.exit(1)
+    # ── БД / знімок конфігу ─────────────────────────────────────────────────
+    # Є локальний знімок → опитування стартує одразу, без очікування БД:
+    # з'єднання для запису — у фоні (як перепідключення в циклі), звірка
+    # з channel_config — у ConfigListener, щойно БД стане доступною
+    snapshot = load_snapshot(s.config_snapshot_path)
+    if snapshot is not None:
+        logger.info('Старт зі знімка конфігу, БД — у фоні')
+        configs: list[ChannelConfig] = snapshot
+        db_conn = None
+    else:
+        db_conn = _connect_db(s.dsn)
+        if db_conn is None:
+            logger.critical('Неможливо стартувати без БД (потрібна channel_config)')
+            sys.exit(1)
+        configs = load_channel_configs(db_conn)
+        save_snapshot(s.config_snapshot_path, configs)
 
-    configs: list[ChannelConfig] = load_channel_configs(db_conn)
     if not configs:
         logger.warning('channel_config порожня — жодного каналу не завантажено')
     else:
         logger.info('Завантажено %d каналів', len(configs))
 
-    configs_lock = threading.Lock()
+    plan = ChannelPlan(configs)
+    policy = StoragePolicy()
+    if s.storage_layout not in ('narrow', 'wide'):
+        logger.critical('Невідомий STORAGE_LAYOUT=%s (narrow | wide)', s.storage_layout)
+        sys.exit(1)
+    wide = WideWriter() if s.storage_layout == 'wide' else None
 
-    def reload_configs():
-        nonlocal configs
+    # ── Метрики ─────────────────────────────────────────────────────────────
+    metrics = Metrics()
+    if s.metrics_port:
         try:
-            with psycopg2.connect(s.dsn) as c:
-                new = load_channel_configs(c)
-            with configs_lock:
-                configs = new
-            logger.info('Конфіги перезавантажено: %d каналів', len(new))
-        except Exception as e:
-            logger.error('Перезавантаження конфігів не вдалося: %s', e)
-
-    ConfigListener(s.dsn, reload_configs).start()
+            serve_metrics(metrics, s.metrics_port)
+        except OSError as e:
+            logger.error('Ендпоінт метрик :%d не запущено: %s', s.metrics_port, e)
 
     # ── ZeroMQ ──────────────────────────────────────────────────────────────
-    pub = Publisher(s.zmq_pub_address)
-    logger.info('ZeroMQ PUB: bind %s', s.zmq_pub_address)
+    pub = Publisher(s.zmq_pub_address, binary=s.zmq_binary)
+    logger.info('ZeroMQ PUB: bind %s%s', s.zmq_pub_address,
+                ' (+ бінарний topic bdata)' if s.zmq_binary else '')
+
+    # ── Кільце останніх циклів (mmap) — для локальних читачів без ZeroMQ і БД ──
+    ring = None
+    if s.ring_slots:
+        try:
+            ring = RingWriter(s.ring_path, s.ring_slots, s.ring_channels)
+            logger.info('Кільце циклів: %s (%d циклів × %d каналів)',
+                        s.ring_path, s.ring_slots, s.ring_channels)
+        except (OSError, ValueError) as e:
+            logger.error('Кільце циклів %s не створено: %s', s.ring_path, e)
 
     # ── Modbus модулі ────────────────────────────────────────────────────────
+    # Реєстр модулів (config.txt) → FC04 блоки; суміжні діапазони одного
+    # host:port:unit з однаковою частотою читаються одним запитом
+    unknown = [m.name for m in s.modules if m.type not in MODULE_TYPES]
+    if unknown or not s.modules:
+        logger.critical('Невідомий тип модуля або порожній MODBUS_MODULES: %s', unknown)
+        sys.exit(1)
+    decoders = {m.name: MODULE_TYPES[m.type].decode for m in s.modules}
+    blocks = {b.name: b for b in plan_reads(s.modules, s.coalesce_gap)}
     kw = dict(timeout=s.modbus_timeout, reconnect_delay=s.reconnect_delay)
-    mod1 = ModbusModule('ET7017_1', s.et7017_1_ip, s.et7017_1_port, s.et7017_1_unit_id, **kw)
-    mod2 = ModbusModule('ET7017_2', s.et7017_2_ip, s.et7017_2_port, s.et7017_2_unit_id, **kw)
-    mod3 = ModbusModule('ET7284',   s.et7284_ip,   s.et7284_port,   s.et7284_unit_id,   **kw)
-
-    cycle_interval = 1.0 / s.polling_hz
-    logger.info('Collector запущено: %.1f Гц', s.polling_hz)
-
-    executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix='modbus')
+    connections: dict[tuple[str, int], ModbusConnection] = {}
+    for b in blocks.values():
+        if (b.ip, b.port) not in connections:
+            connections[(b.ip, b.port)] = ModbusConnection(f'{b.ip}:{b.port}', b.ip, b.port, **kw)
+    for b in blocks.values():
+        logger.info('FC04 блок %s: %s:%d unit=%d адреси %d..%d, %g Гц',
+                    b.name, b.ip, b.port, b.unit_id, b.address, b.address + b.count - 1, b.poll_hz)
+
+    periods = {name: 1.0 / b.poll_hz for name, b in blocks.items()}
+    scheduler = RateScheduler(periods, time.monotonic())
+    min_period = min(periods.values())
+    _warn_unknown_modules(configs, decoders)
+    logger.info('Collector запущено: %d модулів, %d FC04 блоків, %d з\'єднань',
+                len(decoders), len(blocks), len(connections))
+
+    # ── Оновлення конфігу (pg_notify, дифф по channel_id) ────────────────────
+    def on_config_change(changed: dict[int, ChannelConfig | None], full: bool):
+        diff = plan.apply(changed, full)
+        for cid in diff:
+            policy.forget(cid)
+        _warn_unknown_modules([c for c in changed.values() if c is not None], decoders)
+        if diff:
+            logger.info('Конфіги оновлено: змінено %d, активних %d каналів', len(diff), len(plan))
+            save_snapshot(s.config_snapshot_path, plan.configs())
+
+    ConfigListener(s.dsn, on_config_change).start()
+    # Денні партиції measurements наперед + retention через DROP партицій
+    # (з урахуванням підтверджень Fleet Server, POST /sync/ack)
+    PartitionMaintainer(s.dsn, s.partitions_ahead, s.retention_days,
+                        s.local_retention_days).start()
+
+    # Потік на з'єднання: з'єднання не потокобезпечне, різні host — паралельно
+    executor = ThreadPoolExecutor(max_workers=len(connections), thread_name_prefix='modbus')
+    # Перепідключення до БД — у фоні, цикл опитування на ньому не блокується
+    db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-connect')
+    db_connecting: Future | None = None
+    db_retry_at = 0.0
 
     # ── Цикл опитування ──────────────────────────────────────────────────────
+    # Один тік = блоки, чий період настав; решта каналів у тіку не фігурує
     while True:
+        delay = scheduler.next_deadline() - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
         t0 = time.monotonic()
+        due, lag = scheduler.due(t0)
+        if lag > 0.5 * min_period:
+            metrics.inc('late_ticks')
+            logger.warning('Цикл затримався на %.3f с', lag)
         cycle_time = datetime.now(timezone.utc)
-        cycle_time_iso = cycle_time.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
-
-        # 1. Читання модулів (паралельно — timeout одного не блокує інші)
-        f1 = executor.submit(mod1.read_et7017)
-        f2 = executor.submit(mod2.read_et7017)
-        f3 = executor.submit(mod3.read_et7284)
-        r1 = f1.result()
-        r2 = f2.result()
-        r3 = f3.result()
-
-        # 2. Нормалізація
-        with configs_lock:
-            snapshot = list(configs)
-
-        readings: list[dict] = []
-        for cfg in snapshot:
-            raw = _extract_raw(cfg, r1, r2, r3)
-            if raw is None:
-                value = None
-            else:
-                try:
-                    value = normalize(raw, cfg.raw_min, cfg.raw_max,
-                                      cfg.phys_min, cfg.phys_max)
-                except ZeroDivisionError:
-                    logger.error('channel_id=%d: raw_min == raw_max, пропускаємо', cfg.channel_id)
-                    value = None
-            readings.append({'channel_id': cfg.channel_id, 'value': value})
-
-        # 3. Запис у БД (best-effort)
+        t_stage = time.perf_counter()
+
+        # 1. Читання (паралельно по з'єднаннях — timeout одного не блокує інші)
+        by_conn: dict[tuple[str, int], list[ReadBlock]] = {}
+        for name in due:
+            b = blocks[name]
+            by_conn.setdefault((b.ip, b.port), []).append(b)
+        futures = [executor.submit(_read_blocks, connections[key], bl, metrics)
+                   for key, bl in by_conn.items()]
+        regs: dict[str, list[int] | None] = {}
+        for f in futures:
+            regs.update(f.result())
+        t_stage = metrics.lap('modbus', t_stage)
+
+        # 2. Нормалізація (тільки канали опитаних модулів)
+        readings, stored = normalize_cycle(plan.for_modules(regs), decoders, regs, policy, t0)
+        t_stage = metrics.lap('normalize', t_stage)
+
+        # 3. Запис у БД (best-effort; тільки значення, що пройшли deadband)
+        stored_ok = False
         if db_conn is not None:
             try:
-                batch_insert(db_conn, cycle_time, readings)
+                if wide is not None:
+                    wide.insert(db_conn, cycle_time, plan.channel_ids(), stored)
+                else:
+                    batch_insert(db_conn, cycle_time, stored)
+                t_stage = metrics.lap('db_insert', t_stage)
+                metrics.inc('rows_stored', len(stored))
+                stored_ok = True
             except Exception as e:
+                metrics.inc('db_errors')
                 logger.critical('Запис у БД не вдався: %s', e)
                 try:
                     db_conn.close()
@@ -156,23 +233,35 @@ def main():
                 db_conn = None
 
         if db_conn is None:
-            # Спроба перепідключення — без блокування циклу
-            try:
-                db_conn = psycopg2.connect(s.dsn)
-                logger.info('DB перепідключено')
-            except Exception as e:
-                logger.error('DB перепідключення не вдалося: %s', e)
+            # Цикл не записано — deadband-стан не відповідає БД
+            policy.reset()
+            # Спроба перепідключення — не частіше ніж раз на reconnect_delay
+            if db_connecting is None and t0 >= db_retry_at:
+                db_retry_at = t0 + s.reconnect_delay
+                db_connecting = db_executor.submit(psycopg2.connect, s.dsn, connect_timeout=5)
+            elif db_connecting is not None and db_connecting.done():
+                try:
+                    db_conn = db_connecting.result()
+                    logger.info('DB підключено')
+                except Exception as e:
+                    logger.error('DB перепідключення не вдалося: %s', e)
+                db_connecting = None
 
         # 4. Публікація в ZeroMQ (завжди, навіть при збої БД — ADR-002)
-        pub.publish(cycle_time_iso, readings)
-
-        # 5. Витримка до кінця циклу
-        elapsed = time.monotonic() - t0
-        sleep = cycle_interval - elapsed
-        if sleep > 0:
-            time.sleep(sleep)
-        else:
-            logger.warning('Цикл затримався на %.3f с', -sleep)
+        t_stage = time.perf_counter()
+        pub.publish(cycle_time, readings)
+        metrics.lap('zmq_publish', t_stage)
+        metrics.inc('readings_published', len(readings))
+
+        # 5. Кільце циклів: stored — лише те, що справді потрапило в БД
+        if ring is not None:
+            try:
+                ring.write(datetime_to_ns(cycle_time), readings,
+                           [r['channel_id'] for r in stored] if stored_ok else ())
+            except ValueError as e:
+                metrics.inc('ring_errors')
+                logger.error('Кільце циклів: %s', e)
+        metrics.observe('cycle', time.monotonic() - t0)
 
 
 if __name__ == '__main__':
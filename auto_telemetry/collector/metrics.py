@@ -0,0 +1,137 @@
+"""
+Runtime-метрики колектора: гістограми часу етапів циклу та лічильники.
+
+Доступні локально: GET http://127.0.0.1:COLLECTOR_METRICS_PORT/metrics (JSON).
+Outbound API бере звідти `summary` для /status.
+"""
+
+import bisect
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Межі кошиків, секунди: 0.1 мс … 10 с, ~4 кошики на декаду
+_BOUNDS = tuple(round(m * 10 ** e, 7) for e in range(-4, 1) for m in (1, 2, 3, 5)) + (10.0,)
+
+
+class Histogram:
+    """Гістограма з фіксованими кошиками — O(log k) на спостереження, без зберігання семплів."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        i = bisect.bisect_left(_BOUNDS, seconds)
+        with self._lock:
+            self._counts[i] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Оцінка квантиля — верхня межа кошика (для останнього — max)."""
+        with self._lock:
+            rank = q * self.count
+            seen = 0
+            for i, n in enumerate(self._counts):
+                seen += n
+                if n and seen >= rank:
+                    return min(_BOUNDS[i], self.max) if i < len(_BOUNDS) else self.max
+        return 0.0
+
+    def summary(self) -> dict:
+        ms = 1000.0
+        return {
+            'count':   self.count,
+            'mean_ms': round(self.total / self.count * ms, 3) if self.count else None,
+            'p50_ms':  round(self.quantile(0.50) * ms, 3),
+            'p95_ms':  round(self.quantile(0.95) * ms, 3),
+            'p99_ms':  round(self.quantile(0.99) * ms, 3),
+            'max_ms':  round(self.max * ms, 3),
+        }
+
+
+class Metrics:
+    """Реєстр метрик процесу; безпечний для виклику з кількох потоків."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hist: dict[str, Histogram] = {}
+        self._counters: dict[str, int] = {}
+        self._started = time.monotonic()
+
+    def histogram(self, name: str) -> Histogram:
+        h = self._hist.get(name)
+        if h is None:
+            with self._lock:
+                h = self._hist.setdefault(name, Histogram())
+        return h
+
+    def observe(self, name: str, seconds: float) -> None:
+        self.histogram(name).observe(seconds)
+
+    def lap(self, name: str, since: float) -> float:
+        """Записати тривалість етапу від since (perf_counter); повертає початок наступного."""
+        now = time.perf_counter()
+        self.observe(name, now - since)
+        return now
+
+    def inc(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def snapshot(self) -> dict:
+        hist = {name: h.summary() for name, h in sorted(self._hist.items())}
+        with self._lock:
+            counters = dict(sorted(self._counters.items()))
+        cycle = hist.get('cycle', Histogram().summary())
+        return {
+            'uptime_sec': int(time.monotonic() - self._started),
+            'histograms': hist,
+            'counters': counters,
+            # Стислий підсумок для Outbound /status
+            'summary': {
+                'cycles':        cycle['count'],
+                'cycle_p95_ms':  cycle['p95_ms'],
+                'cycle_max_ms':  cycle['max_ms'],
+                'stage_p95_ms':  {name: h['p95_ms'] for name, h in hist.items()
+                                  if name in ('modbus', 'normalize', 'db_insert', 'zmq_publish')},
+                'modbus_errors': sum(v for k, v in counters.items() if k.startswith('modbus_errors')),
+                'db_errors':     counters.get('db_errors', 0),
+                'late_ticks':    counters.get('late_ticks', 0),
+            },
+        }
+
+
+def serve_metrics(metrics: Metrics, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """HTTP-ендпоінт GET /metrics у фоновому потоці (тільки localhost)."""
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') != '/metrics':
+                self.send_error(404)
+                return
+            body = json.dumps(metrics.snapshot()).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name='metrics-http').start()
+    logger.info('Метрики: http://%s:%d/metrics', host, port)
+    return server
@@ -1,5 +1,7 @@
 import logging
 import time
+from dataclasses import dataclass, field
+from typing import Callable
 
 from pymodbus.client import ModbusTcpClient
 
@@ -13,14 +15,20 @@ _ET7017_COUNT = 8
 _ET7284_ADDR = 16
 _ET7284_COUNT = 16
 
+# Ліміт Modbus на один FC04 запит
+MAX_REGISTERS_PER_READ = 125
 
-class ModbusModule:
-    """Modbus TCP клієнт для одного модуля з автоматичним перепідключенням."""
+
+class ModbusConnection:
+    """Modbus TCP з'єднання з одним host:port з автоматичним перепідключенням.
+
+    Не потокобезпечне: всі блоки одного з'єднання читаються послідовно
+    в одному потоці (див. collector/main.py).
+    """
 
     def __init__(self, name: str, ip: str, port: int,
-                 unit_id: int, timeout: float, reconnect_delay: float):
+                 timeout: float, reconnect_delay: float):
         self.name = name
-        self._unit_id = unit_id
         self._reconnect_delay = reconnect_delay
         self._client = ModbusTcpClient(host=ip, port=port, timeout=timeout)
         self._connected = False
@@ -50,27 +58,13 @@ class ModbusModule:
         self._connected = False
         self._last_fail_at = time.monotonic()
 
-    def read_et7017(self) -> list[int] | None:
-        """FC04, адреси 0–7. Повертає 8 uint16 або None при помилці."""
-        if not self._connected and not self._try_connect():
-            return None
-        try:
-            result = self._client.read_input_registers(
-                _ET7017_ADDR, count=_ET7017_COUNT, device_id=self._unit_id)
-            if result.isError():
-                raise OSError(result)
-            return list(result.registers)
-        except Exception as e:
-            self._on_error(e)
-            return None
-
-    def read_et7284(self) -> list[int] | None:
-        """FC04, адреси 16–31. Повертає 16 uint16 (8 каналів × 2 слова) або None при помилці."""
+    def read_input_registers(self, unit_id: int, address: int, count: int) -> list[int] | None:
+        """FC04. Повертає count uint16 або None при помилці."""
         if not self._connected and not self._try_connect():
             return None
         try:
             result = self._client.read_input_registers(
-                _ET7284_ADDR, count=_ET7284_COUNT, device_id=self._unit_id)
+                address, count=count, device_id=unit_id)
             if result.isError():
                 raise OSError(result)
             return list(result.registers)
@@ -101,3 +95,79 @@ def decode_et7284(registers: list[int] | None, channel_index: int) -> int | None
     lo = registers[channel_index * 2]
     hi = registers[channel_index * 2 + 1]
     return (hi << 16) | lo
+
+
+# ── Реєстр типів модулів ──────────────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class ModuleType:
+    """Карта регістрів типу модуля: діапазон FC04 і декодер сирого значення каналу."""
+    address: int
+    count: int
+    decode: Callable[[list[int] | None, int], int | None]
+
+
+MODULE_TYPES: dict[str, ModuleType] = {
+    'et7017': ModuleType(_ET7017_ADDR, _ET7017_COUNT, decode_et7017),
+    'et7284': ModuleType(_ET7284_ADDR, _ET7284_COUNT, decode_et7284),
+}
+
+
+def register_module_type(name: str, address: int, count: int,
+                         decode: Callable[[list[int] | None, int], int | None]) -> None:
+    """Додати новий тип модуля (декодер отримує регістри модуля і channel_index)."""
+    MODULE_TYPES[name] = ModuleType(address, count, decode)
+
+
+# ── План читання (coalescing) ─────────────────────────────────────────────────
+
+@dataclass
+class ReadBlock:
+    """Один FC04 запит, що покриває регістри одного або кількох модулів."""
+    ip: str
+    port: int
+    unit_id: int
+    poll_hz: float
+    address: int
+    count: int
+    # (ім'я модуля, зміщення від address, кількість регістрів модуля)
+    members: list[tuple[str, int, int]] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return '+'.join(m[0] for m in self.members)
+
+    def split(self, registers: list[int] | None) -> dict[str, list[int] | None]:
+        """Результат запиту → регістри кожного модуля-учасника."""
+        if registers is None:
+            return {name: None for name, _, _ in self.members}
+        return {name: registers[off:off + n] for name, off, n in self.members}
+
+
+def plan_reads(modules, gap: int = 0) -> list[ReadBlock]:
+    """
+    Згрупувати модулі в мінімальну кількість FC04 запитів.
+
+    modules — ModuleSpec-подібні об'єкти (name, type, ip, port, unit_id, poll_hz).
+    Діапазони на одному host:port:unit з однаковою частотою опитування
+    зливаються, якщо між ними не більше gap регістрів і сумарно ≤ 125.
+    """
+    groups: dict[tuple, list[tuple[int, int, str]]] = {}
+    for m in modules:
+        mt = MODULE_TYPES[m.type]
+        groups.setdefault((m.ip, m.port, m.unit_id, m.poll_hz), []).append(
+            (mt.address, mt.count, m.name))
+
+    blocks: list[ReadBlock] = []
+    for (ip, port, unit_id, poll_hz), ranges in groups.items():
+        cur: ReadBlock | None = None
+        for address, count, name in sorted(ranges):
+            end = max(address + count, cur.address + cur.count) if cur else 0
+            if cur is not None and address <= cur.address + cur.count + gap \
+                    and end - cur.address <= MAX_REGISTERS_PER_READ:
+                cur.count = end - cur.address
+            else:
+                cur = ReadBlock(ip, port, unit_id, poll_hz, address, count)
+                blocks.append(cur)
+            cur.members.append((name, address - cur.address, count))
+    return blocks
@@ -0,0 +1,45 @@
+"""
+Debounce pg_notify config_changed: пакет channel_id замість реакції на кожне повідомлення.
+
+Модуль самодостатній (тільки stdlib) — його імпортують і колектор (ConfigListener),
+і portal: `from collector.notify_batch import NotifyBatch`.
+"""
+
+
+class NotifyBatch:
+    """
+    Накопичує pg_notify config_changed за коротке вікно (debounce).
+
+    Пакет готовий, коли debounce сек не було нових повідомлень,
+    або з першого повідомлення минуло max_delay сек (масові правки).
+    Payload, що не є channel_id, вимагає повного перезавантаження.
+    """
+
+    def __init__(self, debounce: float, max_delay: float):
+        self._debounce = debounce
+        self._max_delay = max_delay
+        self._ids: set[int] = set()
+        self._full = False
+        self._first_at: float | None = None
+        self._last_at = 0.0
+
+    def add(self, payload: str, now: float) -> None:
+        try:
+            self._ids.add(int(payload))
+        except ValueError:
+            self._full = True
+        if self._first_at is None:
+            self._first_at = now
+        self._last_at = now
+
+    def deadline(self) -> float | None:
+        """Момент, коли пакет стане готовим; None якщо пакет порожній."""
+        if self._first_at is None:
+            return None
+        return min(self._last_at + self._debounce, self._first_at + self._max_delay)
+
+    def take(self) -> tuple[set[int], bool]:
+        """Забрати (channel_ids, full) і почати новий пакет."""
+        ids, full = self._ids, self._full
+        self._ids, self._full, self._first_at = set(), False, None
+        return ids, full
@@ -0,0 +1,44 @@
+"""
+Етапи циклу колектора, спільні для main.py і replay.py:
+регістри модулів → декодування → нормалізація → відбір для БД (deadband).
+"""
+
+import logging
+from typing import Callable, Iterable
+
+from db import ChannelConfig
+from normalizer import normalize
+from storage_policy import StoragePolicy
+
+logger = logging.getLogger(__name__)
+
+Decoder = Callable[[list[int] | None, int], int | None]
+
+
+def normalize_cycle(configs: Iterable[ChannelConfig],
+                    decoders: dict[str, Decoder],
+                    regs: dict[str, list[int] | None],
+                    policy: StoragePolicy,
+                    now: float) -> tuple[list[dict], list[dict]]:
+    """
+    Повертає (readings, stored): усі значення тіку для ZeroMQ
+    і підмножину, яку StoragePolicy пропускає в БД.
+    """
+    readings: list[dict] = []
+    stored: list[dict] = []
+    for cfg in configs:
+        raw = decoders[cfg.module](regs[cfg.module], cfg.channel_index)
+        if raw is None:
+            value = None
+        else:
+            try:
+                value = normalize(raw, cfg.raw_min, cfg.raw_max,
+                                  cfg.phys_min, cfg.phys_max)
+            except ZeroDivisionError:
+                logger.error('channel_id=%d: raw_min == raw_max, пропускаємо', cfg.channel_id)
+                value = None
+        reading = {'channel_id': cfg.channel_id, 'value': value}
+        readings.append(reading)
+        if policy.should_store(cfg, value, now):
+            stored.append(reading)
+    return readings, stored
@@ -1,23 +1,33 @@
 import json
+from datetime import datetime
+
 import zmq
 
+from frames import TOPIC_BINARY, TOPIC_JSON, datetime_to_ns, encode_frame
+
 
 class Publisher:
     """ZeroMQ PUB: публікує пакети даних для Monitor та Portal (ADR-001)."""
 
-    def __init__(self, address: str):
+    def __init__(self, address: str, binary: bool = False):
         ctx = zmq.Context.instance()
         self._sock = ctx.socket(zmq.PUB)
         self._sock.bind(address)
+        self._binary = binary
 
-    def publish(self, cycle_time_iso: str, readings: list[dict]) -> None:
+    def publish(self, cycle_time: datetime, readings: list[dict]) -> None:
         """
         Формат (ADR-001):
           topic:   b'data'
           payload: {"cycle_time": "...", "readings": [{"channel_id": N, "value": F|null}, ...]}
+
+        Якщо binary=True — додатково topic b'bdata' з бінарним пакетом (collector/frames.py).
         """
         payload = json.dumps({
-            'cycle_time': cycle_time_iso,
+            'cycle_time': cycle_time.isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
             'readings': readings,
         }).encode()
-        self._sock.send_multipart([b'data', payload])
+        self._sock.send_multipart([TOPIC_JSON, payload])
+        if self._binary:
+            self._sock.send_multipart(
+                [TOPIC_BINARY, encode_frame(datetime_to_ns(cycle_time), readings)])
@@ -0,0 +1,285 @@
+"""
+Replay — бенчмарк конвеєра колектора без Modbus.
+
+Подає записані або синтетичні блоки регістрів у реальний шлях
+декодування → нормалізація → БД → ZeroMQ без пауз між тіками
+і звітує cycles/s та перцентилі часу кожного етапу.
+
+Запуск (з кореня auto_telemetry/):
+    python collector/replay.py --cycles 20000                    # синтетика, без БД
+    python collector/replay.py --cycles 5000 --db                # + INSERT у TEMP measurements
+    python collector/replay.py --cycles 5000 --db --layout wide  # рядок на цикл (measurements_wide)
+    python collector/replay.py --input regs.jsonl --binary       # записані регістри
+    python collector/replay.py --record regs.jsonl --cycles 600  # записати з живих модулів
+    python collector/replay.py --json out.json --min-cps 2000    # exit 1 при регресії
+
+Формат запису (JSONL, рядок на тік): {"regs": {"et7017_1": [uint16, ...] | null, ...}}
+"""
+
+import argparse
+import json
+import logging
+import math
+import random
+import sys
+import time
+from dataclasses import replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from channel_plan import ChannelPlan
+from db import ChannelConfig, WideWriter, batch_insert, load_channel_configs
+from modbus_reader import MODULE_TYPES, ModbusConnection, plan_reads
+from pipeline import Decoder, normalize_cycle
+from publisher import Publisher
+from settings import ModuleSpec, load_settings
+from storage_policy import StoragePolicy
+
+logger = logging.getLogger('replay')
+
+Regs = dict[str, list[int] | None]
+
+
+# ── Джерела регістрів ─────────────────────────────────────────────────────────
+
+def _channels(module_type: str) -> int:
+    # ET-7284 — uint32 з двох регістрів на канал, решта — регістр на канал
+    count = MODULE_TYPES[module_type].count
+    return count // 2 if module_type == 'et7284' else count
+
+
+def synthetic_regs(modules: list[ModuleSpec], seed: int = 0) -> Iterator[Regs]:
+    """
+    Нескінченний потік тіків з правдоподібними сирими значеннями:
+      ET-7017 — int16 (4-20 мА ≈ 6400..32000, канал 7 коливається біля нуля → від'ємні),
+      ET-7284 — uint32 лічильники (lo, hi), що ростуть і переповнюються,
+      інші типи — випадкові uint16.
+    """
+    rng = random.Random(seed)
+    counters = {m.name: [rng.randrange(2 ** 32) for _ in range(_channels(m.type))]
+                for m in modules}
+    tick = 0
+    while True:
+        regs: Regs = {}
+        for m in modules:
+            if m.type == 'et7017':
+                vals = []
+                for ch in range(8):
+                    centre = 0 if ch == 7 else 6400 + ch * 3200
+                    v = int(centre + 2000 * math.sin(tick / 50 + ch) + rng.gauss(0, 40))
+                    vals.append(max(-32768, min(32767, v)) & 0xFFFF)
+                regs[m.name] = vals
+            elif m.type == 'et7284':
+                vals = []
+                cnt = counters[m.name]
+                for ch in range(len(cnt)):
+                    cnt[ch] = (cnt[ch] + rng.randrange(5000)) & 0xFFFFFFFF
+                    vals += [cnt[ch] & 0xFFFF, cnt[ch] >> 16]
+                regs[m.name] = vals
+            else:
+                regs[m.name] = [rng.randrange(65536) for _ in range(MODULE_TYPES[m.type].count)]
+        tick += 1
+        yield regs
+
+
+def recorded_regs(path: Path) -> Iterator[Regs]:
+    """Тіки з JSONL-запису, по колу."""
+    ticks = [json.loads(line)['regs']
+             for line in path.read_text(encoding='utf-8').splitlines() if line.strip()]
+    if not ticks:
+        raise ValueError(f'{path}: запис порожній')
+    while True:
+        yield from ticks
+
+
+def record(path: Path, modules: list[ModuleSpec], cycles: int, s) -> None:
+    """Записати cycles тіків з живих модулів (усі блоки на частоті POLLING_FREQUENCY_HZ)."""
+    blocks = plan_reads(modules, s.coalesce_gap)
+    conns = {(b.ip, b.port): ModbusConnection(f'{b.ip}:{b.port}', b.ip, b.port,
+                                              s.modbus_timeout, s.reconnect_delay)
+             for b in blocks}
+    period = 1.0 / s.polling_hz
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(cycles):
+            t0 = time.monotonic()
+            regs: Regs = {}
+            for b in blocks:
+                regs.update(b.split(conns[(b.ip, b.port)].read_input_registers(
+                    b.unit_id, b.address, b.count)))
+            f.write(json.dumps({'regs': regs}) + '\n')
+            time.sleep(max(0.0, period - (time.monotonic() - t0)))
+    logger.info('Записано %d тіків у %s', cycles, path)
+
+
+def synthetic_configs(modules: list[ModuleSpec], deadband: float | None = None) -> list[ChannelConfig]:
+    """Канали на всі входи модулів: аналогові 4-20 мА → 0..100, лічильники → метри."""
+    configs = []
+    for m in modules:
+        for idx in range(_channels(m.type)):
+            cid = len(configs) + 1
+            if m.type == 'et7284':
+                configs.append(ChannelConfig(cid, m.name, idx, 'encoder_counter',
+                                             0, 1000, 0.0, 1.0))
+            else:
+                configs.append(ChannelConfig(cid, m.name, idx, 'analog_420',
+                                             6400, 32000, 0.0, 100.0,
+                                             deadband_abs=deadband))
+    return configs
+
+
+def scale_modules(modules: list[ModuleSpec], factor: int) -> list[ModuleSpec]:
+    """factor копій кожного модуля (et7017_1, et7017_1~2, ...) — більше каналів на тік."""
+    return [m if k == 0 else replace(m, name=f'{m.name}~{k + 1}')
+            for k in range(factor) for m in modules]
+
+
+# ── Прогін ────────────────────────────────────────────────────────────────────
+
+def _percentile(sorted_samples: list[float], q: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[min(len(sorted_samples) - 1, int(q * len(sorted_samples)))]
+
+
+def run_replay(configs: list[ChannelConfig], decoders: dict[str, Decoder],
+               source: Iterator[Regs], cycles: int,
+               pub: Publisher | None = None, db_conn=None, tick_sec: float = 1.0,
+               layout: str = 'narrow') -> dict:
+    """
+    cycles тіків через конвеєр без пауз. tick_sec — модельний час між тіками
+    для StoragePolicy (heartbeat/store_period поводяться як у реальному циклі).
+
+    Перцентилі — точні (по всіх семплах), на відміну від гістограм metrics.py:
+    етапи тривають мікросекунди і ховаються в першому кошику.
+    """
+    plan = ChannelPlan(configs)
+    policy = StoragePolicy()
+    wide = WideWriter() if layout == 'wide' else None
+    stages: dict[str, list[float]] = {'normalize': [], 'db_insert': [], 'zmq_publish': [], 'cycle': []}
+    readings_total = stored_total = 0
+
+    t_start = time.perf_counter()
+    for i in range(cycles):
+        regs = next(source)
+        t0 = time.perf_counter()
+        cycle_time = datetime.now(timezone.utc)
+
+        readings, stored = normalize_cycle(plan.for_modules(regs), decoders, regs,
+                                           policy, i * tick_sec)
+        t1 = time.perf_counter()
+        stages['normalize'].append(t1 - t0)
+
+        if db_conn is not None:
+            if wide is not None:
+                wide.insert(db_conn, cycle_time, plan.channel_ids(), stored)
+            else:
+                batch_insert(db_conn, cycle_time, stored)
+            t2 = time.perf_counter()
+            stages['db_insert'].append(t2 - t1)
+            t1 = t2
+
+        if pub is not None:
+            pub.publish(cycle_time, readings)
+            t2 = time.perf_counter()
+            stages['zmq_publish'].append(t2 - t1)
+            t1 = t2
+
+        stages['cycle'].append(t1 - t0)
+        readings_total += len(readings)
+        stored_total += len(stored)
+    elapsed = time.perf_counter() - t_start
+
+    report_stages = {}
+    for name, samples in stages.items():
+        if not samples:
+            continue
+        samples.sort()
+        report_stages[name] = {
+            'p50_ms': round(_percentile(samples, 0.50) * 1000, 4),
+            'p95_ms': round(_percentile(samples, 0.95) * 1000, 4),
+            'p99_ms': round(_percentile(samples, 0.99) * 1000, 4),
+            'max_ms': round(samples[-1] * 1000, 4),
+        }
+    return {
+        'cycles':         cycles,
+        'channels':       len(plan),
+        'elapsed_sec':    round(elapsed, 3),
+        'cycles_per_sec': round(cycles / elapsed, 1) if elapsed else None,
+        'readings':       readings_total,
+        'layout':         layout,
+        'rows_stored':    stored_total,
+        'stages':         report_stages,
+    }
+
+
+def _print_report(r: dict) -> None:
+    print(f"{r['cycles']} тіків × {r['channels']} каналів за {r['elapsed_sec']} с "
+          f"→ {r['cycles_per_sec']} cycles/s, у БД {r['rows_stored']} з {r['readings']} значень")
+    print(f"{'етап':<12} {'p50 мс':>9} {'p95 мс':>9} {'p99 мс':>9} {'max мс':>9}")
+    for name, st in r['stages'].items():
+        print(f"{name:<12} {st['p50_ms']:>9.4f} {st['p95_ms']:>9.4f} "
+              f"{st['p99_ms']:>9.4f} {st['max_ms']:>9.4f}")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='Replay-бенчмарк конвеєра колектора')
+    ap.add_argument('--cycles', type=int, default=10000)
+    ap.add_argument('--input', type=Path, help='JSONL-запис регістрів (інакше — синтетика)')
+    ap.add_argument('--record', type=Path, help='записати --cycles тіків з живих модулів і вийти')
+    ap.add_argument('--scale', type=int, default=1, help='копій кожного модуля (синтетика)')
+    ap.add_argument('--deadband', type=float, help='deadband_abs для синтетичних аналогових каналів')
+    ap.add_argument('--db', action='store_true',
+                    help='INSERT у TEMP measurements (конфіг каналів — з БД)')
+    ap.add_argument('--layout', choices=('narrow', 'wide'), default=None,
+                    help='формат запису в БД (за замовч. STORAGE_LAYOUT)')
+    ap.add_argument('--zmq', default='tcp://127.0.0.1:5599', help="адреса PUB; '' — без ZeroMQ")
+    ap.add_argument('--binary', action='store_true', help='також бінарний topic bdata')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--json', type=Path, help='зберегти звіт у JSON')
+    ap.add_argument('--min-cps', type=float, help='exit 1, якщо cycles/s нижче')
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)-8s %(name)s: %(message)s')
+    s = load_settings()
+    modules = list(s.modules)
+
+    if args.record:
+        record(args.record, modules, args.cycles, s)
+        return 0
+
+    db_conn = None
+    if args.db:
+        import psycopg2
+        db_conn = psycopg2.connect(s.dsn, connect_timeout=5)
+        configs = load_channel_configs(db_conn)
+        # TEMP-таблиці першими в search_path — запис іде в них, не в справжні
+        with db_conn.cursor() as cur:
+            for table in ('measurements', 'measurements_wide'):
+                cur.execute(f'CREATE TEMP TABLE {table} (LIKE public.{table} INCLUDING DEFAULTS)')
+        db_conn.commit()
+    else:
+        modules = scale_modules(modules, args.scale)
+        configs = synthetic_configs(modules, args.deadband)
+
+    source = recorded_regs(args.input) if args.input else synthetic_regs(modules, args.seed)
+    pub = Publisher(args.zmq, binary=args.binary) if args.zmq else None
+
+    decoders = {m.name: MODULE_TYPES[m.type].decode for m in modules}
+    report = run_replay(configs, decoders, source, args.cycles, pub, db_conn,
+                        1.0 / s.polling_hz, args.layout or s.storage_layout)
+    _print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding='utf-8')
+    if db_conn is not None:
+        db_conn.close()
+    if args.min_cps is not None and report['cycles_per_sec'] < args.min_cps:
+        logger.error('Регресія: %.1f cycles/s < %.1f', report['cycles_per_sec'], args.min_cps)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
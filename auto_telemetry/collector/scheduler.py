@@ -0,0 +1,31 @@
+class RateScheduler:
+    """
+    Багатошвидкісний планувальник опитування модулів.
+
+    Кожен модуль має власний період; дедлайни ростуть кроком періоду
+    (без накопичення дрейфу). Якщо модуль відстав більше ніж на період —
+    пропущені тіки не наздоганяються, відлік починається від поточного моменту.
+    """
+
+    def __init__(self, periods: dict[str, float], now: float):
+        self._periods = dict(periods)
+        self._next = {name: now for name in periods}
+
+    def due(self, now: float) -> tuple[list[str], float]:
+        """
+        Модулі, яким настав час опитування, та найбільше запізнення серед них (с).
+        Дедлайни повернутих модулів зсуваються на наступний тік.
+        """
+        names: list[str] = []
+        lag = 0.0
+        for name, at in self._next.items():
+            if at > now:
+                continue
+            names.append(name)
+            lag = max(lag, now - at)
+            nxt = at + self._periods[name]
+            self._next[name] = nxt if nxt > now else now + self._periods[name]
+        return names, lag
+
+    def next_deadline(self) -> float:
+        return min(self._next.values())
@@ -1,9 +1,12 @@
 import os
+import re
 from dataclasses import dataclass
 from pathlib import Path
 
 from dotenv import load_dotenv
 
+from shm_ring import default_path as default_ring_path
+
 _ROOT = Path(__file__).parent.parent
 load_dotenv(_ROOT / '.env')
 
@@ -33,6 +36,16 @@ def _c(key: str, default: str = '') -> str:
     return _cfg.get(key, os.getenv(key, default))
 
 
+@dataclass(frozen=True)
+class ModuleSpec:
+    name: str       # ключ у channel_config.module, напр. 'et7017_1'
+    type: str       # тип з modbus_reader.MODULE_TYPES ('et7017' | 'et7284' | ...)
+    ip: str
+    port: int
+    unit_id: int
+    poll_hz: float
+
+
 @dataclass(frozen=True)
 class Settings:
     db_host: str
@@ -42,18 +55,21 @@ class Settings:
     db_password: str
 
     zmq_pub_address: str  # Collector BIND до цього адресу
+    zmq_binary: bool      # додатково публікувати бінарний topic b'bdata'
 
-    et7017_1_ip: str
-    et7017_1_port: int
-    et7017_1_unit_id: int
+    modules: tuple[ModuleSpec, ...]
+    coalesce_gap: int     # макс. проміжок (регістрів) для злиття FC04 запитів
 
-    et7017_2_ip: str
-    et7017_2_port: int
-    et7017_2_unit_id: int
+    storage_layout: str         # 'narrow' — рядок на канал, 'wide' — рядок на цикл
+    partitions_ahead: int       # денних партицій measurements наперед
+    retention_days: int         # DROP партицій старших за N діб (без ack); 0 — не видаляти
+    local_retention_days: int | None  # тільки підтверджене sync ack і старше N діб; None — ack ігнорується
 
-    et7284_ip: str
-    et7284_port: int
-    et7284_unit_id: int
+    metrics_port: int           # локальний HTTP GET /metrics; 0 — вимкнено
+    config_snapshot_path: Path  # локальний знімок channel_config (холодний старт без БД)
+    ring_path: Path             # mmap-кільце останніх циклів (collector/shm_ring.py)
+    ring_slots: int             # циклів у кільці; 0 — вимкнено
+    ring_channels: int          # макс. показів у циклі
 
     polling_hz: float
     modbus_timeout: float
@@ -66,7 +82,39 @@ class Settings:
                 f'password={self.db_password}')
 
 
+_DEFAULT_MODULES = 'et7017_1,et7017_2,et7284'
+_DEFAULT_PORTS = {'et7017_1': '5020', 'et7017_2': '5021', 'et7284': '5022'}
+
+
+def parse_modules(get, polling_hz: str) -> tuple[ModuleSpec, ...]:
+    """
+    Реєстр модулів з config.txt / env:
+
+        MODBUS_MODULES=et7017_1,et7017_2,et7284
+        MODBUS_<NAME>_IP / _PORT / _UNIT_ID / _TYPE / _POLL_HZ
+
+    _TYPE за замовчуванням — ім'я без числового суфікса ('et7017_2' → 'et7017').
+    get(key, default) — джерело значень (у продакшені _c).
+    """
+    specs = []
+    for name in get('MODBUS_MODULES', _DEFAULT_MODULES).split(','):
+        name = name.strip().lower()
+        if not name:
+            continue
+        key = f'MODBUS_{name.upper()}_'
+        specs.append(ModuleSpec(
+            name=name,
+            type=get(key + 'TYPE', re.sub(r'_\d+$', '', name)),
+            ip=get(key + 'IP', 'localhost'),
+            port=int(get(key + 'PORT', _DEFAULT_PORTS.get(name, '502'))),
+            unit_id=int(get(key + 'UNIT_ID', '1')),
+            poll_hz=float(get(key + 'POLL_HZ', polling_hz)),
+        ))
+    return tuple(specs)
+
+
 def load_settings() -> Settings:
+    polling_hz = _c('POLLING_FREQUENCY_HZ', '1.0')
     return Settings(
         db_host=os.getenv('DB_HOST', 'localhost'),
         db_port=int(os.getenv('DB_PORT', '5432')),
@@ -74,16 +122,20 @@ def load_settings() -> Settings:
         db_user=os.getenv('DB_USER', 'telemetry'),
         db_password=os.getenv('DB_PASSWORD', ''),
         zmq_pub_address=os.getenv('ZMQ_COLLECTOR_PUB', 'tcp://127.0.0.1:5555'),
-        et7017_1_ip=_c('MODBUS_ET7017_1_IP', 'localhost'),
-        et7017_1_port=int(_c('MODBUS_ET7017_1_PORT', '5020')),
-        et7017_1_unit_id=int(_c('MODBUS_ET7017_1_UNIT_ID', '1')),
-        et7017_2_ip=_c('MODBUS_ET7017_2_IP', 'localhost'),
-        et7017_2_port=int(_c('MODBUS_ET7017_2_PORT', '5021')),
-        et7017_2_unit_id=int(_c('MODBUS_ET7017_2_UNIT_ID', '1')),
-        et7284_ip=_c('MODBUS_ET7284_IP', 'localhost'),
-        et7284_port=int(_c('MODBUS_ET7284_PORT', '5022')),
-        et7284_unit_id=int(_c('MODBUS_ET7284_UNIT_ID', '1')),
-        polling_hz=float(_c('POLLING_FREQUENCY_HZ', '1.0')),
+        zmq_binary=os.getenv('ZMQ_BINARY_FRAMES', '0') == '1',
+        modules=parse_modules(_c, polling_hz),
+        coalesce_gap=int(_c('MODBUS_COALESCE_GAP', '0')),
+        storage_layout=_c('STORAGE_LAYOUT', 'narrow').lower(),
+        partitions_ahead=int(_c('MEASUREMENTS_PARTITIONS_AHEAD', '3')),
+        retention_days=int(_c('MEASUREMENTS_RETENTION_DAYS', '90')),
+        local_retention_days=int(_c('SYNC_LOCAL_RETENTION_DAYS', '7')) or None,
+        metrics_port=int(os.getenv('COLLECTOR_METRICS_PORT', '9101')),
+        config_snapshot_path=Path(_c('CONFIG_SNAPSHOT_PATH',
+                                     str(_ROOT / 'data' / 'channel_config.json'))),
+        ring_path=Path(os.getenv('SHM_RING_PATH') or default_ring_path()),
+        ring_slots=int(os.getenv('SHM_RING_SLOTS', '600')),
+        ring_channels=int(os.getenv('SHM_RING_CHANNELS', '512')),
+        polling_hz=float(polling_hz),
         modbus_timeout=float(_c('MODBUS_TIMEOUT_SEC', '2.0')),
         reconnect_delay=float(_c('RECONNECT_DELAY_SEC', '5.0')),
     )
@@ -0,0 +1,257 @@
+"""
+Кільце останніх циклів колектора у файлі, відображеному в пам'ять (mmap).
+
+Колектор пише кожен цикл у слот фіксованого розміру; будь-який процес
+на машині (Outbound API, Portal, Monitor) читає останні секунди/хвилини
+даних без ZeroMQ і без запитів до PostgreSQL. Файл за замовчуванням —
+у /dev/shm (tmpfs: без записів на SD-карту).
+
+Модуль самодостатній (тільки stdlib), як frames.py:
+`from collector.shm_ring import RingReader`.
+
+Розкладка (little-endian):
+    header  64 байти   magic b'TRNG' | version u8 | 3x | slots u32 | max_channels u32 |
+                       written u64 (кількість записаних циклів) | резерв
+    slot    × slots    seq u64 | cycle_time_ns i64 | count u32 | 4x |
+                       values max_channels × f64 (NaN = null) |
+                       ids max_channels × u16 | stored max_channels × u8 | вирівнювання до 8
+
+Цикл k лежить у слоті k % slots. Seqlock на слот: перед записом seq = 2k+1
+(непарний — запис триває), після — 2k+2. Читач копіює слот і приймає
+копію, лише якщо seq до й після копіювання дорівнює 2k+2; інакше слот
+переписано під час читання — цикл пропускається.
+
+stored[i] = 1 — значення пройшло StoragePolicy і записане в БД у цьому
+циклі: вибірка stored-рядків збігається з measurements (GET /data).
+
+Колектор при старті створює новий файл (tmp + os.replace), тож читач,
+що тримає старе відображення, помічає заміну за inode і відкриває файл заново.
+"""
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import NamedTuple
+
+MAGIC = b'TRNG'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sB3xII')
+_WRITTEN = struct.Struct('<Q')
+_WRITTEN_OFFSET = _HEADER.size
+_HEADER_SIZE = 64
+_SLOT = struct.Struct('<QqI4x')
+_SEQ = struct.Struct('<Q')
+_NAN = float('nan')
+_SWAP = sys.byteorder != 'little'
+
+
+def default_path() -> Path:
+    """tmpfs /dev/shm, якщо є (Linux); інакше data/ у корені auto_telemetry."""
+    shm = Path('/dev/shm')
+    if shm.is_dir():
+        return shm / 'auto_telemetry_cycles.ring'
+    return Path(__file__).parent.parent / 'data' / 'cycles.ring'
+
+
+def _slot_size(max_channels: int) -> int:
+    size = _SLOT.size + max_channels * (8 + 2 + 1)
+    return (size + 7) // 8 * 8
+
+
+class Cycle(NamedTuple):
+    cycle_time_ns: int
+    ids: array          # 'H' — channel_id
+    values: array       # 'd' — NaN = null
+    stored: bytes       # 1 — значення записане в БД
+
+
+class RingWriter:
+    """Пише цикли в кільце; єдиний писач — колектор."""
+
+    def __init__(self, path: Path, slots: int = 600, max_channels: int = 512):
+        if slots < 2 or not 0 < max_channels <= 65536:
+            raise ValueError(f'invalid ring geometry: slots={slots} max_channels={max_channels}')
+        self.path = Path(path)
+        self.slots = slots
+        self.max_channels = max_channels
+        self._slot_size = _slot_size(max_channels)
+        self._written = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        size = _HEADER_SIZE + slots * self._slot_size
+        with open(tmp, 'wb') as f:
+            f.truncate(size)
+            f.write(_HEADER.pack(MAGIC, VERSION, slots, max_channels))
+        os.replace(tmp, self.path)
+        with open(self.path, 'r+b') as f:
+            self._mm = mmap.mmap(f.fileno(), size)
+
+    def write(self, cycle_time_ns: int, readings: list[dict], stored_ids=()) -> None:
+        """readings [{channel_id, value|None}]; stored_ids — канали, записані в БД."""
+        n = len(readings)
+        if n > self.max_channels:
+            raise ValueError(f'{n} readings > ring max_channels={self.max_channels}')
+        k = self._written
+        off = _HEADER_SIZE + (k % self.slots) * self._slot_size
+        values = array('d', [_NAN if r['value'] is None else r['value'] for r in readings])
+        ids = array('H', [r['channel_id'] for r in readings])
+        stored_ids = set(stored_ids)
+        flags = bytes(r['channel_id'] in stored_ids for r in readings)
+        if _SWAP:
+            values.byteswap()
+            ids.byteswap()
+
+        m = self.max_channels
+        v_off = off + _SLOT.size
+        i_off = v_off + m * 8
+        f_off = i_off + m * 2
+        mm = self._mm
+        _SLOT.pack_into(mm, off, 2 * k + 1, cycle_time_ns, n)
+        mm[v_off:v_off + n * 8] = values.tobytes()
+        mm[i_off:i_off + n * 2] = ids.tobytes()
+        mm[f_off:f_off + n] = flags
+        _SEQ.pack_into(mm, off, 2 * k + 2)
+        self._written = k + 1
+        _WRITTEN.pack_into(mm, _WRITTEN_OFFSET, self._written)
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+class RingReader:
+    """Читач кільця; відкриває файл заново, якщо колектор його замінив."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._mm: mmap.mmap | None = None
+        self._ino = None
+        self._open()
+
+    def _open(self) -> None:
+        with open(self.path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(mm) < _HEADER_SIZE:
+            mm.close()
+            raise ValueError('ring file too short')
+        magic, version, slots, max_channels = _HEADER.unpack_from(mm)
+        if magic != MAGIC or version != VERSION:
+            mm.close()
+            raise ValueError(f'unsupported ring: magic={magic!r} version={version}')
+        slot_size = _slot_size(max_channels)
+        if len(mm) < _HEADER_SIZE + slots * slot_size:
+            mm.close()
+            raise ValueError('ring file length mismatch')
+        if self._mm is not None:
+            self._mm.close()
+        self._mm, self._ino = mm, (st.st_dev, st.st_ino)
+        self.slots, self.max_channels, self._slot_size = slots, max_channels, slot_size
+        # Індекс останніх значень (latest_values): новий файл — новий відлік циклів
+        self._last: dict[int, tuple[int, int, float]] = {}
+        self._last_end = 0
+
+    def _refresh(self) -> None:
+        st = os.stat(self.path)
+        if (st.st_dev, st.st_ino) != self._ino:
+            self._open()
+
+    def _read(self, k: int) -> Cycle | None:
+        """Цикл k або None, якщо слот уже переписано чи пишеться зараз."""
+        mm = self._mm
+        off = _HEADER_SIZE + (k % self.slots) * self._slot_size
+        expected = 2 * k + 2
+        if _SEQ.unpack_from(mm, off)[0] != expected:
+            return None
+        raw = mm[off:off + self._slot_size]
+        if _SEQ.unpack_from(mm, off)[0] != expected:
+            return None
+        _, cycle_time_ns, n = _SLOT.unpack_from(raw)
+        m = self.max_channels
+        if n > m:
+            return None
+        v_off = _SLOT.size
+        i_off = v_off + m * 8
+        f_off = i_off + m * 2
+        values = array('d', raw[v_off:v_off + n * 8])
+        ids = array('H', raw[i_off:i_off + n * 2])
+        if _SWAP:
+            values.byteswap()
+            ids.byteswap()
+        return Cycle(cycle_time_ns, ids, values, raw[f_off:f_off + n])
+
+    def written(self) -> int:
+        return _WRITTEN.unpack_from(self._mm, _WRITTEN_OFFSET)[0]
+
+    def latest(self) -> Cycle | None:
+        self._refresh()
+        end = self.written()
+        for k in range(end - 1, max(end - self.slots, 0) - 1, -1):
+            c = self._read(k)
+            if c is not None:
+                return c
+        return None
+
+    def latest_values(self) -> dict[int, tuple[int, float]]:
+        """
+        Останнє значення кожного каналу в кільці: {channel_id: (cycle_time_ns, value)}.
+
+        Індекс оновлюється інкрементно: читаються лише цикли, записані після
+        попереднього виклику (модулі опитуються з різним періодом, тож один
+        цикл не містить усіх каналів). Канали, чиї цикли вже переписано, випадають —
+        як і при повному проході cycles().
+        """
+        self._refresh()
+        end = self.written()
+        if end < self._last_end:
+            self._last, self._last_end = {}, 0
+        oldest = max(end - self.slots, 0)
+        last = self._last
+        for k in range(max(self._last_end, oldest), end):
+            c = self._read(k)
+            if c is None:
+                continue    # слот уже переписано новішим циклом
+            t = c.cycle_time_ns
+            for cid, v in zip(c.ids, c.values):
+                last[cid] = (k, t, v)
+        self._last_end = end
+        if oldest:
+            for cid in [cid for cid, (k, _, _) in last.items() if k < oldest]:
+                del last[cid]
+        return {cid: (t, v) for cid, (_, t, v) in last.items()}
+
+    def cycles(self, since_ns: int | None = None) -> list[Cycle]:
+        """Цикли з cycle_time_ns >= since_ns (None — усі в кільці), від старшого до новішого."""
+        self._refresh()
+        return self._scan(since_ns)[0]
+
+    def window(self, since_ns: int) -> list[Cycle] | None:
+        """
+        Як cycles(since_ns), але None, якщо кільце не покриває since_ns
+        повністю (найстаріший цикл новіший за since_ns) — тоді читати з БД.
+        """
+        self._refresh()
+        out, covered = self._scan(since_ns)
+        return out if covered else None
+
+    def _scan(self, since_ns: int | None) -> tuple[list[Cycle], bool]:
+        end = self.written()
+        out = []
+        for k in range(end - 1, max(end - self.slots, 0) - 1, -1):
+            c = self._read(k)
+            if c is None:
+                # Слоти переписуються від найстарішого: решта старших теж втрачена
+                return out[::-1], False
+            if since_ns is not None and c.cycle_time_ns < since_ns:
+                return out[::-1], True
+            out.append(c)
+        return out[::-1], False
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
@@ -0,0 +1,75 @@
+from dataclasses import dataclass
+
+from db import ChannelConfig
+
+
+@dataclass
+class _Stored:
+    value: float | None
+    at: float           # time.monotonic() моменту останнього запису
+    due: float          # раніше цього моменту наступний запис заборонено (store_period_sec)
+
+
+class StoragePolicy:
+    """
+    Deadband / change-based фільтр запису в measurements.
+
+    Стан (останнє збережене значення і час) тримається в пам'яті колектора.
+    Спершу діє store_period_sec: не частіше одного рядка за період
+    (канал опитується швидко, а в БД іде з меншою частотою).
+    Далі рядок зберігається якщо:
+      - для каналу ще нічого не зберігали;
+      - значення змінилось між null і не-null;
+      - |value - last| > max(deadband_abs, deadband_rel * |last|);
+      - з моменту останнього запису минуло heartbeat_sec.
+
+    Канал без deadband_abs і deadband_rel зберігається кожен цикл (як раніше).
+    ZeroMQ це не стосується — там публікується кожен семпл.
+    """
+
+    def __init__(self):
+        self._last: dict[int, _Stored] = {}
+
+    def should_store(self, cfg: ChannelConfig, value: float | None, now: float) -> bool:
+        """Вирішує чи зберігати значення; при True оновлює стан каналу."""
+        prev = self._last.get(cfg.channel_id)
+        if prev is not None:
+            if now < prev.due:
+                return False
+            if not (self._changed(cfg, prev.value, value)
+                    or (cfg.heartbeat_sec is not None and now - prev.at >= cfg.heartbeat_sec)):
+                return False
+        self._last[cfg.channel_id] = _Stored(value, now, self._next_due(cfg, prev, now))
+        return True
+
+    @staticmethod
+    def _next_due(cfg: ChannelConfig, prev: _Stored | None, now: float) -> float:
+        """Сітка store_period_sec без дрейфу: наступний слот від попереднього."""
+        period = cfg.store_period_sec
+        if not period:
+            return now
+        if prev is not None and prev.due + period > now:
+            return prev.due + period
+        return now + period
+
+    @staticmethod
+    def _changed(cfg: ChannelConfig, last: float | None, value: float | None) -> bool:
+        if last is None or value is None:
+            return (last is None) != (value is None)
+        if cfg.deadband_abs is None and cfg.deadband_rel is None:
+            return True
+        threshold = max(cfg.deadband_abs or 0.0, (cfg.deadband_rel or 0.0) * abs(last))
+        return abs(value - last) > threshold
+
+    def forget(self, channel_id: int) -> None:
+        """Скинути стан каналу (змінився конфіг) — наступне значення буде записано."""
+        self._last.pop(channel_id, None)
+
+    def reset(self) -> None:
+        """
+        Скинути стан усіх каналів.
+
+        Викликається коли цикл не записано в БД: збережене в стані значення
+        фактично не потрапило в measurements, тож наступний цикл пише все.
+        """
+        self._last.clear()
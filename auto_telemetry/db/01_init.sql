@@ -42,6 +42,11 @@ CREATE TABLE channel_config (
     phys_min        REAL NOT NULL,
     phys_max        REAL NOT NULL,
     enabled         BOOLEAN DEFAULT TRUE,
+    -- Політика зберігання (collector/storage_policy.py); всі NULL → запис кожен цикл
+    deadband_abs    REAL,           -- абсолютна зона нечутливості, фіз. одиниці
+    deadband_rel    REAL,           -- відносна зона нечутливості, частка від |last|
+    heartbeat_sec   REAL,           -- примусовий запис не рідше ніж раз на N сек
+    store_period_sec REAL,          -- запис не частіше ніж раз на N сек (швидкі канали)
     updated_at      TIMESTAMPTZ DEFAULT NOW()
 );
 
@@ -74,21 +79,193 @@ CREATE TRIGGER channel_config_update_trigger
 BEFORE UPDATE ON channel_config
 FOR EACH ROW EXECUTE FUNCTION channel_config_on_update();
 
+-- INSERT/DELETE теж сповіщають колектор (інкрементальне оновлення по channel_id)
+CREATE OR REPLACE FUNCTION channel_config_notify()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('config_changed', OLD.channel_id::text);
+    ELSE
+        PERFORM pg_notify('config_changed', NEW.channel_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER channel_config_notify_trigger
+AFTER INSERT OR DELETE ON channel_config
+FOR EACH ROW EXECUTE FUNCTION channel_config_notify();
+
 CREATE TABLE measurements (
     time        TIMESTAMPTZ NOT NULL,
     channel_id  SMALLINT NOT NULL REFERENCES channel_config(channel_id),
     value       DOUBLE PRECISION
-);
+) PARTITION BY RANGE (time);
+
+-- Денні партиції measurements_YYYYMMDD (доба UTC) створює наперед колектор
+-- (PartitionMaintainer → ensure_measurement_partitions). Рядки поза ними
+-- (напр. годинник до синхронізації NTP) потрапляють у default; retention
+-- видаляє їх звідти порядково (drop_old_measurement_partitions).
+CREATE TABLE measurements_default PARTITION OF measurements DEFAULT;
 
 CREATE INDEX ON measurements (channel_id, time DESC);
-CREATE INDEX ON measurements (time DESC);
+-- Рядки надходять у порядку часу — BRIN у сотні разів менший за B-tree
+CREATE INDEX ON measurements USING BRIN (time) WITH (pages_per_range = 32);
+
+-- ── Широкий формат (STORAGE_LAYOUT=wide): один рядок на цикл ─────────────
+-- Значення vals[i] належить каналу channel_ids[i] розкладки layout_id.
+-- Нова розкладка створюється колектором при зміні набору увімкнених каналів.
+CREATE TABLE measurement_layouts (
+    layout_id   SERIAL PRIMARY KEY,
+    channel_ids SMALLINT[] NOT NULL UNIQUE,
+    created_at  TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE measurements_wide (
+    time        TIMESTAMPTZ NOT NULL,
+    layout_id   INTEGER NOT NULL REFERENCES measurement_layouts(layout_id),
+    vals        DOUBLE PRECISION[] NOT NULL   -- NULL — помилка читання, NaN — не записано (deadband)
+) PARTITION BY RANGE (time);
+
+CREATE TABLE measurements_wide_default PARTITION OF measurements_wide DEFAULT;
+
+-- Рядок на цикл — B-tree по time дешевий і дає миттєвий MAX(time)
+CREATE INDEX ON measurements_wide (time DESC);
+
+-- Вузьке представлення обох форматів: (time, channel_id, value)
+CREATE VIEW measurements_all AS
+    SELECT time, channel_id, value FROM measurements
+    UNION ALL
+    SELECT w.time, u.channel_id, u.value
+    FROM measurements_wide w
+    JOIN measurement_layouts l ON l.layout_id = w.layout_id
+    CROSS JOIN LATERAL unnest(l.channel_ids, w.vals) AS u(channel_id, value)
+    WHERE u.value IS DISTINCT FROM 'NaN'::DOUBLE PRECISION;
+
+-- Створити партиції measurements і measurements_wide на вчора..сьогодні+days_ahead.
+-- Якщо в default уже є рядки цієї доби — переносяться в нову таблицю перед ATTACH.
+-- Повертає к-сть створених.
+CREATE OR REPLACE FUNCTION ensure_measurement_partitions(days_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    parent  TEXT;
+    d       DATE;
+    lo      TIMESTAMPTZ;
+    hi      TIMESTAMPTZ;
+    tname   TEXT;
+    moving  BOOLEAN;
+    created INTEGER := 0;
+BEGIN
+    FOREACH parent IN ARRAY ARRAY['measurements', 'measurements_wide'] LOOP
+        CONTINUE WHEN to_regclass(parent) IS NULL;
+        FOR i IN -1..days_ahead LOOP
+            d     := (now() AT TIME ZONE 'UTC')::DATE + i;
+            lo    := d::TIMESTAMP AT TIME ZONE 'UTC';
+            hi    := (d + 1)::TIMESTAMP AT TIME ZONE 'UTC';
+            tname := parent || '_' || to_char(d, 'YYYYMMDD');
+            CONTINUE WHEN to_regclass(tname) IS NOT NULL;
 
--- Retention закоментовано — pg_cron потребує окремого встановлення
--- SELECT cron.schedule(
---     'retention-measurements',
---     '0 3 * * *',
---     $$DELETE FROM measurements WHERE time < NOW() - INTERVAL '90 days'$$
--- );
+            -- Вставки в default чекають до кінця транзакції: рядок цієї доби, що
+            -- прийшов би між переносом і ATTACH, знову ліг би в default, і ATTACH
+            -- (як і CREATE … PARTITION OF) впав би на обмеженні партиції
+            EXECUTE format('LOCK TABLE %I IN SHARE ROW EXCLUSIVE MODE', parent || '_default');
+            EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE time >= $1 AND time < $2)',
+                           parent || '_default')
+                INTO moving USING lo, hi;
+            IF moving THEN
+                EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS)', tname, parent);
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM %I WHERE time >= %L AND time < %L RETURNING *)
+                     INSERT INTO %I SELECT * FROM moved', parent || '_default', lo, hi, tname);
+                EXECUTE format(
+                    'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                    parent, tname, lo, hi);
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                    tname, parent, lo, hi);
+            END IF;
+            created := created + 1;
+        END LOOP;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Retention: DROP цілих денних партицій (без DELETE/VACUUM).
+-- local_retention_days не задано (ack ігнорується) — партиції старші за
+-- retention_days (0 — не видаляти). Задано — тільки підтверджене (sync_ack)
+-- і старше за local_retention_days; до першого підтвердження (або без
+-- таблиці sync_ack) не видаляється нічого.
+CREATE OR REPLACE FUNCTION drop_old_measurement_partitions(
+    retention_days INTEGER, local_retention_days INTEGER DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    today   DATE := (now() AT TIME ZONE 'UTC')::DATE;
+    cutoff  TIMESTAMPTZ;
+    acked   TIMESTAMPTZ;
+    parent  TEXT;
+    r       RECORD;
+    expired BOOLEAN;
+    dropped INTEGER := 0;
+BEGIN
+    IF retention_days > 0 THEN
+        cutoff := (today - retention_days)::TIMESTAMP AT TIME ZONE 'UTC';
+    END IF;
+    IF local_retention_days IS NOT NULL THEN
+        IF to_regclass('sync_ack') IS NOT NULL THEN
+            EXECUTE 'SELECT acked_to FROM sync_ack' INTO acked;
+        END IF;
+        IF acked IS NULL THEN
+            RETURN 0;   -- нічого не підтверджено — нічого не видаляємо
+        END IF;
+        cutoff := LEAST(acked, (today - local_retention_days)::TIMESTAMP AT TIME ZONE 'UTC');
+    END IF;
+    IF cutoff IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    FOREACH parent IN ARRAY ARRAY['measurements', 'measurements_wide'] LOOP
+        CONTINUE WHEN to_regclass(parent) IS NULL;
+        FOR r IN
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(parent)
+              AND c.relname ~ ('^' || parent || '_[0-9]{8}$')
+              -- верхня межа партиції (кінець доби) не пізніше cutoff
+              AND (to_date(right(c.relname, 8), 'YYYYMMDD') + 1)::TIMESTAMP AT TIME ZONE 'UTC' <= cutoff
+        LOOP
+            EXECUTE format('DROP TABLE %I', r.relname);
+            dropped := dropped + 1;
+        END LOOP;
+        -- Рядки поза денними партиціями (годинник до NTP) — порядково, за тим самим cutoff
+        IF to_regclass(parent || '_default') IS NOT NULL THEN
+            EXECUTE format('DELETE FROM %I WHERE time < $1', parent || '_default') USING cutoff;
+        END IF;
+    END LOOP;
+
+    -- Дані до переходу на партиції (migrate_partitioned_measurements.sql) — одна партиція
+    IF to_regclass('measurements_legacy') IS NOT NULL THEN
+        EXECUTE 'SELECT max(time) < $1 FROM measurements_legacy' INTO expired USING cutoff;
+        IF expired IS NOT FALSE THEN
+            DROP TABLE measurements_legacy;
+            dropped := dropped + 1;
+        END IF;
+    END IF;
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ensure_measurement_partitions();
+
+-- Підтвердження Fleet Server: рядки з time < acked_to надійно збережені на сервері
+-- (POST /sync/ack). Один рядок; acked_to тільки росте.
+CREATE TABLE sync_ack (
+    id          SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    acked_to    TIMESTAMPTZ NOT NULL,
+    acked_at    TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
 
 CREATE TABLE alarm_rules (
     id          BIGSERIAL PRIMARY KEY,
@@ -132,6 +309,19 @@ CREATE TRIGGER alarm_rules_update_trigger
 BEFORE UPDATE ON alarm_rules
 FOR EACH ROW EXECUTE FUNCTION alarm_rules_on_update();
 
+-- Monitor тримає правила в пам'яті й перечитує їх за цим сповіщенням
+CREATE OR REPLACE FUNCTION alarm_rules_notify()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('alarm_rules_changed', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER alarm_rules_notify_trigger
+AFTER INSERT OR UPDATE OR DELETE ON alarm_rules
+FOR EACH STATEMENT EXECUTE FUNCTION alarm_rules_notify();
+
 CREATE TABLE alarms_log (
     id           BIGSERIAL PRIMARY KEY,
     rule_id      BIGINT REFERENCES alarm_rules(id),
@@ -139,11 +329,33 @@ CREATE TABLE alarms_log (
     triggered_at TIMESTAMPTZ DEFAULT NOW(),
     resolved_at  TIMESTAMPTZ,
     value        DOUBLE PRECISION,
-    message      TEXT
+    message      TEXT,
+    -- Лічильник змін (вставка / закриття) для GET /sync?alarm_seq=
+    change_seq   BIGINT
 );
 
 CREATE INDEX ON alarms_log (channel_id, triggered_at DESC);
 CREATE INDEX ON alarms_log (resolved_at) WHERE resolved_at IS NULL;
+CREATE INDEX ON alarms_log (change_seq);
+
+CREATE SEQUENCE alarms_log_change_seq;
+
+-- nextval() видає номер до COMMIT: без серіалізації транзакція з меншим номером
+-- може закомітитися пізніше за курсор alarm_seq, який уже пройшов її номер, —
+-- і запис загубиться. Замок до кінця транзакції (ключ — oid послідовності)
+-- видає номери в порядку комітів; записи в alarms_log рідкі й короткі.
+CREATE OR REPLACE FUNCTION alarms_log_bump_change_seq()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock('alarms_log_change_seq'::regclass::oid::bigint);
+    NEW.change_seq = nextval('alarms_log_change_seq');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER alarms_log_change_seq_trigger
+BEFORE INSERT OR UPDATE ON alarms_log
+FOR EACH ROW EXECUTE FUNCTION alarms_log_bump_change_seq();
 
 -- Права для telemetry на всі таблиці
 GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA public TO telemetry;
@@ -0,0 +1,39 @@
+-- Лічильник змін alarms_log для GET /sync?alarm_seq= (Outbound API)
+-- для існуючої БД.
+--
+-- Запуск:
+--   psql -U telemetry -d telemetry -f db/migrate_alarm_change_seq.sql
+
+BEGIN;
+
+ALTER TABLE alarms_log ADD COLUMN IF NOT EXISTS change_seq BIGINT;
+
+CREATE SEQUENCE IF NOT EXISTS alarms_log_change_seq;
+
+-- Наявні записи — до встановлення тригера
+UPDATE alarms_log SET change_seq = nextval('alarms_log_change_seq')
+WHERE change_seq IS NULL;
+
+CREATE INDEX IF NOT EXISTS alarms_log_change_seq_idx ON alarms_log (change_seq);
+
+-- nextval() видає номер до COMMIT: без серіалізації транзакція з меншим номером
+-- може закомітитися пізніше за курсор alarm_seq, який уже пройшов її номер, —
+-- і запис загубиться. Замок до кінця транзакції (ключ — oid послідовності)
+-- видає номери в порядку комітів; записи в alarms_log рідкі й короткі.
+CREATE OR REPLACE FUNCTION alarms_log_bump_change_seq()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock('alarms_log_change_seq'::regclass::oid::bigint);
+    NEW.change_seq = nextval('alarms_log_change_seq');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS alarms_log_change_seq_trigger ON alarms_log;
+CREATE TRIGGER alarms_log_change_seq_trigger
+BEFORE INSERT OR UPDATE ON alarms_log
+FOR EACH ROW EXECUTE FUNCTION alarms_log_bump_change_seq();
+
+GRANT ALL PRIVILEGES ON SEQUENCE alarms_log_change_seq TO telemetry;
+
+COMMIT;
@@ -0,0 +1,22 @@
+-- NOTIFY alarm_rules_changed для Monitor (перечитування правил без рестарту)
+-- для існуючої БД.
+--
+-- Запуск:
+--   psql -U telemetry -d telemetry -f db/migrate_alarm_rules_notify.sql
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION alarm_rules_notify()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('alarm_rules_changed', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS alarm_rules_notify_trigger ON alarm_rules;
+CREATE TRIGGER alarm_rules_notify_trigger
+AFTER INSERT OR UPDATE OR DELETE ON alarm_rules
+FOR EACH STATEMENT EXECUTE FUNCTION alarm_rules_notify();
+
+COMMIT;
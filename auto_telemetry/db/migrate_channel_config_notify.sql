@@ -0,0 +1,27 @@
+-- NOTIFY config_changed і на INSERT/DELETE каналу (інкрементальне оновлення
+-- конфігу колектора, ChannelPlan.apply) для існуючої БД.
+-- UPDATE сповіщає channel_config_on_update, як і раніше.
+--
+-- Запуск:
+--   psql -U telemetry -d telemetry -f db/migrate_channel_config_notify.sql
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION channel_config_notify()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('config_changed', OLD.channel_id::text);
+    ELSE
+        PERFORM pg_notify('config_changed', NEW.channel_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS channel_config_notify_trigger ON channel_config;
+CREATE TRIGGER channel_config_notify_trigger
+AFTER INSERT OR DELETE ON channel_config
+FOR EACH ROW EXECUTE FUNCTION channel_config_notify();
+
+COMMIT;
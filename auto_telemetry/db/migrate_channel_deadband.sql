@@ -0,0 +1,14 @@
+-- Політика зберігання deadband/heartbeat (collector/storage_policy.py)
+-- для існуючої БД. Усі NULL → запис кожен цикл, як раніше.
+--
+-- Запуск:
+--   psql -U telemetry -d telemetry -f db/migrate_channel_deadband.sql
+
+BEGIN;
+
+ALTER TABLE channel_config
+    ADD COLUMN IF NOT EXISTS deadband_abs  REAL,    -- абсолютна зона нечутливості, фіз. одиниці
+    ADD COLUMN IF NOT EXISTS deadband_rel  REAL,    -- відносна зона нечутливості, частка від |last|
+    ADD COLUMN IF NOT EXISTS heartbeat_sec REAL;    -- примусовий запис не рідше ніж раз на N сек
+
+COMMIT;
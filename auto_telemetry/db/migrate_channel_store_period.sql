@@ -0,0 +1,12 @@
+-- Обмеження частоти запису швидких каналів (channel_config.store_period_sec)
+-- для існуючої БД. NULL → без обмеження.
+--
+-- Запуск:
+--   psql -U telemetry -d telemetry -f db/migrate_channel_store_period.sql
+
+BEGIN;
+
+ALTER TABLE channel_config
+    ADD COLUMN IF NOT EXISTS store_period_sec REAL;    -- запис не частіше ніж раз на N сек (швидкі канали)
+
+COMMIT;
@@ -0,0 +1,155 @@
+-- Перехід існуючої БД на партиціоновану measurements (денні партиції + BRIN)
+--
+-- Запуск (collector зупинено):
+--   psql -U telemetry -d telemetry -f db/migrate_partitioned_measurements.sql
+--
+-- Історичні дані не копіюються: стара таблиця приєднується партицією
+-- measurements_legacy до початку вчорашньої доби UTC і видаляється цілком,
+-- коли її найновіший рядок виходить за MEASUREMENTS_RETENTION_DAYS.
+-- Останні ~2 доби переносяться в денні партиції.
+
+BEGIN;
+
+ALTER TABLE measurements RENAME TO measurements_legacy;
+
+CREATE TABLE measurements (
+    time        TIMESTAMPTZ NOT NULL,
+    channel_id  SMALLINT NOT NULL REFERENCES channel_config(channel_id),
+    value       DOUBLE PRECISION
+) PARTITION BY RANGE (time);
+
+CREATE TABLE measurements_default PARTITION OF measurements DEFAULT;
+
+CREATE INDEX ON measurements (channel_id, time DESC);
+CREATE INDEX ON measurements USING BRIN (time) WITH (pages_per_range = 32);
+
+-- Створити партиції measurements і measurements_wide на вчора..сьогодні+days_ahead.
+-- Якщо в default уже є рядки цієї доби — переносяться в нову таблицю перед ATTACH.
+-- Повертає к-сть створених.
+CREATE OR REPLACE FUNCTION ensure_measurement_partitions(days_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    parent  TEXT;
+    d       DATE;
+    lo      TIMESTAMPTZ;
+    hi      TIMESTAMPTZ;
+    tname   TEXT;
+    moving  BOOLEAN;
+    created INTEGER := 0;
+BEGIN
+    FOREACH parent IN ARRAY ARRAY['measurements', 'measurements_wide'] LOOP
+        CONTINUE WHEN to_regclass(parent) IS NULL;
+        FOR i IN -1..days_ahead LOOP
+            d     := (now() AT TIME ZONE 'UTC')::DATE + i;
+            lo    := d::TIMESTAMP AT TIME ZONE 'UTC';
+            hi    := (d + 1)::TIMESTAMP AT TIME ZONE 'UTC';
+            tname := parent || '_' || to_char(d, 'YYYYMMDD');
+            CONTINUE WHEN to_regclass(tname) IS NOT NULL;
+
+            -- Вставки в default чекають до кінця транзакції: рядок цієї доби, що
+            -- прийшов би між переносом і ATTACH, знову ліг би в default, і ATTACH
+            -- (як і CREATE … PARTITION OF) впав би на обмеженні партиції
+            EXECUTE format('LOCK TABLE %I IN SHARE ROW EXCLUSIVE MODE', parent || '_default');
+            EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE time >= $1 AND time < $2)',
+                           parent || '_default')
+                INTO moving USING lo, hi;
+            IF moving THEN
+                EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS)', tname, parent);
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM %I WHERE time >= %L AND time < %L RETURNING *)
+                     INSERT INTO %I SELECT * FROM moved', parent || '_default', lo, hi, tname);
+                EXECUTE format(
+                    'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                    parent, tname, lo, hi);
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                    tname, parent, lo, hi);
+            END IF;
+            created := created + 1;
+        END LOOP;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Retention: DROP цілих денних партицій (без DELETE/VACUUM).
+-- local_retention_days не задано (ack ігнорується) — партиції старші за
+-- retention_days (0 — не видаляти). Задано — тільки підтверджене (sync_ack)
+-- і старше за local_retention_days; до першого підтвердження (або без
+-- таблиці sync_ack) не видаляється нічого.
+CREATE OR REPLACE FUNCTION drop_old_measurement_partitions(
+    retention_days INTEGER, local_retention_days INTEGER DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    today   DATE := (now() AT TIME ZONE 'UTC')::DATE;
+    cutoff  TIMESTAMPTZ;
+    acked   TIMESTAMPTZ;
+    parent  TEXT;
+    r       RECORD;
+    expired BOOLEAN;
+    dropped INTEGER := 0;
+BEGIN
+    IF retention_days > 0 THEN
+        cutoff := (today - retention_days)::TIMESTAMP AT TIME ZONE 'UTC';
+    END IF;
+    IF local_retention_days IS NOT NULL THEN
+        IF to_regclass('sync_ack') IS NOT NULL THEN
+            EXECUTE 'SELECT acked_to FROM sync_ack' INTO acked;
+        END IF;
+        IF acked IS NULL THEN
+            RETURN 0;   -- нічого не підтверджено — нічого не видаляємо
+        END IF;
+        cutoff := LEAST(acked, (today - local_retention_days)::TIMESTAMP AT TIME ZONE 'UTC');
+    END IF;
+    IF cutoff IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    FOREACH parent IN ARRAY ARRAY['measurements', 'measurements_wide'] LOOP
+        CONTINUE WHEN to_regclass(parent) IS NULL;
+        FOR r IN
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(parent)
+              AND c.relname ~ ('^' || parent || '_[0-9]{8}$')
+              -- верхня межа партиції (кінець доби) не пізніше cutoff
+              AND (to_date(right(c.relname, 8), 'YYYYMMDD') + 1)::TIMESTAMP AT TIME ZONE 'UTC' <= cutoff
+        LOOP
+            EXECUTE format('DROP TABLE %I', r.relname);
+            dropped := dropped + 1;
+        END LOOP;
+        -- Рядки поза денними партиціями (годинник до NTP) — порядково, за тим самим cutoff
+        IF to_regclass(parent || '_default') IS NOT NULL THEN
+            EXECUTE format('DELETE FROM %I WHERE time < $1', parent || '_default') USING cutoff;
+        END IF;
+    END LOOP;
+
+    -- Дані до переходу на партиції (migrate_partitioned_measurements.sql) — одна партиція
+    IF to_regclass('measurements_legacy') IS NOT NULL THEN
+        EXECUTE 'SELECT max(time) < $1 FROM measurements_legacy' INTO expired USING cutoff;
+        IF expired IS NOT FALSE THEN
+            DROP TABLE measurements_legacy;
+            dropped := dropped + 1;
+        END IF;
+    END IF;
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    edge TIMESTAMPTZ := ((now() AT TIME ZONE 'UTC')::DATE - 1)::TIMESTAMP AT TIME ZONE 'UTC';
+BEGIN
+    WITH moved AS (DELETE FROM measurements_legacy WHERE time >= edge RETURNING *)
+    INSERT INTO measurements_default SELECT * FROM moved;
+    EXECUTE format(
+        'ALTER TABLE measurements ATTACH PARTITION measurements_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+        edge);
+END $$;
+
+-- Переносить рядки останніх діб з default у денні партиції
+SELECT ensure_measurement_partitions();
+
+COMMIT;
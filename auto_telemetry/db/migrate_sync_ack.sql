@@ -0,0 +1,86 @@
+-- Підтвердження sync (POST /sync/ack) і retention з урахуванням підтверджень
+-- для існуючої БД.
+--
+-- Передумова: migrate_partitioned_measurements.sql.
+-- Запуск:
+--   psql -U telemetry -d telemetry -f db/migrate_sync_ack.sql
+
+BEGIN;
+
+-- Підтвердження Fleet Server: рядки з time < acked_to надійно збережені на сервері
+-- (POST /sync/ack). Один рядок; acked_to тільки росте.
+CREATE TABLE sync_ack (
+    id          SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    acked_to    TIMESTAMPTZ NOT NULL,
+    acked_at    TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Попередня версія з одним аргументом — інакше виклик з одним аргументом неоднозначний
+DROP FUNCTION IF EXISTS drop_old_measurement_partitions(INTEGER);
+
+-- Retention: DROP цілих денних партицій (без DELETE/VACUUM).
+-- local_retention_days не задано (ack ігнорується) — партиції старші за
+-- retention_days (0 — не видаляти). Задано — тільки підтверджене (sync_ack)
+-- і старше за local_retention_days; до першого підтвердження (або без
+-- таблиці sync_ack) не видаляється нічого.
+CREATE OR REPLACE FUNCTION drop_old_measurement_partitions(
+    retention_days INTEGER, local_retention_days INTEGER DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    today   DATE := (now() AT TIME ZONE 'UTC')::DATE;
+    cutoff  TIMESTAMPTZ;
+    acked   TIMESTAMPTZ;
+    parent  TEXT;
+    r       RECORD;
+    expired BOOLEAN;
+    dropped INTEGER := 0;
+BEGIN
+    IF retention_days > 0 THEN
+        cutoff := (today - retention_days)::TIMESTAMP AT TIME ZONE 'UTC';
+    END IF;
+    IF local_retention_days IS NOT NULL THEN
+        IF to_regclass('sync_ack') IS NOT NULL THEN
+            EXECUTE 'SELECT acked_to FROM sync_ack' INTO acked;
+        END IF;
+        IF acked IS NULL THEN
+            RETURN 0;   -- нічого не підтверджено — нічого не видаляємо
+        END IF;
+        cutoff := LEAST(acked, (today - local_retention_days)::TIMESTAMP AT TIME ZONE 'UTC');
+    END IF;
+    IF cutoff IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    FOREACH parent IN ARRAY ARRAY['measurements', 'measurements_wide'] LOOP
+        CONTINUE WHEN to_regclass(parent) IS NULL;
+        FOR r IN
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(parent)
+              AND c.relname ~ ('^' || parent || '_[0-9]{8}$')
+              -- верхня межа партиції (кінець доби) не пізніше cutoff
+              AND (to_date(right(c.relname, 8), 'YYYYMMDD') + 1)::TIMESTAMP AT TIME ZONE 'UTC' <= cutoff
+        LOOP
+            EXECUTE format('DROP TABLE %I', r.relname);
+            dropped := dropped + 1;
+        END LOOP;
+        -- Рядки поза денними партиціями (годинник до NTP) — порядково, за тим самим cutoff
+        IF to_regclass(parent || '_default') IS NOT NULL THEN
+            EXECUTE format('DELETE FROM %I WHERE time < $1', parent || '_default') USING cutoff;
+        END IF;
+    END LOOP;
+
+    -- Дані до переходу на партиції (migrate_partitioned_measurements.sql) — одна партиція
+    IF to_regclass('measurements_legacy') IS NOT NULL THEN
+        EXECUTE 'SELECT max(time) < $1 FROM measurements_legacy' INTO expired USING cutoff;
+        IF expired IS NOT FALSE THEN
+            DROP TABLE measurements_legacy;
+            dropped := dropped + 1;
+        END IF;
+    END IF;
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMIT;
@@ -0,0 +1,150 @@
+"""
+Monitor ↔ PostgreSQL: правила тривог, журнал alarms_log, LISTEN alarm_rules_changed.
+"""
+
+import logging
+import queue
+import select
+import threading
+import time
+from datetime import datetime
+
+import psycopg2
+import psycopg2.extras
+
+from rules import Rule, Transition, describe
+
+logger = logging.getLogger(__name__)
+
+
+def load_rules(conn) -> list[Rule]:
+    """Увімкнені правила alarm_rules."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT id, channel_id, name, rule_type, threshold, gradient, window_sec,
+                   COALESCE(severity, 'warning')
+            FROM alarm_rules
+            WHERE enabled
+            ORDER BY id
+        """)
+        rows = cur.fetchall()
+    conn.commit()
+    return [Rule(*row) for row in rows]
+
+
+def load_open_alarms(conn) -> dict[int, int]:
+    """Незакриті тривоги з попереднього запуску: rule_id → alarm_id (найновіша)."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT DISTINCT ON (rule_id) rule_id, id
+            FROM alarms_log
+            WHERE resolved_at IS NULL AND rule_id IS NOT NULL
+            ORDER BY rule_id, triggered_at DESC
+        """)
+        rows = cur.fetchall()
+    conn.commit()
+    return dict(rows)
+
+
+class AlarmLog:
+    """
+    Запис переходів у alarms_log — один round-trip на цикл з подіями:
+    INSERT … RETURNING для нових тривог, UPDATE … WHERE id = ANY(…) для закритих.
+    Тримає відповідність rule_id → alarm_id активних тривог.
+    """
+
+    def __init__(self, open_alarms: dict[int, int] | None = None):
+        self.open: dict[int, int] = dict(open_alarms or {})
+
+    def write(self, conn, at: datetime, transitions: list[Transition]) -> dict[int, int | None]:
+        """
+        Повертає alarm_id кожного переходу (rule_id → alarm_id).
+        Закриття тривоги, відкритої без id (збій БД), — лише подія, без UPDATE.
+        """
+        ids: dict[int, int | None] = {}
+        inserts = [(t.rule.id, t.rule.channel_id, at, t.value, describe(t))
+                   for t in transitions if t.event == 'triggered']
+        resolves = []
+        for t in transitions:
+            if t.event == 'resolved':
+                ids[t.rule.id] = alarm_id = self.open.pop(t.rule.id, None)
+                if alarm_id is not None:
+                    resolves.append(alarm_id)
+        if not inserts and not resolves:
+            return ids
+        with conn.cursor() as cur:
+            if resolves:
+                cur.execute('UPDATE alarms_log SET resolved_at = %s WHERE id = ANY(%s)',
+                            (at, resolves))
+            if inserts:
+                rows = psycopg2.extras.execute_values(
+                    cur,
+                    'INSERT INTO alarms_log (rule_id, channel_id, triggered_at, value, message) '
+                    'VALUES %s RETURNING rule_id, id',
+                    inserts, fetch=True,
+                )
+                for rule_id, alarm_id in rows:
+                    ids[rule_id] = self.open[rule_id] = alarm_id
+        conn.commit()
+        return ids
+
+    def close_orphans(self, conn, at: datetime, rule_ids: list[int]) -> None:
+        """Закрити тривоги правил, яких більше немає серед увімкнених."""
+        alarm_ids = [self.open.pop(rid) for rid in rule_ids if rid in self.open]
+        if not alarm_ids:
+            return
+        with conn.cursor() as cur:
+            cur.execute('UPDATE alarms_log SET resolved_at = %s WHERE id = ANY(%s)',
+                        (at, alarm_ids))
+        conn.commit()
+
+
+class RulesListener(threading.Thread):
+    """
+    Фоновий потік: LISTEN alarm_rules_changed → повний набір правил у out (queue).
+
+    Правил одиниці-десятки — перечитуються цілком; пачка NOTIFY за debounce
+    секунд дає одне перечитування. Після (пере)підключення — теж перечитування,
+    бо повідомлення за час розриву втрачено.
+    """
+
+    def __init__(self, dsn: str, out: queue.Queue, debounce: float = 0.3):
+        super().__init__(daemon=True, name='rules-listener')
+        self._dsn = dsn
+        self._out = out
+        self._debounce = debounce
+
+    def run(self):
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self._dsn)
+                conn.set_isolation_level(0)  # autocommit — обов'язково для LISTEN
+                with conn.cursor() as cur:
+                    cur.execute('LISTEN alarm_rules_changed;')
+                logger.info('RulesListener: LISTEN alarm_rules_changed')
+                self._out.put(load_rules(conn))
+                self._listen(conn)
+            except Exception as e:
+                logger.error('RulesListener: %s — reconnect in 5s', e)
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                time.sleep(5)
+
+    def _listen(self, conn) -> None:
+        while True:
+            if not select.select([conn], [], [], 5.0)[0]:
+                continue
+            conn.poll()
+            if not conn.notifies:
+                continue
+            # Дочекатися кінця пачки змін (масовий UPDATE, імпорт правил)
+            time.sleep(self._debounce)
+            conn.poll()
+            conn.notifies.clear()
+            rules = load_rules(conn)
+            logger.info('RulesListener: alarm_rules_changed → %d правил', len(rules))
+            self._out.put(rules)
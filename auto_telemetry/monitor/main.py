@@ -0,0 +1,253 @@
+"""
+Monitor — виявлення аномалій у реальному часі (ADR-001).
+
+ZeroMQ SUB на шину колектора (topic data або bdata) → інкрементальна
+оцінка alarm_rules → alarms_log (батч на цикл) → ZeroMQ PUB topic alarm.
+
+Правила оцінюються векторно (vector_rules.py), якщо встановлено NumPy;
+інакше — RuleEngine з тією ж семантикою. Пакети, що накопичились у SUB
+(наприклад, після паузи GC чи перечитування правил), оцінюються пачкою.
+
+Запуск: python monitor/main.py
+"""
+
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Дозволяє запускати як скрипт: python monitor/main.py
+_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(1, str(_ROOT))
+
+import psycopg2
+import zmq
+from dotenv import load_dotenv
+
+from alarm_store import AlarmLog, RulesListener, load_open_alarms, load_rules
+from collector.frames import TOPIC_BINARY, TOPIC_JSON, decode_frame, iter_readings
+from rules import RuleEngine, Transition, describe
+
+try:
+    from vector_rules import VectorEngine
+except ImportError:     # NumPy не встановлено
+    VectorEngine = None
+
+load_dotenv(_ROOT / '.env')
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)-8s %(name)s: %(message)s',
+)
+logger = logging.getLogger('monitor')
+
+TOPIC_ALARM = b'alarm'
+# Макс. пакетів, що вичитуються з SUB за одну ітерацію
+_MAX_BATCH = 100
+
+Packet = tuple[datetime, array, array]   # (cycle_time, ids 'H', values 'd'; NaN = null)
+
+
+def _dsn() -> str:
+    return (
+        f"host={os.getenv('DB_HOST', 'localhost')} "
+        f"port={os.getenv('DB_PORT', '5432')} "
+        f"dbname={os.getenv('DB_NAME', 'telemetry')} "
+        f"user={os.getenv('DB_USER', 'telemetry')} "
+        f"password={os.getenv('DB_PASSWORD', '')}"
+    )
+
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def parse_packet(parts: list[bytes]) -> Packet:
+    """Пакет шини даних (JSON або бінарний) → (cycle_time, ids, values)."""
+    if parts[0] == TOPIC_BINARY:
+        cycle_time_ns, ids, values = decode_frame(parts[1])
+        return datetime.fromtimestamp(cycle_time_ns / 1e9, timezone.utc), ids, values
+    payload = json.loads(parts[1])
+    cycle_time = datetime.fromisoformat(payload['cycle_time'].replace('Z', '+00:00'))
+    readings = payload['readings']
+    return (cycle_time,
+            array('H', [r['channel_id'] for r in readings]),
+            array('d', [float('nan') if r['value'] is None else r['value'] for r in readings]))
+
+
+def evaluate(engine, packets: list[Packet]) -> list[tuple[datetime, list[Transition]]]:
+    """
+    Пакети → переходи кожного циклу. VectorEngine отримує підряд ідучі пакети
+    з однаковим набором каналів однією пачкою.
+    """
+    out = []
+    if VectorEngine is not None and isinstance(engine, VectorEngine):
+        i = 0
+        while i < len(packets):
+            ids = packets[i][1]
+            j = i + 1
+            while j < len(packets) and packets[j][1] == ids:
+                j += 1
+            group = packets[i:j]
+            per_cycle = engine.feed_batch([p[0].timestamp() for p in group], ids,
+                                          [p[2] for p in group])
+            out += zip((p[0] for p in group), per_cycle)
+            i = j
+        return out
+    for cycle_time, ids, values in packets:
+        out.append((cycle_time, engine.feed(cycle_time.timestamp(), iter_readings(ids, values))))
+    return out
+
+
+def event_payload(tr: Transition, alarm_id: int | None, at: datetime) -> dict:
+    """Подія шини тривог (ADR-001 § 2)."""
+    r = tr.rule
+    if tr.event == 'resolved':
+        return {'event': 'resolved', 'alarm_id': alarm_id, 'rule_id': r.id,
+                'channel_id': r.channel_id, 'resolved_at': _iso(at)}
+    return {
+        'event':        'triggered',
+        'alarm_id':     alarm_id,
+        'rule_id':      r.id,
+        'channel_id':   r.channel_id,
+        'alarm_type':   r.alarm_type,
+        'value':        tr.value,
+        'threshold':    r.limit,
+        'severity':     r.severity,
+        'message':      describe(tr),
+        'triggered_at': _iso(at),
+    }
+
+
+def _connect_db(dsn: str):
+    try:
+        conn = psycopg2.connect(dsn, connect_timeout=5)
+        logger.info('DB підключено')
+        return conn
+    except Exception as e:
+        logger.error('DB підключення: %s', e)
+        return None
+
+
+class AlarmSink:
+    """Переходи циклу → alarms_log (best-effort, з перепідключенням) + шина тривог."""
+
+    def __init__(self, dsn: str, db_conn, alarm_log: AlarmLog, pub, reconnect_delay: float = 5.0):
+        self._dsn = dsn
+        self._db_conn = db_conn
+        self._log = alarm_log
+        self._pub = pub
+        self._reconnect_delay = reconnect_delay
+        self._retry_at = 0.0
+
+    def handle(self, at: datetime, transitions: list[Transition]) -> None:
+        log = self._log
+        if self._db_conn is None and time.monotonic() >= self._retry_at:
+            self._retry_at = time.monotonic() + self._reconnect_delay
+            self._db_conn = _connect_db(self._dsn)
+        # alarm_id закритих відомий заздалегідь — подія resolved має його і при збої БД
+        ids: dict[int, int | None] = {tr.rule.id: log.open.get(tr.rule.id)
+                                      for tr in transitions if tr.event == 'resolved'}
+        if self._db_conn is not None:
+            try:
+                ids.update(log.write(self._db_conn, at, transitions))
+            except Exception as e:
+                logger.critical('Запис alarms_log не вдався: %s', e)
+                try:
+                    self._db_conn.close()
+                except Exception:
+                    pass
+                self._db_conn = None
+        if self._db_conn is None:
+            for rule_id in ids:
+                log.open.pop(rule_id, None)
+
+        # При збої БД події все одно публікуються (alarm_id = null для нових)
+        for tr in transitions:
+            event = event_payload(tr, ids.get(tr.rule.id), at)
+            self._pub.send_multipart([TOPIC_ALARM, json.dumps(event).encode()])
+            if tr.event == 'triggered':
+                logger.warning('ALARM %s', event['message'])
+            else:
+                logger.info('Тривогу #%s закрито (rule_id=%d)', event['alarm_id'], tr.rule.id)
+
+
+def main():
+    dsn = _dsn()
+    sub_address = os.getenv('ZMQ_COLLECTOR_PUB', 'tcp://127.0.0.1:5555')
+    pub_address = os.getenv('ZMQ_MONITOR_PUB', 'tcp://127.0.0.1:5556')
+    binary = os.getenv('ZMQ_BINARY_FRAMES', '0') == '1'
+    reconnect_delay = 5.0
+
+    # ── Правила й відкриті тривоги ───────────────────────────────────────────
+    engine = VectorEngine() if VectorEngine is not None else RuleEngine()
+    alarm_log = AlarmLog()
+    db_conn = None
+    while db_conn is None:
+        db_conn = _connect_db(dsn)
+        if db_conn is None:
+            time.sleep(reconnect_delay)
+    engine.load(load_rules(db_conn))
+    alarm_log.open = load_open_alarms(db_conn)
+    orphans = engine.restore(alarm_log.open)
+    alarm_log.close_orphans(db_conn, datetime.now(timezone.utc), orphans)
+    logger.info('Завантажено %d правил (%s), відкритих тривог %d', len(engine),
+                type(engine).__name__, len(alarm_log.open))
+
+    # Наступні зміни alarm_rules — через pg_notify, без перечитування на кожен цикл
+    rule_updates: queue.Queue = queue.Queue()
+    RulesListener(dsn, rule_updates).start()
+
+    # ── ZeroMQ ──────────────────────────────────────────────────────────────
+    ctx = zmq.Context.instance()
+    sub = ctx.socket(zmq.SUB)
+    sub.connect(sub_address)
+    sub.setsockopt(zmq.SUBSCRIBE, TOPIC_BINARY if binary else TOPIC_JSON)
+    pub = ctx.socket(zmq.PUB)
+    pub.bind(pub_address)
+    logger.info('Monitor запущено: SUB %s%s, PUB %s', sub_address,
+                ' (бінарний формат)' if binary else '', pub_address)
+
+    sink = AlarmSink(dsn, db_conn, alarm_log, pub, reconnect_delay)
+    while True:
+        cycles: list[tuple[datetime, list[Transition]]] = []
+
+        # 1. Оновлені правила (RulesListener) — останній набір з черги
+        rules = None
+        while True:
+            try:
+                rules = rule_updates.get_nowait()
+            except queue.Empty:
+                break
+        if rules is not None:
+            cycles.append((datetime.now(timezone.utc), engine.load(rules)))
+            logger.info('Правила оновлено: %d', len(engine))
+
+        # 2. Пакети колектора (poll з таймаутом — щоб оновлення правил не чекали даних);
+        #    усе, що накопичилось у черзі SUB, — однією пачкою
+        packets: list[Packet] = []
+        if sub.poll(1000):
+            while len(packets) < _MAX_BATCH:
+                try:
+                    parts = sub.recv_multipart(zmq.NOBLOCK)
+                except zmq.Again:
+                    break
+                try:
+                    packets.append(parse_packet(parts))
+                except Exception as e:
+                    logger.error('Пошкоджений пакет: %s', e)
+        cycles += evaluate(engine, packets)
+
+        for at, transitions in cycles:
+            if transitions:
+                sink.handle(at, transitions)
+
+
+if __name__ == '__main__':
+    main()
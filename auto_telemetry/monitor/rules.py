@@ -0,0 +1,245 @@
+"""
+Правила тривог Monitor — інкрементальна оцінка на потоці показів.
+
+Правила (alarm_rules) завантажуються один раз і замінюються цілком при
+NOTIFY alarm_rules_changed. На кожен показ — O(1): межі порівнюються
+напряму, віконні правила читають ковзні суми свого вікна.
+
+    rule_type        alarm_type       спрацьовує, коли
+    above            high_limit       value > threshold
+    below            low_limit        value < threshold
+    rate_of_change   rate_of_change   |Δvalue / Δt| за window_sec > gradient (од./с)
+    std_deviation    std_deviation    σ за window_sec > threshold
+"""
+
+import logging
+import math
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+ALARM_TYPES = {
+    'above':          'high_limit',
+    'below':          'low_limit',
+    'rate_of_change': 'rate_of_change',
+    'std_deviation':  'std_deviation',
+}
+_WINDOWED = ('rate_of_change', 'std_deviation')
+# window_sec = NULL у віконного правила
+DEFAULT_WINDOW_SEC = 60
+
+
+@dataclass(frozen=True)
+class Rule:
+    id: int
+    channel_id: int
+    name: str
+    rule_type: str              # ключ ALARM_TYPES
+    threshold: float | None
+    gradient: float | None      # межа швидкості зміни, од./с (rate_of_change)
+    window_sec: int | None
+    severity: str = 'warning'
+
+    @property
+    def alarm_type(self) -> str:
+        return ALARM_TYPES[self.rule_type]
+
+    @property
+    def limit(self) -> float | None:
+        if self.rule_type == 'rate_of_change' and self.gradient is not None:
+            return self.gradient
+        return self.threshold
+
+    @property
+    def window(self) -> int | None:
+        """Ширина вікна, с; None — правило без вікна."""
+        if self.rule_type not in _WINDOWED:
+            return None
+        return self.window_sec or DEFAULT_WINDOW_SEC
+
+
+@dataclass(frozen=True)
+class Transition:
+    event: str              # 'triggered' | 'resolved'
+    rule: Rule
+    value: float | None     # показ / швидкість / σ, що спричинили подію
+
+
+class Window:
+    """
+    Ковзне вікно семплів (t, v) одного каналу за span секунд.
+
+    Суми Σd і Σd² ведуться по зсунутих значеннях d = v − k (k — перший семпл
+    після спорожнення вікна), щоб σ не втрачала точність на великих значеннях
+    з малим розкидом. Додавання й витіснення — O(1) амортизовано.
+    """
+
+    __slots__ = ('span', '_buf', '_k', '_s', '_s2')
+
+    def __init__(self, span: float):
+        self.span = span
+        self._buf: deque[tuple[float, float]] = deque()
+        self._k = 0.0
+        self._s = 0.0
+        self._s2 = 0.0
+
+    def __len__(self) -> int:
+        return len(self._buf)
+
+    def add(self, t: float, v: float) -> None:
+        buf = self._buf
+        if buf and t < buf[-1][0]:
+            # Час пішов назад (рестарт колектора, корекція годинника) — вікно недійсне
+            buf.clear()
+        edge = t - self.span
+        while buf and buf[0][0] < edge:
+            d = buf.popleft()[1] - self._k
+            self._s -= d
+            self._s2 -= d * d
+        if not buf:
+            self._k, self._s, self._s2 = v, 0.0, 0.0
+        buf.append((t, v))
+        d = v - self._k
+        self._s += d
+        self._s2 += d * d
+
+    def rate(self) -> float | None:
+        """Швидкість зміни між найстарішим і найновішим семплом вікна, од./с."""
+        if len(self._buf) < 2:
+            return None
+        (t0, v0), (t1, v1) = self._buf[0], self._buf[-1]
+        return (v1 - v0) / (t1 - t0) if t1 > t0 else None
+
+    def std(self) -> float | None:
+        """Вибіркове стандартне відхилення семплів вікна."""
+        n = len(self._buf)
+        if n < 2:
+            return None
+        var = (self._s2 - self._s * self._s / n) / (n - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+
+def valid_rule(rule: Rule) -> bool:
+    if rule.rule_type not in ALARM_TYPES:
+        logger.error('alarm_rules id=%d: невідомий rule_type=%r, пропускаємо',
+                     rule.id, rule.rule_type)
+        return False
+    if rule.limit is None:
+        logger.error('alarm_rules id=%d: не задано межу (threshold/gradient), пропускаємо', rule.id)
+        return False
+    return True
+
+
+class RuleEngine:
+    """
+    Стан оцінки правил: правила по каналах, вікна (спільні для правил одного
+    каналу з однаковим window_sec) і множина активних тривог (rule_id).
+    """
+
+    def __init__(self, rules: Iterable[Rule] = ()):
+        self._rules: dict[int, Rule] = {}
+        self._by_channel: dict[int, list[tuple[Rule, Window | None]]] = {}
+        self._windows: dict[tuple[int, int], Window] = {}
+        self._channel_windows: dict[int, list[Window]] = {}
+        self._active: dict[int, Rule] = {}
+        self.load(rules)
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def active(self) -> list[Rule]:
+        return list(self._active.values())
+
+    def load(self, rules: Iterable[Rule]) -> list[Transition]:
+        """
+        Замінити набір правил. Вікна з тим самим (channel_id, window_sec)
+        зберігають накопичені семпли; тривоги видалених/вимкнених правил
+        повертаються як 'resolved'.
+        """
+        self._rules = {r.id: r for r in rules if valid_rule(r)}
+        windows: dict[tuple[int, int], Window] = {}
+        self._by_channel = {}
+        for r in self._rules.values():
+            w = None
+            if r.window is not None:
+                key = (r.channel_id, r.window)
+                # Порожнє Window хибне (len() == 0) — тому `is None`, а не `or`:
+                # інакше друге правило на тому ж вікні отримало б власне, ніколи не наповнене
+                w = windows.get(key)
+                if w is None:
+                    w = self._windows.get(key)
+                if w is None:
+                    w = Window(r.window)
+                windows[key] = w
+            self._by_channel.setdefault(r.channel_id, []).append((r, w))
+        self._windows = windows
+        self._channel_windows = {}
+        for (cid, _), w in windows.items():
+            self._channel_windows.setdefault(cid, []).append(w)
+
+        out = [Transition('resolved', r, None)
+               for rid, r in self._active.items() if rid not in self._rules]
+        # Активні тривоги лишаються активними з оновленими межами правила
+        self._active = {rid: self._rules[rid] for rid in self._active if rid in self._rules}
+        return out
+
+    def restore(self, rule_ids: Iterable[int]) -> list[int]:
+        """
+        Позначити активними тривоги, відкриті до рестарту (alarms_log.resolved_at IS NULL).
+        Повертає rule_id без відповідного завантаженого правила — їх треба закрити.
+        """
+        orphans = []
+        for rid in rule_ids:
+            if rid in self._rules:
+                self._active[rid] = self._rules[rid]
+            else:
+                orphans.append(rid)
+        return orphans
+
+    def feed(self, t: float, readings: Iterable[tuple[int, float | None]]) -> list[Transition]:
+        """
+        Покази одного циклу (t — cycle_time, секунди) → переходи стану тривог.
+        null (помилка читання) не змінює ні вікон, ні стану тривог.
+        """
+        out: list[Transition] = []
+        by_channel = self._by_channel
+        active = self._active
+        for cid, value in readings:
+            rules = by_channel.get(cid)
+            if rules is None or value is None:
+                continue
+            for w in self._channel_windows.get(cid, ()):
+                w.add(t, value)
+            for rule, w in rules:
+                rt = rule.rule_type
+                if rt == 'above':
+                    observed, fired = value, value > rule.limit
+                elif rt == 'below':
+                    observed, fired = value, value < rule.limit
+                else:
+                    observed = w.rate() if rt == 'rate_of_change' else w.std()
+                    if observed is None:
+                        continue
+                    fired = abs(observed) > rule.limit
+                if fired:
+                    if rule.id not in active:
+                        active[rule.id] = rule
+                        out.append(Transition('triggered', rule, observed))
+                elif rule.id in active:
+                    del active[rule.id]
+                    out.append(Transition('resolved', rule, observed))
+        return out
+
+
+def describe(tr: Transition) -> str:
+    """Текст для alarms_log.message / події triggered."""
+    r = tr.rule
+    if r.rule_type == 'above':
+        return f'{r.name}: {tr.value:.2f} > {r.limit}'
+    if r.rule_type == 'below':
+        return f'{r.name}: {tr.value:.2f} < {r.limit}'
+    if r.rule_type == 'rate_of_change':
+        return f'{r.name}: {tr.value:+.3f}/с за {r.window} с, межа {r.limit}/с'
+    return f'{r.name}: σ={tr.value:.3f} за {r.window} с > {r.limit}'
@@ -0,0 +1,281 @@
+"""
+Векторизована оцінка правил тривог (NumPy) — для сотень каналів і правил.
+
+Той самий інтерфейс і семантика, що в RuleEngine (rules.py), але load()
+компілює правила в масиви: канал, тип, межа, вікно й severity кожного правила.
+Цикл (або пачка циклів) перевіряється кількома векторними операціями;
+Python-код виконується лише для правил, що змінили стан.
+
+Вікна: спільне кільце циклів V[рядок, канал] (NaN — немає показу) і для кожної
+ширини window_sec — накопичені по каналах n, Σd, Σd² (d = v − k, як у Window)
+та найстаріший семпл вікна для швидкості зміни. Рядок додається й витісняється
+один раз на кожну ширину вікна — O(каналів) векторно на цикл.
+"""
+
+from typing import Iterable, Sequence
+
+import numpy as np
+
+from rules import Rule, Transition, valid_rule
+
+_ABOVE, _BELOW, _RATE, _STD = range(4)
+_KINDS = {'above': _ABOVE, 'below': _BELOW, 'rate_of_change': _RATE, 'std_deviation': _STD}
+_NAN = float('nan')
+
+
+def _remap(arr: np.ndarray, take: np.ndarray, fill) -> np.ndarray:
+    """Стовпці arr у новому порядку каналів: take[i] — старий індекс або -1 (новий канал)."""
+    out = np.full(arr.shape[:-1] + (len(take),), fill, dtype=arr.dtype)
+    known = take >= 0
+    out[..., known] = arr[..., take[known]]
+    return out
+
+
+class _Span:
+    """Накопичений стан вікна однієї ширини по всіх каналах."""
+
+    __slots__ = ('span', 'start', 'n', 's1', 's2', 'k', 'first_t', 'first_v')
+
+    def __init__(self, span: float, width: int, start: int):
+        self.span = span
+        self.start = start      # абсолютний індекс найстарішого рядка кільця у вікні
+        self.n = np.zeros(width, np.int64)
+        self.s1 = np.zeros(width)
+        self.s2 = np.zeros(width)
+        self.k = np.zeros(width)
+        self.first_t = np.full(width, _NAN)
+        self.first_v = np.full(width, _NAN)
+
+    def remap(self, take: np.ndarray) -> None:
+        self.n = _remap(self.n, take, 0)
+        self.s1 = _remap(self.s1, take, 0.0)
+        self.s2 = _remap(self.s2, take, 0.0)
+        self.k = _remap(self.k, take, 0.0)
+        self.first_t = _remap(self.first_t, take, _NAN)
+        self.first_v = _remap(self.first_v, take, _NAN)
+
+
+class VectorEngine:
+    """RuleEngine на NumPy: правила компілюються при load(), не на кожен цикл."""
+
+    def __init__(self, rules: Iterable[Rule] = (), capacity: int = 64):
+        self._lookup = np.full(65536, -1, np.int32)     # channel_id → стовпець
+        self._chan_ids = np.empty(0, np.int64)
+        self._cap = capacity
+        self._T = np.zeros(capacity)
+        self._V = np.full((capacity, 0), _NAN)
+        self._next = 0                                  # абсолютний індекс наступного рядка
+        self._last_t: float | None = None
+        self._spans: list[_Span] = []
+        self._rules: list[Rule] = []
+        self._active = np.zeros(0, bool)
+        self.load(rules)
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def active(self) -> list[Rule]:
+        return [self._rules[i] for i in np.flatnonzero(self._active)]
+
+    def active_counts(self) -> dict[str, int]:
+        """Активні тривоги за severity."""
+        counts = np.bincount(self._sev[self._active], minlength=len(self._severities))
+        return dict(zip(self._severities, counts.tolist()))
+
+    # ── Компіляція ───────────────────────────────────────────────────────────
+
+    def load(self, rules: Iterable[Rule]) -> list[Transition]:
+        """
+        Скомпілювати набір правил. Історія каналів у кільці та накопичені суми
+        вікон тієї ж ширини зберігаються; тривоги видалених/вимкнених правил
+        повертаються як 'resolved'.
+        """
+        new = list({r.id: r for r in rules if valid_rule(r)}.values())
+        was_active = {r.id: r for r in self.active()}
+
+        chan_ids = np.unique(np.array([r.channel_id for r in new], np.int64))
+        take = self._lookup[chan_ids] if len(chan_ids) else np.empty(0, np.int32)
+        self._lookup[self._chan_ids] = -1
+        self._lookup[chan_ids] = np.arange(len(chan_ids), dtype=np.int32)
+        self._chan_ids = chan_ids
+        self._V = _remap(self._V, take, _NAN)
+
+        spans = {sp.span: sp for sp in self._spans}
+        self._spans = []
+        for w in sorted({r.window for r in new if r.window is not None}):
+            sp = spans.get(w)
+            if sp is None:
+                sp = _Span(w, len(chan_ids), self._next)
+            else:
+                sp.remap(take)
+            self._spans.append(sp)
+        span_idx = {sp.span: i for i, sp in enumerate(self._spans)}
+
+        self._rules = new
+        self._kind = np.array([_KINDS[r.rule_type] for r in new], np.int8)
+        self._col = self._lookup[np.array([r.channel_id for r in new], np.int64)]
+        self._limit = np.array([r.limit for r in new], float)
+        self._span = np.array([span_idx.get(r.window, 0) for r in new], np.intp)
+        self._is_rate = self._kind == _RATE
+        self._is_std = self._kind == _STD
+        self._severities = sorted({r.severity for r in new})
+        sev_idx = {s: i for i, s in enumerate(self._severities)}
+        self._sev = np.array([sev_idx[r.severity] for r in new], np.intp)
+        self._active = np.array([r.id in was_active for r in new], bool)
+
+        loaded = {r.id for r in new}
+        return [Transition('resolved', r, None) for rid, r in was_active.items() if rid not in loaded]
+
+    def restore(self, rule_ids: Iterable[int]) -> list[int]:
+        """Як RuleEngine.restore: відкриті до рестарту тривоги → активні; повертає сиріт."""
+        index = {r.id: i for i, r in enumerate(self._rules)}
+        orphans = []
+        for rid in rule_ids:
+            if rid in index:
+                self._active[index[rid]] = True
+            else:
+                orphans.append(rid)
+        return orphans
+
+    # ── Оцінка ───────────────────────────────────────────────────────────────
+
+    def feed(self, t: float, readings: Iterable[tuple[int, float | None]]) -> list[Transition]:
+        pairs = [(cid, _NAN if v is None else v) for cid, v in readings]
+        ids = np.array([p[0] for p in pairs], np.int64)
+        values = np.array([p[1] for p in pairs], float)
+        return self.feed_batch([t], ids, values[None, :])[0]
+
+    def feed_batch(self, times: Sequence[float], ids, values) -> list[list[Transition]]:
+        """
+        Пачка циклів з однаковим набором каналів: times (B,), ids (N,) —
+        channel_id, values (B, N) — покази, NaN = null. Приймає array('H') /
+        array('d') з collector.frames.decode_frame без копіювання в список.
+        Повертає переходи кожного циклу.
+        """
+        ids = np.asarray(ids, np.int64)
+        values = np.asarray(values, float).reshape(len(times), len(ids))
+        cols = self._lookup[ids]
+        known = cols >= 0
+        X = np.full((len(times), len(self._chan_ids)), _NAN)
+        X[:, cols[known]] = values[:, known]
+
+        out = []
+        for t, x in zip(times, X):
+            out.append(self._evaluate(float(t), x))
+        return out
+
+    def _evaluate(self, t: float, x: np.ndarray) -> list[Transition]:
+        if not self._rules:
+            return []
+        rate, std = self._push(t, x)
+        observed = x[self._col]
+        evaluated = ~np.isnan(observed)
+        if self._spans:
+            observed[self._is_rate] = rate[self._span[self._is_rate], self._col[self._is_rate]]
+            observed[self._is_std] = std[self._span[self._is_std], self._col[self._is_std]]
+            # Віконне правило без статистики (< 2 семплів) не змінює стан
+            evaluated &= ~np.isnan(observed)
+
+        kind = self._kind
+        with np.errstate(invalid='ignore'):
+            fired = np.where(kind == _ABOVE, observed > self._limit,
+                             np.where(kind == _BELOW, observed < self._limit,
+                                      np.abs(observed) > self._limit))
+        now_active = np.where(evaluated, fired, self._active)
+        changed = np.flatnonzero(now_active != self._active)
+        self._active = now_active
+        return [Transition('triggered' if now_active[i] else 'resolved',
+                           self._rules[i], float(observed[i])) for i in changed]
+
+    # ── Кільце й вікна ───────────────────────────────────────────────────────
+
+    def _push(self, t: float, x: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Додати цикл у кільце й вікна → (rate, std) форми (ширин вікон, каналів)."""
+        if self._last_t is not None and t < self._last_t:
+            # Час пішов назад (рестарт колектора, корекція годинника) — вікна недійсні
+            for sp in self._spans:
+                sp.__init__(sp.span, len(self._chan_ids), self._next)
+        self._last_t = t
+        cap, T, V = self._cap, self._T, self._V
+
+        for sp in self._spans:
+            edge = t - sp.span
+            while sp.start < self._next and T[sp.start % cap] < edge:
+                row = V[sp.start % cap]
+                m = ~np.isnan(row)
+                d = np.where(m, row - sp.k, 0.0)
+                sp.s1 -= d
+                sp.s2 -= d * d
+                sp.n -= m
+                sp.start += 1
+            empty = sp.n == 0
+            sp.s1[empty] = 0.0
+            sp.s2[empty] = 0.0
+            with np.errstate(invalid='ignore'):
+                stale = np.flatnonzero(sp.first_t < edge)
+            if len(stale):
+                self._refirst(sp, stale)
+
+        oldest = min((sp.start for sp in self._spans), default=self._next)
+        if self._next - oldest >= self._cap:
+            self._grow(oldest)
+        i = self._next % self._cap
+        self._T[i] = t
+        self._V[i] = x
+        self._next += 1
+
+        m = ~np.isnan(x)
+        rate = np.full((len(self._spans), len(x)), _NAN)
+        std = np.full((len(self._spans), len(x)), _NAN)
+        for j, sp in enumerate(self._spans):
+            anchor = m & (sp.n == 0)
+            sp.k[anchor] = x[anchor]
+            d = np.where(m, x - sp.k, 0.0)
+            sp.s1 += d
+            sp.s2 += d * d
+            sp.n += m
+            first = m & np.isnan(sp.first_t)
+            sp.first_t[first] = t
+            sp.first_v[first] = x[first]
+
+            enough = m & (sp.n >= 2)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                dt = t - sp.first_t
+                rate[j] = np.where(enough & (dt > 0), (x - sp.first_v) / dt, _NAN)
+                n = np.maximum(sp.n, 2)
+                var = (sp.s2 - sp.s1 * sp.s1 / n) / (n - 1)
+                std[j] = np.where(enough, np.sqrt(np.maximum(var, 0.0)), _NAN)
+        return rate, std
+
+    def _refirst(self, sp: _Span, cols: np.ndarray) -> None:
+        """Найстаріший семпл вікна для каналів, чий попередній вийшов з вікна."""
+        cap = self._cap
+        sp.first_t[cols] = _NAN
+        sp.first_v[cols] = _NAN
+        if sp.start >= self._next:
+            return
+        # Зазвичай канал має показ у першому ж рядку вікна
+        row = self._V[sp.start % cap, cols]
+        ok = ~np.isnan(row)
+        sp.first_t[cols[ok]] = self._T[sp.start % cap]
+        sp.first_v[cols[ok]] = row[ok]
+        rest = cols[~ok]
+        idx = np.arange(sp.start + 1, self._next) % cap
+        if not len(rest) or not len(idx):
+            return
+        sub = self._V[np.ix_(idx, rest)]
+        has = ~np.isnan(sub)
+        pos = has.argmax(axis=0)
+        found = has[pos, np.arange(len(rest))]
+        sp.first_t[rest[found]] = self._T[idx[pos[found]]]
+        sp.first_v[rest[found]] = sub[pos[found], np.flatnonzero(found)]
+
+    def _grow(self, oldest: int) -> None:
+        """Подвоїти кільце, зберігши рядки від oldest."""
+        cap = self._cap * 2
+        idx = np.arange(oldest, self._next)
+        T = np.zeros(cap)
+        V = np.full((cap, self._V.shape[1]), _NAN)
+        T[idx % cap] = self._T[idx % self._cap]
+        V[idx % cap] = self._V[idx % self._cap]
+        self._cap, self._T, self._V = cap, T, V
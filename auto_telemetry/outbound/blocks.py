@@ -0,0 +1,182 @@
+"""
+Кеш закритих хвилин GET /data на диску: рядки вже закодовані в JSON і стиснуті.
+
+Хвилина, що минула (плюс settle на запізнілий запис), більше не змінюється,
+а повтори, розбиття й бекфіл Sync Service запитують її знову і знову.
+Блок — рядки [start, start + block_sec) у форматі відповіді /data
+(",{…},{…}"), стиснуті сирим deflate і завершені Z_FULL_FLUSH: без BFINAL
+і без посилань назад за межі блоку. Тому блоки склеюються в один
+zlib-потік (Content-Encoding: deflate) без перекодування; Adler-32 цілого
+потоку обчислюється з контрольних сум блоків (adler32_combine).
+
+Файл блоку: <start_epoch>-<block_sec>.blk = заголовок (_HEADER) + deflate.
+Витіснення — LRU за mtime (оновлюється при влучанні) понад max_bytes.
+"""
+
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b'OBLK'
+_VERSION = 1
+# magic, version, rows, raw_len, adler32
+_HEADER = struct.Struct('<4sHIII')
+
+_ZLIB_HEADER = b'\x78\x9c'
+_FINAL_BLOCK = b'\x03\x00'      # порожній фіксований блок з BFINAL
+_ADLER_BASE = 65521
+
+
+class Chunk(NamedTuple):
+    data: bytes         # сирий deflate, завершений Z_FULL_FLUSH
+    raw_len: int
+    adler: int
+    rows: int
+
+
+def encode_rows(rows: list[dict]) -> bytes:
+    """Рядки /data → ",{…},{…}" — як їх серіалізує JSONResponse FastAPI."""
+    return ''.join(',' + json.dumps(r, ensure_ascii=False, separators=(',', ':'))
+                   for r in rows).encode()
+
+
+def deflate_chunk(raw: bytes, rows: int) -> Chunk:
+    comp = zlib.compressobj(6, zlib.DEFLATED, -15)
+    data = comp.compress(raw) + comp.flush(zlib.Z_FULL_FLUSH)
+    return Chunk(data, len(raw), zlib.adler32(raw), rows)
+
+
+def inflate_chunk(chunk: Chunk) -> bytes:
+    return zlib.decompressobj(-15).decompress(chunk.data)
+
+
+def adler32_combine(adler1: int, adler2: int, len2: int) -> int:
+    """Adler-32 конкатенації A+B з adler32(A), adler32(B) і len(B) (як у zlib)."""
+    rem = len2 % _ADLER_BASE
+    sum1 = adler1 & 0xffff
+    sum2 = (rem * sum1) % _ADLER_BASE
+    sum1 += (adler2 & 0xffff) + _ADLER_BASE - 1
+    sum2 += (adler1 >> 16) + (adler2 >> 16) + _ADLER_BASE - rem
+    return (sum1 % _ADLER_BASE) | ((sum2 % _ADLER_BASE) << 16)
+
+
+def zlib_stream(chunks: list[Chunk]) -> bytes:
+    """Склеїти блоки в повний zlib-потік (RFC 1950)."""
+    adler = 1
+    for c in chunks:
+        adler = adler32_combine(adler, c.adler, c.raw_len)
+    return (_ZLIB_HEADER + b''.join(c.data for c in chunks) + _FINAL_BLOCK
+            + struct.pack('>I', adler))
+
+
+def split(from_: datetime, to: datetime, block_sec: int,
+          settled: datetime) -> list[tuple[datetime, datetime, bool]]:
+    """
+    [from_, to) → відрізки (lo, hi, cacheable) по межах блоків.
+    cacheable — повний блок, що закінчився не пізніше settled.
+    """
+    out = []
+    lo = from_
+    while lo < to:
+        start = int(lo.timestamp()) // block_sec * block_sec
+        block_lo = datetime.fromtimestamp(start, timezone.utc)
+        block_hi = block_lo + timedelta(seconds=block_sec)
+        hi = min(block_hi, to)
+        out.append((lo, hi, lo == block_lo and hi == block_hi and hi <= settled))
+        lo = hi
+    return out
+
+
+class BlockCache:
+    """Блоки на диску з LRU-витісненням; безпечний для кількох потоків."""
+
+    def __init__(self, directory: Path, block_sec: int = 60, max_bytes: int = 256 << 20):
+        self.directory = Path(directory)
+        self.block_sec = block_sec
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._lru: OrderedDict[str, int] | None = None     # ім'я → розмір; читається ліниво
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _name(self, start: datetime) -> str:
+        return f'{int(start.timestamp())}-{self.block_sec}.blk'
+
+    def _load(self) -> OrderedDict:
+        if self._lru is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            files = sorted((p.stat().st_mtime, p.name, p.stat().st_size)
+                           for p in self.directory.glob('*.blk'))
+            self._lru = OrderedDict((name, size) for _, name, size in files)
+            self._size = sum(self._lru.values())
+        return self._lru
+
+    def get(self, start: datetime) -> Chunk | None:
+        name = self._name(start)
+        with self._lock:
+            lru = self._load()
+            if name not in lru:
+                self.misses += 1
+                return None
+            lru.move_to_end(name)
+        path = self.directory / name
+        try:
+            blob = path.read_bytes()
+            magic, version, rows, raw_len, adler = _HEADER.unpack_from(blob)
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError('bad block header')
+            os.utime(path)      # LRU-порядок переживає рестарт
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning('BlockCache: %s: %s', name, e)
+            self._drop(name)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Chunk(blob[_HEADER.size:], raw_len, adler, rows)
+
+    def put(self, start: datetime, chunk: Chunk) -> None:
+        name = self._name(start)
+        blob = _HEADER.pack(_MAGIC, _VERSION, chunk.rows, chunk.raw_len, chunk.adler) + chunk.data
+        with self._lock:
+            lru = self._load()
+            path = self.directory / name
+            tmp = path.with_suffix('.tmp')
+            try:
+                tmp.write_bytes(blob)
+                os.replace(tmp, path)
+            except OSError as e:
+                logger.warning('BlockCache: запис %s: %s', name, e)
+                return
+            self._size += len(blob) - lru.pop(name, 0)
+            lru[name] = len(blob)
+            while self._size > self.max_bytes and len(lru) > 1:
+                old, size = lru.popitem(last=False)
+                self._size -= size
+                try:
+                    (self.directory / old).unlink()
+                except OSError:
+                    pass
+
+    def _drop(self, name: str) -> None:
+        with self._lock:
+            size = self._load().pop(name, None)
+            if size is not None:
+                self._size -= size
+        try:
+            (self.directory / name).unlink()
+        except OSError:
+            pass
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load())
@@ -0,0 +1,373 @@
+"""
+Стиснення відповідей Outbound API: zstd і zstd зі спільним словником.
+
+gzip (DATA_CONTRACT v1.3) на роутері дорогий по CPU, а короткі відповіді
+/data і /sync — сотні однакових ключів і міток часу — стискає гірше, ніж
+zstd зі словником, натренованим на таких самих відповідях: спільні фрагменти
+вже в словнику, і навіть перший кілобайт стискається добре.
+
+Узгодження за Accept-Encoding, від кращого:
+    dcz   zstd зі словником (RFC 9842): клієнт надсилає Available-Dictionary
+          = :base64(SHA-256 словника):, тіло — _DCZ_MAGIC + SHA-256 + zstd-кадр
+    zstd  без словника (RFC 8878)
+    gzip  як раніше (GZipMiddleware)
+Відповідь, що вже має Content-Encoding (блоки /data), не чіпається.
+
+Словник віддає GET /compression/dictionary; без пакета zstandard — лише gzip.
+
+Тренування і порівняння з gzip (з кореня auto_telemetry/):
+    python -m outbound.compression train --hours 24 --out data/outbound_zstd.dict
+    python -m outbound.compression bench --synthetic
+    python -m outbound.compression bench --dict data/outbound_zstd.dict --hours 6
+"""
+
+import argparse
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import NamedTuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    import zstandard
+except ImportError:     # без zstandard — лише gzip
+    zstandard = None
+
+# RFC 9842: магічне число dcz перед SHA-256 словника
+_DCZ_MAGIC = b'\x5e\x2a\x4d\x18\x20\x00\x00\x00'
+# Більші тіла стискаються в потоці, щоб не тримати цикл подій
+_THREAD_MIN_SIZE = 128 * 1024
+
+
+class Dictionary(NamedTuple):
+    data: bytes
+    sha256: bytes
+    zdict: object       # zstandard.ZstdCompressionDict
+
+    @property
+    def available(self) -> str:
+        """Значення заголовка Available-Dictionary для цього словника."""
+        return ':' + base64.b64encode(self.sha256).decode() + ':'
+
+
+def make_dictionary(data: bytes, level: int = 3) -> Dictionary:
+    zdict = zstandard.ZstdCompressionDict(data)
+    # Таблиці словника готуються один раз, а не на кожну відповідь
+    zdict.precompute_compress(level=level)
+    return Dictionary(data, hashlib.sha256(data).digest(), zdict)
+
+
+def load_dictionary(path: Path, level: int = 3) -> Dictionary | None:
+    """Словник з файлу; None — файлу немає або zstandard не встановлено."""
+    if zstandard is None:
+        return None
+    try:
+        return make_dictionary(Path(path).read_bytes(), level)
+    except FileNotFoundError:
+        return None
+
+
+def accepted(accept_encoding: str) -> set[str]:
+    """Кодування з Accept-Encoding (без q=0)."""
+    out = set()
+    for part in accept_encoding.lower().split(','):
+        coding, _, params = part.partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            out.add(coding.strip())
+    return out
+
+
+def negotiate(accept_encoding: str, available_dictionary: str,
+              dictionary: Dictionary | None) -> str:
+    """'dcz' | 'zstd' | 'gzip' | 'identity' — чим стиснути відповідь."""
+    codings = accepted(accept_encoding)
+    if zstandard is not None:
+        if ('dcz' in codings and dictionary is not None
+                and available_dictionary.strip() == dictionary.available):
+            return 'dcz'
+        if 'zstd' in codings:
+            return 'zstd'
+    return 'gzip' if 'gzip' in codings else 'identity'
+
+
+def compress(body: bytes, encoding: str, dictionary: Dictionary | None = None,
+             level: int = 3) -> bytes:
+    """Тіло цілком у zstd-кадр ('zstd') або dcz ('dcz')."""
+    if encoding == 'dcz':
+        cctx = zstandard.ZstdCompressor(level=level, dict_data=dictionary.zdict)
+        return _DCZ_MAGIC + dictionary.sha256 + cctx.compress(body)
+    return zstandard.ZstdCompressor(level=level).compress(body)
+
+
+def decompress(body: bytes, encoding: str, dictionary: Dictionary | None = None) -> bytes:
+    """Зворотне до compress (для тестів і бенчмарку; клієнт — sync/puller.py)."""
+    if encoding == 'dcz':
+        if body[:len(_DCZ_MAGIC)] != _DCZ_MAGIC or body[8:40] != dictionary.sha256:
+            raise ValueError('dcz: інший словник')
+        body = body[40:]
+        dctx = zstandard.ZstdDecompressor(dict_data=dictionary.zdict)
+    else:
+        dctx = zstandard.ZstdDecompressor()
+    return dctx.decompressobj().decompress(body)
+
+
+# ── ASGI middleware ──────────────────────────────────────────────────────────
+
+class CompressionMiddleware:
+    """dcz/zstd, якщо клієнт їх приймає; інакше — GZipMiddleware."""
+
+    def __init__(self, app, minimum_size: int = 500, level: int = 3,
+                 dictionary: Dictionary | None = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.dictionary = dictionary
+        self._gzip = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        encoding = negotiate(headers.get('accept-encoding', ''),
+                             headers.get('available-dictionary', ''), self.dictionary)
+        if encoding in ('dcz', 'zstd'):
+            await _ZstdResponder(self, encoding)(scope, receive, send)
+        else:
+            await self._gzip(scope, receive, send)
+
+
+class _ZstdResponder:
+
+    def __init__(self, mw: CompressionMiddleware, encoding: str):
+        self.mw = mw
+        self.encoding = encoding
+        self.send = None
+        self.start: dict = {}
+        self.passthrough = False
+        self.started = False
+        self.stream = None
+
+    async def __call__(self, scope, receive, send) -> None:
+        self.send = send
+        await self.mw.app(scope, receive, self._send)
+
+    async def _send(self, message: dict) -> None:
+        if message['type'] == 'http.response.start':
+            self.start = message
+            headers = Headers(raw=message['headers'])
+            self.passthrough = ('content-encoding' in headers
+                                or headers.get('content-type', '').startswith('text/event-stream'))
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message['type'] != 'http.response.body' or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get('body', b'')
+        more = message.get('more_body', False)
+        if self.started:
+            # Продовження потокової відповіді
+            await self.send({**message, 'body': self.stream.compress(body) + self.stream.flush(
+                zstandard.COMPRESSOBJ_FLUSH_BLOCK if more else zstandard.COMPRESSOBJ_FLUSH_FINISH)})
+            return
+        self.started = True
+        if len(body) < self.mw.minimum_size and not more:
+            await self.send(self.start)
+            await self.send(message)
+            return
+
+        # Нові повідомлення з копією заголовків: списки в повідомленнях належать
+        # Response, який може відправлятися не один раз
+        start = {**self.start, 'headers': list(self.start['headers'])}
+        headers = MutableHeaders(scope=start)
+        headers['Content-Encoding'] = self.encoding
+        headers.add_vary_header('Accept-Encoding')
+        if self.encoding == 'dcz':
+            headers.add_vary_header('Available-Dictionary')
+        if more:
+            del headers['Content-Length']
+            dictionary = self.mw.dictionary if self.encoding == 'dcz' else None
+            cctx = zstandard.ZstdCompressor(
+                level=self.mw.level, dict_data=dictionary.zdict if dictionary else None)
+            self.stream = cctx.compressobj()
+            prefix = _DCZ_MAGIC + dictionary.sha256 if dictionary else b''
+            out = prefix + self.stream.compress(body) + \
+                self.stream.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        else:
+            args = (body, self.encoding, self.mw.dictionary, self.mw.level)
+            if len(body) >= _THREAD_MIN_SIZE:
+                out = await asyncio.to_thread(compress, *args)
+            else:
+                out = compress(*args)
+            headers['Content-Length'] = str(len(out))
+        await self.send(start)
+        await self.send({**message, 'body': out})
+
+
+# ── Тренування словника і бенчмарк ───────────────────────────────────────────
+
+def _body(from_: datetime, to: datetime, rows: list[dict]) -> bytes:
+    """Тіло /data так, як його серіалізує JSONResponse FastAPI."""
+    content = {'from': _fmt(from_), 'to': _fmt(to), 'count': len(rows),
+               'truncated': False, 'rows': rows}
+    return json.dumps(content, ensure_ascii=False, allow_nan=False,
+                      separators=(',', ':')).encode()
+
+
+def _fmt(dt: datetime) -> str:
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.') + f'{dt.microsecond // 1000:03d}Z'
+
+
+def db_samples(hours: float, count: int, window_sec: int, seed: int = 0) -> list[bytes]:
+    """Тіла /data за випадкові вікна window_sec з останніх hours годин локальної БД."""
+    import psycopg2
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent.parent / '.env')
+    conn = psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'), port=os.getenv('DB_PORT', '5432'),
+        dbname=os.getenv('DB_NAME', 'telemetry'), user=os.getenv('DB_USER', 'telemetry'),
+        password=os.getenv('DB_PASSWORD', ''), connect_timeout=5)
+    rnd = random.Random(seed)
+    end = datetime.now(timezone.utc)
+    span = hours * 3600 - window_sec
+    out = []
+    try:
+        with conn.cursor() as cur:
+            for _ in range(count):
+                lo = end - timedelta(seconds=window_sec + rnd.uniform(0, span))
+                hi = lo + timedelta(seconds=window_sec)
+                cur.execute("""
+                    SELECT channel_id, value, time FROM measurements_all
+                    WHERE time >= %s AND time < %s
+                    ORDER BY time ASC, channel_id
+                """, (lo, hi))
+                rows = [{'channel_id': c, 'value': v, 'time': _fmt(t)}
+                        for c, v, t in cur.fetchall()]
+                if rows:
+                    out.append(_body(lo, hi, rows))
+    finally:
+        conn.close()
+    return out
+
+
+def synthetic_samples(count: int, window_sec: int, channels: int = 18,
+                      seed: int = 0) -> list[bytes]:
+    """Тіла /data: channels каналів по 1 Гц, значення — випадкове блукання."""
+    rnd = random.Random(seed)
+    values = [rnd.uniform(0, 100) for _ in range(channels)]
+    t = datetime(2026, 2, 22, tzinfo=timezone.utc)
+    out = []
+    for _ in range(count):
+        lo, rows = t, []
+        for _ in range(window_sec):
+            ts = _fmt(t + timedelta(milliseconds=rnd.randint(0, 20)))
+            for ch in range(channels):
+                values[ch] += rnd.gauss(0, 0.5)
+                rows.append({'channel_id': ch + 1, 'value': round(values[ch], 4), 'time': ts})
+            t += timedelta(seconds=1)
+        out.append(_body(lo, t, rows))
+    return out
+
+
+def train(samples: list[bytes], size: int = 16 * 1024) -> bytes:
+    return zstandard.train_dictionary(size, samples).as_bytes()
+
+
+def bench(samples: list[bytes], dictionary: Dictionary, level: int = 3) -> list[dict]:
+    """Байти і CPU (process_time) на відповідь: gzip як у GZipMiddleware проти zstd і dcz."""
+    codecs = {
+        'gzip-9':    (lambda b: gzip.compress(b, 9, mtime=0), gzip.decompress),
+        'gzip-6':    (lambda b: gzip.compress(b, 6, mtime=0), gzip.decompress),
+        f'zstd-{level}': (lambda b: compress(b, 'zstd', level=level),
+                          lambda c: decompress(c, 'zstd')),
+        f'dcz-{level}': (lambda b: compress(b, 'dcz', dictionary, level),
+                         lambda c: decompress(c, 'dcz', dictionary)),
+    }
+    raw = sum(len(s) for s in samples)
+    report = []
+    for name, (enc, dec) in codecs.items():
+        t0 = time.process_time()
+        packed = [enc(s) for s in samples]
+        t1 = time.process_time()
+        for p in packed:
+            dec(p)
+        t2 = time.process_time()
+        size = sum(len(p) for p in packed)
+        report.append({
+            'codec':        name,
+            'bytes':        size,
+            'ratio':        round(raw / size, 2),
+            'compress_us':  round((t1 - t0) / len(samples) * 1e6, 1),
+            'decompress_us': round((t2 - t1) / len(samples) * 1e6, 1),
+        })
+    return report
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='Словник zstd для Outbound API: тренування і бенчмарк')
+    ap.add_argument('command', choices=('train', 'bench'))
+    ap.add_argument('--hours', type=float, default=24, help='вибірки з останніх N годин БД')
+    ap.add_argument('--samples', type=int, default=400, help='кількість вікон-вибірок')
+    ap.add_argument('--window', type=int, default=30, help='вікно вибірки, сек (≈ цикл sync)')
+    ap.add_argument('--synthetic', action='store_true', help='синтетичні вибірки замість БД')
+    ap.add_argument('--size', type=int, default=16 * 1024, help='розмір словника, байт')
+    ap.add_argument('--out', type=Path, default=Path('data/outbound_zstd.dict'))
+    ap.add_argument('--dict', type=Path, help='bench: готовий словник (інакше — з половини вибірок)')
+    ap.add_argument('--level', type=int, default=3)
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--json', type=Path, help='bench: зберегти звіт у JSON')
+    args = ap.parse_args(argv)
+
+    if zstandard is None:
+        print('zstandard не встановлено: pip install zstandard', file=sys.stderr)
+        return 1
+    if args.synthetic:
+        samples = synthetic_samples(args.samples, args.window, seed=args.seed)
+    else:
+        samples = db_samples(args.hours, args.samples, args.window, args.seed)
+    if len(samples) < 10:
+        print(f'Замало вибірок: {len(samples)}', file=sys.stderr)
+        return 1
+
+    if args.command == 'train':
+        data = train(samples, args.size)
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_bytes(data)
+        print(f'{args.out}: {len(data)} байт з {len(samples)} вибірок, '
+              f'sha256 {hashlib.sha256(data).hexdigest()[:16]}…')
+        return 0
+
+    if args.dict:
+        dictionary = make_dictionary(args.dict.read_bytes(), args.level)
+    else:
+        # Словник — з першої половини, вимірювання — на другій (не бачених)
+        half = len(samples) // 2
+        dictionary = make_dictionary(train(samples[:half], args.size), args.level)
+        samples = samples[half:]
+    report = bench(samples, dictionary, args.level)
+    raw = sum(len(s) for s in samples)
+    print(f'{len(samples)} відповідей /data, в середньому {raw // len(samples)} байт')
+    print(f"{'кодек':<8} {'байт':>10} {'ratio':>7} {'стиск мкс':>10} {'розпак мкс':>11}")
+    for r in report:
+        print(f"{r['codec']:<8} {r['bytes']:>10} {r['ratio']:>7.2f} "
+              f"{r['compress_us']:>10.1f} {r['decompress_us']:>11.1f}")
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding='utf-8')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
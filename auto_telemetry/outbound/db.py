@@ -0,0 +1,63 @@
+"""
+Асинхронний доступ Outbound API до PostgreSQL (asyncpg).
+
+Запити виконуються прямо в циклі подій: без пулу потоків на кожен запит,
+бінарний протокол (timestamptz, float8 декодуються без розбору тексту),
+рядки — asyncpg.Record (кортеж з доступом і за назвою колонки) замість
+dict на рядок, підготовлені оператори кешуються на з'єднанні.
+
+Фонові проби /status (outbound/health.py) працюють у власному потоці
+і лишаються на psycopg2.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import asyncpg
+
+
+class DatabaseUnavailable(Exception):
+    """Не вдалося створити пул або взяти з'єднання."""
+
+
+class Database:
+    """Пул з'єднань, створюється при першому запиті (БД може бути ще недоступна)."""
+
+    def __init__(self, *, min_size: int = 1, max_size: int = 6,
+                 acquire_timeout: float = 5.0, **connect_kwargs):
+        self._kwargs = connect_kwargs
+        self._min_size = min_size
+        self._max_size = max_size
+        self._timeout = acquire_timeout
+        self._pool: asyncpg.Pool | None = None
+        self._lock: asyncio.Lock | None = None
+
+    async def _get_pool(self) -> asyncpg.Pool:
+        if self._pool is None:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                if self._pool is None:
+                    self._pool = await asyncpg.create_pool(
+                        min_size=self._min_size, max_size=self._max_size,
+                        timeout=self._timeout, **self._kwargs)
+        return self._pool
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        try:
+            pool = await self._get_pool()
+            conn = await pool.acquire(timeout=self._timeout)
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError,
+                asyncpg.InterfaceError) as e:
+            raise DatabaseUnavailable(str(e)) from e
+        try:
+            yield conn
+        finally:
+            await pool.release(conn)
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
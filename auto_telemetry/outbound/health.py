@@ -0,0 +1,127 @@
+"""
+Фоновий стан здоров'я для GET /status Outbound API.
+
+Sync Service опитує /status кожного авто на кожному циклі; раніше кожен
+виклик відкривав з'єднання з БД, шукав MAX(time) у measurements і робив
+дві TCP-проби по 0.3 с. Тепер усе це робить HealthMonitor у фоні,
+а /status повертає готовий знімок.
+
+Джерела:
+    шина колектора (ZeroMQ SUB)  cycle_time останнього пакета → last_measurement_at,
+                                 свіжий пакет → collector_running
+    проба раз на interval        порти collector/agent, метрики колектора, SELECT 1
+    MAX(time) у БД               лише коли шина мовчить (колектор зупинено, дані
+                                 пише інший процес) і не частіше за db_scan_interval
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+from collector.frames import TOPIC_BINARY, TOPIC_JSON, decode_frame
+
+try:
+    import zmq
+except ImportError:     # без pyzmq — last_measurement_at лише з БД
+    zmq = None
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """
+    probe(scan_db) → {collector_port, agent_running, collector_metrics, db_ok
+    [, last_measurement_at — лише якщо scan_db]}; виконується у фоновому потоці.
+    """
+
+    def __init__(self, probe: Callable[[bool], dict], interval: float = 5.0,
+                 db_scan_interval: float = 60.0, bus_fresh_sec: float = 10.0):
+        self._probe = probe
+        self._interval = interval
+        self._db_scan_interval = db_scan_interval
+        self._bus_fresh_sec = bus_fresh_sec
+        self._lock = threading.Lock()
+        self._probed: dict = {'collector_port': False, 'agent_running': False,
+                              'collector_metrics': None, 'db_ok': False}
+        self._db_last: datetime | None = None       # MAX(time) з БД
+        self._bus_last: datetime | None = None      # cycle_time останнього пакета шини
+        self._bus_seen: float | None = None         # monotonic отримання
+        self._scanned_at: float | None = None
+        self.refreshed = False
+
+    # ── Оновлення ────────────────────────────────────────────────────────────
+
+    def on_cycle(self, cycle_time: datetime) -> None:
+        with self._lock:
+            self._bus_last = cycle_time
+            self._bus_seen = time.monotonic()
+
+    def bus_fresh(self, now: float | None = None) -> bool:
+        now = time.monotonic() if now is None else now
+        return self._bus_seen is not None and now - self._bus_seen <= self._bus_fresh_sec
+
+    def refresh(self, scan_db: bool = True) -> None:
+        """Один прохід проб (у фоновому потоці; у тестах — напряму)."""
+        result = self._probe(scan_db)
+        with self._lock:
+            if 'last_measurement_at' in result:
+                self._db_last = result.pop('last_measurement_at')
+                self._scanned_at = time.monotonic()
+            self._probed.update(result)
+            self.refreshed = True
+
+    def _needs_scan(self, now: float) -> bool:
+        if self.bus_fresh(now):
+            return False
+        return self._scanned_at is None or now - self._scanned_at >= self._db_scan_interval
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.refresh(self._needs_scan(time.monotonic()))
+            except Exception as e:
+                logger.error('HealthMonitor: %s', e)
+            time.sleep(self._interval)
+
+    def start(self, bus_address: str | None = None, binary: bool = False) -> None:
+        threading.Thread(target=self._run, name='health-probe', daemon=True).start()
+        if bus_address and zmq is not None:
+            threading.Thread(target=self._listen_bus, args=(bus_address, binary),
+                             name='health-bus', daemon=True).start()
+
+    def _listen_bus(self, address: str, binary: bool) -> None:
+        sock = zmq.Context.instance().socket(zmq.SUB)
+        sock.connect(address)
+        sock.setsockopt(zmq.SUBSCRIBE, TOPIC_BINARY if binary else TOPIC_JSON)
+        while True:
+            try:
+                topic, payload = sock.recv_multipart()
+                self.on_cycle(parse_cycle_time(topic, payload))
+            except Exception as e:
+                logger.error('HealthMonitor: пакет шини: %s', e)
+
+    # ── Знімок ───────────────────────────────────────────────────────────────
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            last = max((t for t in (self._db_last, self._bus_last) if t is not None),
+                       default=None)
+            return {
+                'collector_running':   self._probed['collector_port'] or self.bus_fresh(),
+                'agent_running':       self._probed['agent_running'],
+                'db_ok':               self._probed['db_ok'],
+                'last_measurement_at': last,
+                'collector_metrics':   self._probed['collector_metrics'],
+            }
+
+
+def parse_cycle_time(topic: bytes, payload: bytes) -> datetime:
+    """cycle_time пакета шини даних (JSON або бінарний)."""
+    if topic == TOPIC_BINARY:
+        cycle_time_ns = decode_frame(payload)[0]
+        return datetime.fromtimestamp(cycle_time_ns / 1e9, timezone.utc)
+    cycle_time = json.loads(payload)['cycle_time']
+    return datetime.fromisoformat(cycle_time.replace('Z', '+00:00'))
@@ -0,0 +1,77 @@
+"""
+Черги виконання Outbound API: ліміти одночасних запитів і злиття однакових.
+
+Довгий /data-бекфіл Sync Service не повинен займати всі з'єднання пулу
+БД і затримувати /data/latest живих переглядачів, а однакові одночасні
+/data/latest не повинні кожен іти в БД.
+
+    fast   /status, /channels, /data/latest — власна квота з'єднань пулу,
+           без черги за важкими запитами
+    heavy  /data, /alarms, /sync — діапазонні запити; не більше workers
+           одночасно і queue в очікуванні, решта — 503 + Retry-After
+    SingleFlight — однакові запити (той самий ключ), що виконуються зараз,
+           отримують результат першого замість окремого звернення до БД
+
+Пул БД (outbound/db.py) має щонайменше fast.workers + heavy.workers
+з'єднань, тож heavy ніколи не забирає з'єднань fast.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class Overloaded(Exception):
+    """Черга lane заповнена — запит не приймається."""
+
+
+class Lane:
+    """
+    Не більше workers запитів lane одночасно; queue — скільки може чекати
+    (None — без обмеження). Лічильники змінюються лише в циклі подій.
+    """
+
+    def __init__(self, name: str, workers: int, queue: int | None = None):
+        self.name = name
+        self.workers = workers
+        self._limit = None if queue is None else workers + queue
+        self._sem: asyncio.Semaphore | None = None
+        self.active = 0
+        self.rejected = 0
+
+    async def run(self, fn: Callable[..., Awaitable], *args) -> Any:
+        if self._limit is not None and self.active >= self._limit:
+            self.rejected += 1
+            raise Overloaded(self.name)
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.workers)
+        self.active += 1
+        try:
+            async with self._sem:
+                return await fn(*args)
+        finally:
+            self.active -= 1
+
+
+class SingleFlight:
+    """Злиття однакових запитів у межах одного циклу подій."""
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]) -> Any:
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(fn())
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda f: self._forget(key, f))
+        # shield: відключення одного клієнта не скасовує спільну роботу
+        return await asyncio.shield(fut)
+
+    def _forget(self, key: Hashable, fut: asyncio.Future) -> None:
+        if self._inflight.get(key) is fut:
+            del self._inflight[key]
+        if not fut.cancelled():
+            fut.exception()     # позначити виняток отриманим, якщо всі чекачі пішли
+
+    def __len__(self) -> int:
+        return len(self._inflight)
@@ -6,25 +6,63 @@ Outbound API — інтерфейс для Fleet Server (pull-модель).
     python -m uvicorn outbound.main:app --host 0.0.0.0 --port 8001
 
 Контракт: DATA_CONTRACT.md (корінь монорепо)
+
+/data/latest і /data за останні хвилини читаються з mmap-кільця циклів
+колектора (collector/shm_ring.py), якщо воно свіже; інакше — з PostgreSQL.
+
+/sync — увесь цикл синхронізації одним запитом (для LTE/VPN з високою
+затримкою: один round trip замість чотирьох-п'яти). /data/agg — min/max/avg/last
+по інтервалах для швидкого огляду довгого gap перед повним догоном.
+
+Запити до БД — асинхронні (asyncpg, outbound/db.py) в одному циклі подій;
+швидкі ендпоінти мають власну квоту з'єднань і не стоять у черзі за
+діапазонними, однакові одночасні запити зливаються (outbound/lanes.py).
+Закриті хвилини /data зберігаються на диску вже закодованими і стиснутими
+(outbound/blocks.py) і віддаються склеюванням блоків. Відповіді стискаються
+zstd зі спільним словником, zstd або gzip — за Accept-Encoding
+(outbound/compression.py).
 """
 
+import asyncio
+import json
+import math
 import os
 import socket
+import threading
 import time
-from datetime import datetime, timezone
+import urllib.request
+import zlib
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import Any, Callable, Hashable, NamedTuple
 
 import psycopg2
-import psycopg2.extras
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, Header, HTTPException, Query
-from fastapi.middleware.gzip import GZipMiddleware
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response
+from pydantic import BaseModel
+
+from collector.frames import datetime_to_ns, ns_to_iso
+from collector.shm_ring import RingReader, default_path as default_ring_path
+from outbound import blocks as block_codec
+from outbound.blocks import BlockCache
+from outbound.compression import CompressionMiddleware, accepted, load_dictionary, negotiate
+from outbound.db import Database, DatabaseUnavailable
+from outbound.health import HealthMonitor
+from outbound.lanes import Lane, Overloaded, SingleFlight
 
 _ROOT = Path(__file__).parent.parent
 load_dotenv(_ROOT / '.env')
 
-app = FastAPI(title="Auto Telemetry Outbound API", docs_url=None, redoc_url=None)
-app.add_middleware(GZipMiddleware, minimum_size=500)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    health.start(_zmq_pub, binary=os.getenv('ZMQ_BINARY_FRAMES', '0') == '1')
+    yield
+    await database.close()
+
+
+app = FastAPI(title="Auto Telemetry Outbound API", docs_url=None, redoc_url=None,
+              lifespan=lifespan)
 
 _START = time.monotonic()
 
@@ -37,11 +75,36 @@ VEHICLE_ID_HINT = os.getenv('VEHICLE_ID_HINT', 'unknown')
 _zmq_pub       = os.getenv('ZMQ_COLLECTOR_PUB', 'tcp://127.0.0.1:5555')
 _COLLECTOR_PORT = int(_zmq_pub.rsplit(':', 1)[-1])
 _AGENT_PORT     = 9876
+# Локальний ендпоінт runtime-метрик колектора (0 — вимкнено)
+_METRICS_PORT   = int(os.getenv('COLLECTOR_METRICS_PORT', '9101'))
+# Кільце циклів колектора; старше за N сек — колектор стоїть, читаємо з БД
+_RING_PATH      = Path(os.getenv('SHM_RING_PATH') or default_ring_path())
+_RING_MAX_AGE   = float(os.getenv('OUTBOUND_RING_MAX_AGE_SEC', '10'))
+# Період фонових проб для /status (порти, метрики колектора, БД)
+_HEALTH_INTERVAL = float(os.getenv('OUTBOUND_HEALTH_INTERVAL_SEC', '5'))
+# Ліміти запитів (outbound/lanes.py): fast — /status, /channels, /data/latest;
+# heavy — діапазонні /data, /alarms, /sync з обмеженою чергою
+_FAST_WORKERS   = int(os.getenv('OUTBOUND_FAST_WORKERS', '4'))
+_HEAVY_WORKERS  = int(os.getenv('OUTBOUND_HEAVY_WORKERS', '2'))
+_HEAVY_QUEUE    = int(os.getenv('OUTBOUND_HEAVY_QUEUE', '8'))
+# Кеш закритих блоків /data на диску (outbound/blocks.py); 0 МБ — вимкнено
+_BLOCK_DIR      = Path(os.getenv('OUTBOUND_BLOCK_CACHE_DIR') or _ROOT / 'data' / 'outbound_blocks')
+_BLOCK_SEC      = int(os.getenv('OUTBOUND_BLOCK_SEC', '60'))
+_BLOCK_CACHE_MB = int(os.getenv('OUTBOUND_BLOCK_CACHE_MB', '256'))
+# Блок вважається незмінним через N сек після свого кінця (запізнілий запис)
+_BLOCK_SETTLE   = float(os.getenv('OUTBOUND_BLOCK_SETTLE_SEC', '10'))
+# Словник zstd (python -m outbound.compression train); немає файлу — zstd без словника
+_ZSTD_DICT      = Path(os.getenv('OUTBOUND_ZSTD_DICT') or _ROOT / 'data' / 'outbound_zstd.dict')
+_ZSTD_LEVEL     = int(os.getenv('OUTBOUND_ZSTD_LEVEL', '3'))
+
+zstd_dict = load_dictionary(_ZSTD_DICT, _ZSTD_LEVEL)
+app.add_middleware(CompressionMiddleware, minimum_size=500, level=_ZSTD_LEVEL,
+                   dictionary=zstd_dict)
 
 
 # ── Утиліти ──────────────────────────────────────────────────────────────────
 
-def _check_key(x_api_key: str = Header(...)) -> None:
+async def _check_key(x_api_key: str = Header(...)) -> None:
     """Перевірка API-ключа. 401 якщо відсутній або невірний."""
     if not API_KEY or x_api_key != API_KEY:
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -49,6 +112,28 @@ def _check_key(x_api_key: str = Header(...)) -> None:
 
 AUTH = Depends(_check_key)
 
+fast_lane  = Lane('fast', _FAST_WORKERS)
+heavy_lane = Lane('heavy', _HEAVY_WORKERS, _HEAVY_QUEUE)
+_flights   = SingleFlight()
+blocks     = BlockCache(_BLOCK_DIR, _BLOCK_SEC, _BLOCK_CACHE_MB << 20) if _BLOCK_CACHE_MB else None
+
+
+async def _serve(lane: Lane, key: Hashable, fn: Callable, *args):
+    """
+    await fn(*args) у межах lane; однаковий запит (key), що вже виконується, — спільний.
+
+    Результат fn отримують усі учасники SingleFlight, тож він має бути незмінним
+    чи JSON-даними, а не Response: middleware стиснення переписує заголовки
+    відповіді на місці, і другий клієнт отримав би чужі.
+    """
+    try:
+        result = await _flights.do(key, lambda: lane.run(fn, *args))
+    except Overloaded:
+        raise HTTPException(status_code=503, detail="Server busy",
+                            headers={'Retry-After': '5'})
+    assert not isinstance(result, Response), f'{key!r}: Response не можна ділити між запитами'
+    return result
+
 
 def _dsn() -> str:
     return (
@@ -60,11 +145,24 @@ def _dsn() -> str:
     )
 
 
-def _conn():
-    """Відкриває з'єднання з БД. 503 якщо недоступна."""
+# Пул asyncpg: квоти fast і heavy + з'єднання для POST /sync/ack
+database = Database(
+    host=os.getenv('DB_HOST', 'localhost'),
+    port=int(os.getenv('DB_PORT', '5432')),
+    database=os.getenv('DB_NAME', 'telemetry'),
+    user=os.getenv('DB_USER', 'telemetry'),
+    password=os.getenv('DB_PASSWORD', ''),
+    max_size=_FAST_WORKERS + _HEAVY_WORKERS + 1,
+)
+
+
+@asynccontextmanager
+async def _conn():
+    """З'єднання з пулу. 503 якщо БД недоступна."""
     try:
-        return psycopg2.connect(_dsn())
-    except Exception:
+        async with database.acquire() as conn:
+            yield conn
+    except DatabaseUnavailable:
         raise HTTPException(status_code=503, detail="Database unavailable")
 
 
@@ -75,6 +173,52 @@ def _port_listening(port: int) -> bool:
         return s.connect_ex(('127.0.0.1', port)) == 0
 
 
+def _collector_metrics() -> dict | None:
+    """Підсумок runtime-метрик колектора (GET /metrics) або None, якщо недоступний."""
+    if not _METRICS_PORT:
+        return None
+    url = f'http://127.0.0.1:{_METRICS_PORT}/metrics'
+    try:
+        with urllib.request.urlopen(url, timeout=0.3) as r:
+            return json.load(r).get('summary')
+    except (OSError, ValueError):
+        return None
+
+
+_ring: RingReader | None = None
+_ring_lock = threading.Lock()   # потоки asyncio.to_thread: кільце не читається в циклі подій
+
+
+def _ring_read(read: Callable[[RingReader], Any]):
+    """
+    read(кільце) під замком, або None: кільця немає чи воно застаріле —
+    відповідати з БД.
+    """
+    global _ring
+    with _ring_lock:
+        try:
+            if _ring is None:
+                _ring = RingReader(_RING_PATH)
+            latest = _ring.latest()
+            if latest is None or time.time_ns() - latest.cycle_time_ns > _RING_MAX_AGE * 1e9:
+                return None
+            return read(_ring)
+        except (OSError, ValueError):
+            _ring = None
+            return None
+
+
+def _ring_cycles(since: datetime):
+    """
+    Цикли з кільця з моменту since, або None: кільця немає, воно застаріле
+    чи не покриває since — відповідати з БД.
+    """
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    since_ns = datetime_to_ns(since)
+    return _ring_read(lambda ring: ring.window(since_ns))
+
+
 def _read_version() -> str:
     try:
         return (_ROOT / 'version.txt').read_text(encoding='utf-8').strip()
@@ -82,6 +226,9 @@ def _read_version() -> str:
         return 'unknown'
 
 
+_VERSION = _read_version()
+
+
 def _fmt(dt: datetime | None) -> str | None:
     """datetime → ISO8601 UTC рядок з міліскундами, або None."""
     if dt is None:
@@ -93,48 +240,97 @@ def _fmt(dt: datetime | None) -> str | None:
 
 # ── Ендпоінти ─────────────────────────────────────────────────────────────────
 
-@app.get('/status')
-def status(_: None = AUTH):
-    """Стан машини та мета-інформація."""
-    db_ok = True
-    last_measurement_at = None
+def _probe(scan_db: bool) -> dict:
+    """Проби для HealthMonitor (фоновий потік); scan_db — шукати MAX(time) у БД."""
+    out = {
+        'collector_port':    _port_listening(_COLLECTOR_PORT),
+        'agent_running':     _port_listening(_AGENT_PORT),
+        'collector_metrics': _collector_metrics(),
+        'db_ok':             False,
+    }
     try:
-        conn = psycopg2.connect(_dsn())
-        with conn.cursor() as cur:
-            cur.execute('SELECT MAX(time) FROM measurements')
-            last_measurement_at = cur.fetchone()[0]
-        conn.close()
+        conn = psycopg2.connect(_dsn(), connect_timeout=3)
+        try:
+            with conn.cursor() as cur:
+                if scan_db:
+                    # measurements партиціонована по добі з BRIN на time: останній рядок
+                    # шукаємо по (channel_id, time DESC) лише у свіжих партиціях,
+                    # повний MAX(time) — тільки якщо за добу даних не було.
+                    # measurements_wide (STORAGE_LAYOUT=wide) має B-tree по time.
+                    cur.execute("""
+                        SELECT GREATEST(
+                            COALESCE(
+                                (SELECT MAX(m.time)
+                                 FROM channel_config cc
+                                 CROSS JOIN LATERAL (
+                                     SELECT time FROM measurements
+                                     WHERE channel_id = cc.channel_id
+                                       AND time >= NOW() - INTERVAL '1 day'
+                                     ORDER BY time DESC
+                                     LIMIT 1
+                                 ) m),
+                                (SELECT MAX(time) FROM measurements)
+                            ),
+                            (SELECT MAX(time) FROM measurements_wide)
+                        )
+                    """)
+                    out['last_measurement_at'] = cur.fetchone()[0]
+                else:
+                    cur.execute('SELECT 1')
+            out['db_ok'] = True
+        finally:
+            conn.close()
     except Exception:
-        db_ok = False
+        pass
+    return out
+
 
+# Стан для /status: шина колектора + проби у фоні (outbound/health.py)
+health = HealthMonitor(_probe, interval=_HEALTH_INTERVAL)
+
+
+@app.get('/status')
+async def status(_: None = AUTH):
+    """Стан машини та мета-інформація — знімок HealthMonitor, без проб на запит."""
+    return await _serve(fast_lane, 'status', _status_body)
+
+
+async def _status_body() -> dict:
+    if not health.refreshed:
+        # перший запит до завершення першої фонової проби
+        await asyncio.to_thread(health.refresh)
+    snap = health.snapshot()
     return {
         'vehicle_id_hint':    VEHICLE_ID_HINT,
-        'software_version':   _read_version(),
+        'software_version':   _VERSION,
         'uptime_sec':         int(time.monotonic() - _START),
-        'collector_running':  _port_listening(_COLLECTOR_PORT),
-        'agent_running':      _port_listening(_AGENT_PORT),
-        'db_ok':              db_ok,
-        'last_measurement_at': _fmt(last_measurement_at),
+        'collector_running':  snap['collector_running'],
+        'agent_running':      snap['agent_running'],
+        'db_ok':              snap['db_ok'],
+        'last_measurement_at': _fmt(snap['last_measurement_at']),
+        'collector_metrics':  snap['collector_metrics'],
     }
 
 
 @app.get('/channels')
-def channels(_: None = AUTH):
+async def channels(_: None = AUTH):
     """Конфігурація каналів."""
-    conn = _conn()
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute("""
-                SELECT channel_id, name, unit,
-                       raw_min, raw_max, phys_min, phys_max,
-                       signal_type, enabled, updated_at
-                FROM channel_config
-                ORDER BY channel_id
-            """)
-            rows = cur.fetchall()
-    finally:
-        conn.close()
+    return await _serve(fast_lane, 'channels', _channels)
 
+
+async def _channels() -> list[dict]:
+    async with _conn() as conn:
+        return await _query_channels(conn)
+
+
+async def _query_channels(conn) -> list[dict]:
+    rows = await conn.fetch("""
+        SELECT channel_id, name, unit,
+               raw_min, raw_max, phys_min, phys_max,
+               signal_type, enabled, updated_at
+        FROM channel_config
+        ORDER BY channel_id
+    """)
     return [
         {
             'channel_id':  r['channel_id'],
@@ -153,12 +349,24 @@ def channels(_: None = AUTH):
 
 
 @app.get('/data/latest')
-def data_latest(_: None = AUTH):
+async def data_latest(_: None = AUTH):
     """Останнє значення по кожному каналу."""
-    conn = _conn()
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute("""
+    return await _serve(fast_lane, 'data/latest', _data_latest)
+
+
+async def _data_latest() -> list[dict]:
+    latest = await asyncio.to_thread(_ring_latest)
+    if latest is not None:
+        return latest
+
+    async with _conn() as conn:
+        # Обидва формати зберігання, по каналу: вузький — по індексу (channel_id, time),
+        # широкий — рядки measurements_wide від найновішого до першого, де значення
+        # каналу записане (не NaN), без обмеження вікном — канал з рідким heartbeat
+        # чи широким deadband не зникає; канали поза всіма розкладками не шукаються
+        rows = await conn.fetch("""
+            SELECT DISTINCT ON (channel_id) channel_id, value, time
+            FROM (
                 SELECT m.channel_id, m.value, m.time
                 FROM channel_config cc
                 CROSS JOIN LATERAL (
@@ -168,56 +376,90 @@ def data_latest(_: None = AUTH):
                     ORDER BY time DESC
                     LIMIT 1
                 ) m
-            """)
-            rows = cur.fetchall()
-    finally:
-        conn.close()
+                UNION ALL
+                SELECT cc.channel_id, w.value, w.time
+                FROM channel_config cc
+                CROSS JOIN LATERAL (
+                    SELECT w.vals[array_position(l.channel_ids, cc.channel_id)] AS value, w.time
+                    FROM measurements_wide w
+                    JOIN measurement_layouts l ON l.layout_id = w.layout_id
+                    WHERE cc.channel_id = ANY(l.channel_ids)
+                      AND w.vals[array_position(l.channel_ids, cc.channel_id)]
+                          IS DISTINCT FROM 'NaN'::DOUBLE PRECISION
+                    ORDER BY w.time DESC
+                    LIMIT 1
+                ) w
+                WHERE EXISTS (SELECT 1 FROM measurement_layouts l
+                              WHERE cc.channel_id = ANY(l.channel_ids))
+            ) latest
+            ORDER BY channel_id, time DESC
+        """)
 
     return [
-        {
-            'channel_id': r['channel_id'],
-            'value':      r['value'],
-            'time':       _fmt(r['time']),
-        }
-        for r in rows
+        {'channel_id': channel_id, 'value': value, 'time': _fmt(t)}
+        for channel_id, value, t in rows
     ]
 
 
 @app.get('/data')
-def data(
+async def data(
     from_:      datetime   = Query(..., alias='from'),
     to:         datetime   = Query(...),
     channel_id: int | None = Query(None),
     limit:      int        = Query(10000, le=50000),
+    accept_encoding: str   = Header(''),
+    available_dictionary: str = Header(''),
     _:          None       = AUTH,
 ):
     """Вимірювання за часовим діапазоном."""
+    # Готовий deflate блоків — лише якщо middleware не стисне відповідь zstd
+    deflate = ('deflate' in accepted(accept_encoding) and negotiate(
+        accept_encoding, available_dictionary, zstd_dict) not in ('dcz', 'zstd'))
+    body = await _serve(heavy_lane, ('data', from_, to, channel_id, limit, deflate),
+                        _data, from_, to, channel_id, limit, deflate)
+    if isinstance(body, BlockBody):
+        return body.response()
+    return body
+
+
+class BlockBody(NamedTuple):
+    """
+    Готове тіло /data з кешу блоків. Спільне для всіх учасників SingleFlight,
+    тож незмінне: Response кожному свій — middleware стиснення переписує
+    заголовки відповіді на місці.
+    """
+    content: bytes
+    encoding: str | None        # 'deflate' — вже стиснене; None — JSON як є
+
+    def response(self) -> Response:
+        if self.encoding is None:
+            return Response(self.content, media_type='application/json')
+        return Response(self.content, media_type='application/json',
+                        headers={'Content-Encoding': self.encoding, 'Vary': 'Accept-Encoding'})
+
+
+async def _data(from_: datetime, to: datetime, channel_id: int | None, limit: int,
+                deflate: bool = False) -> dict | BlockBody:
     if from_ >= to:
         raise HTTPException(
             status_code=400,
             detail={'error': 'invalid_params', 'detail': 'from must be before to'},
         )
-
-    conn = _conn()
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            params: dict = {'from_': from_, 'to': to, 'limit': limit + 1}
-            ch_filter = ''
-            if channel_id is not None:
-                ch_filter = 'AND channel_id = %(channel_id)s'
-                params['channel_id'] = channel_id
-
-            cur.execute(f"""
-                SELECT channel_id, value, time
-                FROM measurements
-                WHERE time >= %(from_)s AND time < %(to)s
-                {ch_filter}
-                ORDER BY time ASC
-                LIMIT %(limit)s
-            """, params)
-            rows = cur.fetchall()
-    finally:
-        conn.close()
+    # asyncpg вважає naive datetime місцевим часом — параметри завжди UTC
+    if from_.tzinfo is None:
+        from_ = from_.replace(tzinfo=timezone.utc)
+    if to.tzinfo is None:
+        to = to.replace(tzinfo=timezone.utc)
+
+    if blocks is not None and channel_id is None:
+        body = await _block_data(from_, to, limit, deflate)
+        if body is not None:
+            return body
+
+    rows = await asyncio.to_thread(_ring_data, from_, to, channel_id, limit + 1)
+    if rows is None:
+        async with _conn() as conn:
+            rows = await _query_data(conn, from_, to, channel_id, limit + 1)
 
     truncated = len(rows) > limit
     if truncated:
@@ -228,64 +470,430 @@ def data(
         'to':        _fmt(to),
         'count':     len(rows),
         'truncated': truncated,
-        'rows': [
-            {
-                'channel_id': r['channel_id'],
-                'value':      r['value'],
-                'time':       _fmt(r['time']),
-            }
-            for r in rows
-        ],
+        'rows':      rows,
+    }
+
+
+async def _query_data(conn, from_: datetime, to: datetime, channel_id: int | None,
+                      limit: int) -> list[dict]:
+    if channel_id is None:
+        rows = await conn.fetch("""
+            SELECT channel_id, value, time
+            FROM measurements_all
+            WHERE time >= $1 AND time < $2
+            ORDER BY time ASC, channel_id
+            LIMIT $3
+        """, from_, to, limit)
+    else:
+        rows = await conn.fetch("""
+            SELECT channel_id, value, time
+            FROM measurements_all
+            WHERE time >= $1 AND time < $2 AND channel_id = $4
+            ORDER BY time ASC
+            LIMIT $3
+        """, from_, to, limit, channel_id)
+    return [
+        {'channel_id': cid, 'value': value, 'time': _fmt(t)}
+        for cid, value, t in rows
+    ]
+
+
+async def _block_data(from_: datetime, to: datetime, limit: int,
+                      deflate: bool) -> BlockBody | None:
+    """
+    /data з кешу закритих блоків: повні блоки — з диска, решта (неповні краї,
+    відкритий блок, ще не закешовані) — з кільця чи БД одним запитом на
+    суцільний відрізок; нові закриті блоки кешуються. Диск і стиснення —
+    у потоці (asyncio.to_thread), щоб не тримати цикл подій.
+
+    None — кешувати нічого (вікно всередині відкритого блоку) або рядків
+    більше за limit: відповідає звичайний шлях з truncated.
+    """
+    settled = datetime.now(timezone.utc) - timedelta(seconds=_BLOCK_SETTLE)
+    segments = block_codec.split(from_, to, blocks.block_sec, settled)
+    if not any(cacheable for _, _, cacheable in segments):
+        return None
+
+    chunks = await asyncio.to_thread(
+        lambda: [blocks.get(lo) if cacheable else None for lo, _, cacheable in segments])
+    remaining = limit - sum(c.rows for c in chunks if c is not None)
+    if remaining < 0:
+        return None
+
+    # Суцільні відрізки без кешу — один запит на кожен
+    runs: list[list[int]] = []
+    for i, chunk in enumerate(chunks):
+        if chunk is None:
+            if runs and runs[-1][-1] == i - 1:
+                runs[-1].append(i)
+            else:
+                runs.append([i])
+
+    run_rows: list[list[dict]] = []
+    for run in runs:
+        lo, hi = segments[run[0]][0], segments[run[-1]][1]
+        rows = await asyncio.to_thread(_ring_data, lo, hi, None, remaining + 1)
+        if rows is None:
+            async with _conn() as conn:
+                rows = await _query_data(conn, lo, hi, None, remaining + 1)
+        if len(rows) > remaining:
+            return None
+        remaining -= len(rows)
+        run_rows.append(rows)
+
+    return await asyncio.to_thread(_assemble_blocks, from_, to, segments, chunks,
+                                   runs, run_rows, deflate)
+
+
+def _assemble_blocks(from_: datetime, to: datetime, segments: list, chunks: list,
+                     runs: list[list[int]], run_rows: list[list[dict]],
+                     deflate: bool) -> BlockBody:
+    """Розкласти нові рядки по блоках, закешувати закриті, склеїти відповідь."""
+    for run, rows in zip(runs, run_rows):
+        # Межі всередині run — цілі секунди, рядки відсортовані за часом,
+        # ISO-рядки порівнюються як час
+        pos = 0
+        for i in run:
+            seg_lo, seg_hi, cacheable = segments[i]
+            end = pos
+            if i != run[-1]:
+                bound = _fmt(seg_hi)
+                while end < len(rows) and rows[end]['time'] < bound:
+                    end += 1
+            else:
+                end = len(rows)
+            part = rows[pos:end]
+            pos = end
+            chunks[i] = block_codec.deflate_chunk(block_codec.encode_rows(part), len(part))
+            if cacheable:
+                blocks.put(seg_lo, chunks[i])
+
+    count = sum(c.rows for c in chunks)
+    head = json.dumps({'from': _fmt(from_), 'to': _fmt(to), 'count': count,
+                       'truncated': False}, separators=(',', ':'))
+    # Кожен рядок блоку починається з коми — у першому непорожньому її прибрати
+    first = next((i for i, c in enumerate(chunks) if c.rows), None)
+    if first is not None:
+        raw = block_codec.inflate_chunk(chunks[first])[1:]
+        chunks[first] = block_codec.deflate_chunk(raw, chunks[first].rows)
+    prefix = (head[:-1] + ',"rows":[').encode()
+    parts = ([block_codec.deflate_chunk(prefix, 0)] + chunks
+             + [block_codec.deflate_chunk(b']}', 0)])
+    stream = block_codec.zlib_stream(parts)
+    if deflate:
+        return BlockBody(stream, 'deflate')
+    return BlockBody(zlib.decompress(stream), None)
+
+
+def _ring_latest() -> list[dict] | None:
+    """Рядки /data/latest з кільця; None — кільця немає чи воно застаріле."""
+    latest = _ring_read(RingReader.latest_values)
+    if latest is None:
+        return None
+    return [
+        {'channel_id': cid, 'value': None if math.isnan(v) else v, 'time': ns_to_iso(t)}
+        for cid, (t, v) in sorted(latest.items())
+    ]
+
+
+def _ring_data(from_: datetime, to: datetime, channel_id: int | None,
+               limit: int) -> list[dict] | None:
+    """
+    Рядки /data з кільця: лише значення, записані в БД (stored), —
+    та сама вибірка, що й measurements_all. None — вікно не в кільці.
+    """
+    cycles = _ring_cycles(from_)
+    if cycles is None:
+        return None
+    if to.tzinfo is None:
+        to = to.replace(tzinfo=timezone.utc)
+    to_ns = datetime_to_ns(to)
+    rows = []
+    for c in cycles:
+        if c.cycle_time_ns >= to_ns:
+            break
+        time_str = ns_to_iso(c.cycle_time_ns)
+        for cid, v, stored in zip(c.ids, c.values, c.stored):
+            if stored and (channel_id is None or cid == channel_id):
+                rows.append({'channel_id': cid, 'value': None if math.isnan(v) else v,
+                             'time': time_str})
+        if len(rows) >= limit:
+            return rows[:limit]
+    return rows
+
+
+@app.get('/data/agg')
+async def data_agg(
+    from_:      datetime   = Query(..., alias='from'),
+    to:         datetime   = Query(...),
+    bucket:     int        = Query(60, ge=1, le=86400),
+    channel_id: int | None = Query(None),
+    limit:      int        = Query(10000, ge=1000, le=50000),
+    _:          None       = AUTH,
+):
+    """
+    Агрегати вимірювань по інтервалах bucket секунд: min/max/avg/last
+    на канал. Для догону довгого gap по слабкому каналу — спершу грубий
+    огляд усього gap, потім /data у фоні.
+    """
+    return await _serve(heavy_lane, ('data/agg', from_, to, bucket, channel_id, limit),
+                        _data_agg, from_, to, bucket, channel_id, limit)
+
+
+async def _data_agg(from_: datetime, to: datetime, bucket: int, channel_id: int | None,
+                    limit: int) -> dict:
+    if from_ >= to:
+        raise HTTPException(
+            status_code=400,
+            detail={'error': 'invalid_params', 'detail': 'from must be before to'},
+        )
+    if from_.tzinfo is None:
+        from_ = from_.replace(tzinfo=timezone.utc)
+    if to.tzinfo is None:
+        to = to.replace(tzinfo=timezone.utc)
+
+    ch_filter = 'AND channel_id = $5' if channel_id is not None else ''
+    args = [from_, to, float(bucket), limit + 1]
+    if channel_id is not None:
+        args.append(channel_id)
+    async with _conn() as conn:
+        # Інтервали вирівняні від epoch — однакові межі в повторних запитах
+        rows = await conn.fetch(f"""
+            SELECT channel_id,
+                   date_bin(make_interval(secs => $3), time,
+                            TIMESTAMPTZ '1970-01-01 00:00:00+00') AS bucket,
+                   MIN(value), MAX(value), AVG(value),
+                   (array_agg(value ORDER BY time DESC))[1],
+                   COUNT(*)
+            FROM measurements_all
+            WHERE time >= $1 AND time < $2 AND value IS NOT NULL
+            {ch_filter}
+            GROUP BY channel_id, bucket
+            ORDER BY bucket, channel_id
+            LIMIT $4
+        """, *args)
+
+    agg_rows = [
+        {'channel_id': cid, 'time': _fmt(t), 'min': lo, 'max': hi, 'avg': avg,
+         'last': last, 'samples': n}
+        for cid, t, lo, hi, avg, last, n in rows
+    ]
+    agg_rows, covered_to = _cut_at_time(agg_rows, limit)
+    return {
+        'from':       _fmt(from_),
+        'to':         covered_to or _fmt(to),
+        'bucket_sec': bucket,
+        'count':      len(agg_rows),
+        'truncated':  covered_to is not None,
+        'rows':       agg_rows,
     }
 
 
 @app.get('/alarms')
-def alarms(
+async def alarms(
     from_:           datetime = Query(..., alias='from'),
     to:              datetime = Query(...),
     unresolved_only: bool     = Query(False),
     _:               None     = AUTH,
 ):
     """Тривоги за часовим діапазоном."""
+    return await _serve(heavy_lane, ('alarms', from_, to, unresolved_only),
+                        _alarms, from_, to, unresolved_only)
+
+
+async def _alarms(from_: datetime, to: datetime, unresolved_only: bool) -> list[dict]:
     if from_ >= to:
         raise HTTPException(
             status_code=400,
             detail={'error': 'invalid_params', 'detail': 'from must be before to'},
         )
+    if from_.tzinfo is None:
+        from_ = from_.replace(tzinfo=timezone.utc)
+    if to.tzinfo is None:
+        to = to.replace(tzinfo=timezone.utc)
+
+    extra = 'AND al.resolved_at IS NULL' if unresolved_only else ''
+    async with _conn() as conn:
+        rows = await conn.fetch(f"""
+            {_ALARM_SELECT}
+            WHERE (
+                al.triggered_at >= $1 AND al.triggered_at < $2
+                OR al.resolved_at >= $1 AND al.resolved_at < $2
+            )
+            {extra}
+            ORDER BY al.triggered_at ASC
+        """, from_, to)
+
+    return [_alarm_row(r) for r in rows]
+
+
+_ALARM_SELECT = """
+    SELECT
+        al.id          AS alarm_id,
+        al.channel_id,
+        ar.severity,
+        al.message,
+        al.triggered_at,
+        al.resolved_at,
+        al.change_seq
+    FROM alarms_log al
+    LEFT JOIN alarm_rules ar ON ar.id = al.rule_id
+"""
 
-    conn = _conn()
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            extra = 'AND al.resolved_at IS NULL' if unresolved_only else ''
-            cur.execute(f"""
-                SELECT
-                    al.id          AS alarm_id,
-                    al.channel_id,
-                    ar.severity,
-                    al.message,
-                    al.triggered_at,
-                    al.resolved_at
-                FROM alarms_log al
-                LEFT JOIN alarm_rules ar ON ar.id = al.rule_id
-                WHERE (
-                    al.triggered_at >= %(from_)s AND al.triggered_at < %(to)s
-                    OR al.resolved_at >= %(from_)s AND al.resolved_at < %(to)s
-                )
-                {extra}
+
+def _alarm_row(r) -> dict:
+    return {
+        'alarm_id':    r['alarm_id'],
+        'channel_id':  r['channel_id'],
+        'severity':    r['severity'],
+        'message':     r['message'],
+        'triggered_at': _fmt(r['triggered_at']),
+        'resolved_at':  _fmt(r['resolved_at']),
+    }
+
+
+@app.get('/sync')
+async def sync(
+    since:         datetime        = Query(...),
+    to:            datetime | None = Query(None),
+    channels_etag: str | None      = Query(None),
+    alarm_seq:     int | None      = Query(None),
+    limit:         int             = Query(10000, ge=1000, le=50000),
+    _:             None            = AUTH,
+):
+    """
+    Цикл синхронізації одним запитом: /status + /channels + /data + /alarms.
+
+    channels — лише якщо channels_etag клієнта застарів (інакше null);
+    alarms — записи alarms_log, змінені після alarm_seq (без alarm_seq —
+    за вікном [since, to), як /alarms). Обрізане data закінчується на межі
+    мітки часу: data.to — до якого моменту вікно покрите; клієнт продовжує
+    з since=data.to.
+    """
+    return await _serve(heavy_lane, ('sync', since, to, channels_etag, alarm_seq, limit),
+                        _sync, since, to, channels_etag, alarm_seq, limit)
+
+
+async def _sync(since: datetime, to: datetime | None, channels_etag: str | None,
+                alarm_seq: int | None, limit: int) -> dict:
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if to is None:
+        to = datetime.now(timezone.utc)
+    elif to.tzinfo is None:
+        to = to.replace(tzinfo=timezone.utc)
+    if since >= to:
+        raise HTTPException(
+            status_code=400,
+            detail={'error': 'invalid_params', 'detail': 'since must be before to'},
+        )
+
+    status_body = await _status_body()
+    rows = await asyncio.to_thread(_ring_data, since, to, None, limit + 1)
+
+    async with _conn() as conn:
+        # Канали змінюються рідко — ETag з updated_at усіх рядків замість списку
+        etag = await conn.fetchval("""
+            SELECT md5(COALESCE(string_agg(channel_id || ':' || updated_at,
+                                           ',' ORDER BY channel_id), ''))
+            FROM channel_config
+        """)
+        channels_body = await _query_channels(conn) if etag != channels_etag else None
+
+        if rows is None:
+            rows = await _query_data(conn, since, to, None, limit + 1)
+
+        if alarm_seq is None:
+            seq = await conn.fetchval('SELECT COALESCE(MAX(change_seq), 0) FROM alarms_log')
+            alarm_rows = await conn.fetch(f"""
+                {_ALARM_SELECT}
+                WHERE al.triggered_at >= $1 AND al.triggered_at < $2
+                   OR al.resolved_at >= $1 AND al.resolved_at < $2
                 ORDER BY al.triggered_at ASC
-            """, {'from_': from_, 'to': to})
-            rows = cur.fetchall()
-    finally:
-        conn.close()
+            """, since, to)
+        else:
+            seq = alarm_seq
+            alarm_rows = await conn.fetch(f"""
+                {_ALARM_SELECT}
+                WHERE al.change_seq > $1
+                ORDER BY al.change_seq ASC
+            """, alarm_seq)
+
+    if alarm_seq is not None:
+        seq = max((r['change_seq'] for r in alarm_rows), default=seq)
+    rows, covered_to = _cut_at_time(rows, limit)
 
-    return [
-        {
-            'alarm_id':    r['alarm_id'],
-            'channel_id':  r['channel_id'],
-            'severity':    r['severity'],
-            'message':     r['message'],
-            'triggered_at': _fmt(r['triggered_at']),
-            'resolved_at':  _fmt(r['resolved_at']),
-        }
-        for r in rows
-    ]
+    return {
+        'status':        status_body,
+        'channels_etag': etag,
+        'channels':      channels_body,
+        'data': {
+            'from':      _fmt(since),
+            'to':        covered_to or _fmt(to),
+            'count':     len(rows),
+            'truncated': covered_to is not None,
+            'rows':      rows,
+        },
+        'alarm_seq':     seq,
+        'alarms':        [_alarm_row(r) for r in alarm_rows],
+    }
+
+
+def _cut_at_time(rows: list[dict], limit: int) -> tuple[list[dict], str | None]:
+    """
+    Рядки понад limit відкидаються цілими мітками часу, щоб продовження
+    з since=<межа> не втратило й не повторило значень. Повертає
+    (рядки, межа) або (рядки, None), якщо обрізати не довелось.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    boundary = rows[limit]['time']
+    kept = [r for r in rows[:limit] if r['time'] != boundary]
+    if kept:
+        return kept, boundary
+    # Понад limit значень з однією міткою (limit < кількості каналів) — далі за неї
+    nxt = datetime.fromisoformat(boundary.replace('Z', '+00:00')) + timedelta(milliseconds=1)
+    return rows[:limit], _fmt(nxt)
+
+
+class SyncAck(BaseModel):
+    acked_to: datetime
+
+
+@app.post('/sync/ack')
+async def sync_ack(body: SyncAck, _: None = AUTH):
+    """
+    Fleet Server підтверджує, що рядки з time < acked_to надійно збережені.
+
+    Позначка тільки росте і обрізається до поточного часу машини
+    (годинник сервера може бути попереду). Після першого підтвердження
+    локальний retention видаляє лише підтверджене (колектор, PartitionMaintainer).
+    """
+    acked_to = body.acked_to
+    if acked_to.tzinfo is None:
+        acked_to = acked_to.replace(tzinfo=timezone.utc)
+
+    async with _conn() as conn:
+        stored = await conn.fetchval("""
+            INSERT INTO sync_ack (id, acked_to, acked_at)
+            VALUES (1, LEAST($1::timestamptz, NOW()), NOW())
+            ON CONFLICT (id) DO UPDATE
+                SET acked_to = GREATEST(sync_ack.acked_to, EXCLUDED.acked_to),
+                    acked_at = EXCLUDED.acked_at
+            RETURNING acked_to
+        """, acked_to)
+
+    return {'acked_to': _fmt(stored)}
+
+
+@app.get('/compression/dictionary')
+async def compression_dictionary(_: None = AUTH):
+    """
+    Словник zstd для Content-Encoding: dcz. Клієнт зберігає його і надсилає
+    Available-Dictionary: :base64(SHA-256): — 404, якщо словника немає.
+    """
+    if zstd_dict is None:
+        raise HTTPException(status_code=404, detail="No dictionary")
+    return Response(zstd_dict.data, media_type='application/octet-stream',
+                    headers={'Use-As-Dictionary': 'match="/*"',
+                             'Cache-Control': 'no-cache'})
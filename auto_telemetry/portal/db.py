@@ -0,0 +1,146 @@
+"""
+Доступ Portal до PostgreSQL поза event loop.
+
+psycopg2 блокує потік на кожному запиті, тому всі запити виконуються
+в пулі потоків (asyncio.to_thread) на з'єднаннях з ThreadedConnectionPool —
+ZeroMQ listener і SSE-потоки не чекають на БД.
+
+Назви та одиниці каналів (ChannelMeta) кешуються в пам'яті й оновлюються
+за pg_notify('config_changed', channel_id) — див. listen_config у main.py.
+"""
+
+import asyncio
+import threading
+from typing import Callable, Iterable, TypeVar
+
+import psycopg2
+import psycopg2.pool
+
+T = TypeVar("T")
+
+
+class Database:
+    """Пул з'єднань, створюється при першому запиті (БД може бути ще недоступна)."""
+
+    def __init__(self, dsn: str, maxconn: int = 4):
+        self._dsn = dsn
+        self._maxconn = maxconn
+        self._pool: psycopg2.pool.ThreadedConnectionPool | None = None
+        self._lock = threading.Lock()
+        # Потоків asyncio.to_thread більше, ніж з'єднань, а getconn() при
+        # вичерпаному пулі кидає PoolError замість чекати — зайві запити чекають тут
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        """fn(conn, *args) у пулі потоків; після помилки з'єднання закривається, а не повертається в пул."""
+        return await asyncio.to_thread(self._call, fn, args)
+
+    def _call(self, fn, args):
+        with self._lock:
+            if self._pool is None:
+                self._pool = psycopg2.pool.ThreadedConnectionPool(
+                    minconn=1, maxconn=self._maxconn, dsn=self._dsn, connect_timeout=5)
+        with self._slots:
+            conn = self._pool.getconn()
+            try:
+                result = fn(conn, *args)
+            except Exception:
+                self._pool.putconn(conn, close=True)
+                raise
+            self._pool.putconn(conn)
+            return result
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+
+
+# ── Запити (виконуються в потоці пулу) ─────────────────────────────────────────
+
+def fetch_channels(conn) -> list[dict]:
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT channel_id, module, channel_index, signal_type, name, unit, "
+            "raw_min, raw_max, phys_min, phys_max, enabled "
+            "FROM channel_config ORDER BY channel_id"
+        )
+        cols = [d[0] for d in cur.description]
+        rows = [dict(zip(cols, row)) for row in cur.fetchall()]
+    conn.rollback()     # завершити транзакцію читання перед поверненням у пул
+    return rows
+
+
+def update_channel(conn, channel_id: int, fields: dict) -> bool:
+    """UPDATE channel_config; False — каналу немає."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "UPDATE channel_config SET name=%(name)s, unit=%(unit)s, raw_min=%(raw_min)s, "
+            "raw_max=%(raw_max)s, phys_min=%(phys_min)s, phys_max=%(phys_max)s, "
+            "enabled=%(enabled)s WHERE channel_id=%(channel_id)s",
+            {**fields, "channel_id": channel_id},
+        )
+        found = cur.rowcount > 0
+    conn.commit()
+    return found
+
+
+def fetch_meta(conn, channel_ids: Iterable[int] | None = None) -> list[tuple[int, str, str | None]]:
+    """(channel_id, name, unit) увімкнених каналів; channel_ids — лише ці канали."""
+    ids_filter = "AND channel_id = ANY(%(ids)s)" if channel_ids is not None else ""
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT channel_id, name, unit FROM channel_config "
+            f"WHERE enabled {ids_filter} ORDER BY channel_id",
+            {"ids": list(channel_ids or ())},
+        )
+        rows = cur.fetchall()
+    conn.rollback()
+    return rows
+
+
+def listen_connection(dsn: str):
+    """Окреме autocommit-з'єднання з LISTEN config_changed (не з пулу — живе весь час)."""
+    conn = psycopg2.connect(dsn, connect_timeout=5)
+    conn.set_isolation_level(0)     # autocommit — обов'язково для LISTEN
+    with conn.cursor() as cur:
+        cur.execute("LISTEN config_changed;")
+    return conn
+
+
+# ── Кеш назв/одиниць ───────────────────────────────────────────────────────────
+
+class ChannelMeta:
+    """channel_id → {name, unit} увімкнених каналів."""
+
+    def __init__(self):
+        self._meta: dict[int, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._meta)
+
+    def get(self, channel_id: int) -> dict:
+        return self._meta.get(channel_id, {"name": f"CH{channel_id}", "unit": ""})
+
+    def put(self, channel_id: int, name: str, unit: str | None) -> bool:
+        """True — назва чи одиниця змінились."""
+        meta = {"name": name, "unit": unit or ""}
+        if self._meta.get(channel_id) == meta:
+            return False
+        self._meta[channel_id] = meta
+        return True
+
+    def apply(self, rows: Iterable[tuple[int, str, str | None]],
+              channel_ids: Iterable[int] | None = None) -> set[int]:
+        """
+        Результат fetch_meta → кеш. channel_ids — канали, які перечитувались
+        (None — усі): відсутні серед rows вимкнено чи видалено.
+        Повертає канали, чиї назва/одиниця змінились.
+        """
+        rows = list(rows)
+        stale = set(self._meta) if channel_ids is None else set(channel_ids) & set(self._meta)
+        stale -= {cid for cid, _, _ in rows}
+        changed = {cid for cid, name, unit in rows if self.put(cid, name, unit)}
+        for cid in stale:
+            del self._meta[cid]
+        return changed | stale
@@ -0,0 +1,115 @@
+"""
+SSE fan-out Portal: один кадр на цикл для всіх клієнтів, без черг на клієнта.
+
+Кожен клієнт має слот «останнє значення перемагає» — asyncio.Event і номер
+останнього отриманого кадру (seq). Listener лише оновлює стан і будить
+клієнтів; повільна вкладка браузера пропускає проміжні цикли замість
+накопичувати їх у пам'яті.
+
+Кадри (JSON у полі data SSE), time — cycle_time кадру:
+    {"type": "full",  "seq": N, "time": T, "rows": [...]}
+        усі канали — перший кадр і після пропуску
+    {"type": "delta", "seq": N, "time": T, "rows": [...], "seen": [id, ...]}
+        rows — канали, чиє значення змінилось; seen — прочитані в цьому циклі
+        без зміни (клієнт ставить їм time = T)
+
+rows — [{channel_id, name, value, unit, time, changed}]: time — цикл останнього
+показу каналу, changed — цикл останньої зміни значення. Стале значення має свіжий
+time, канал без показів (модуль не опитується) — time, що відстає.
+Обидва кадри кодуються не більше одного разу на цикл, незалежно від кількості клієнтів.
+"""
+
+import asyncio
+import json
+from typing import Callable, Iterable
+
+
+class Client:
+    __slots__ = ("event", "seq")
+
+    def __init__(self):
+        self.event = asyncio.Event()
+        self.seq = -1           # ще нічого не отримав → перший кадр full
+
+
+class Broadcaster:
+    """Поточні значення каналів + закодовані кадри останнього циклу."""
+
+    def __init__(self, meta: Callable[[int], dict]):
+        self._meta = meta       # channel_id → {"name", "unit"}
+        self._rows: dict[int, dict] = {}
+        self._touched: set[int] = set()
+        self._clients: set[Client] = set()
+        self.seq = 0
+        self._time: str | None = None
+        self._delta: str | None = None
+        self._full: str | None = None
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def subscribe(self) -> Client:
+        c = Client()
+        self._clients.add(c)
+        if self.seq:
+            c.event.set()
+        return c
+
+    def unsubscribe(self, c: Client) -> None:
+        self._clients.discard(c)
+
+    def touch(self, channel_id: int) -> None:
+        """Змінилась назва/одиниця каналу — потрапить у наступну дельту."""
+        self._touched.add(channel_id)
+
+    def update(self, cycle_time: str, readings: Iterable[tuple[int, float | None]]) -> None:
+        """Покази циклу → новий seq, кадр delta, пробудження клієнтів."""
+        changed = []
+        seen = []
+        rows = self._rows
+        touched = self._touched
+        for cid, value in readings:
+            value = round(value, 3) if value is not None else None
+            row = rows.get(cid)
+            if row is not None and row["value"] == value and cid not in touched:
+                row["time"] = cycle_time
+                seen.append(cid)
+                continue
+            meta = self._meta(cid)
+            same = row is not None and row["value"] == value
+            row = {"channel_id": cid, "name": meta["name"], "value": value,
+                   "unit": meta["unit"], "time": cycle_time,
+                   "changed": row["changed"] if same else cycle_time}
+            rows[cid] = row
+            changed.append(row)
+        for cid in touched:
+            row = rows.get(cid)
+            if row is not None and row["time"] != cycle_time:
+                meta = self._meta(cid)
+                row.update(name=meta["name"], unit=meta["unit"])
+                changed.append(row)
+        touched.clear()
+
+        self.seq += 1
+        self._time = cycle_time
+        self._full = None
+        self._delta = json.dumps({"type": "delta", "seq": self.seq, "time": cycle_time,
+                                  "rows": sorted(changed, key=lambda r: r["channel_id"]),
+                                  "seen": sorted(seen)})
+        for c in self._clients:
+            c.event.set()
+
+    def full(self) -> str:
+        if self._full is None:
+            self._full = json.dumps({"type": "full", "seq": self.seq, "time": self._time,
+                                     "rows": [self._rows[cid] for cid in sorted(self._rows)]})
+        return self._full
+
+    def frame_for(self, c: Client) -> str | None:
+        """Кадр для клієнта: delta, якщо він отримав попередній цикл, інакше full."""
+        c.event.clear()
+        if c.seq == self.seq:
+            return None
+        frame = self._delta if c.seq == self.seq - 1 and self._delta is not None else self.full()
+        c.seq = self.seq
+        return frame
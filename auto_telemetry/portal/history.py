@@ -0,0 +1,104 @@
+"""
+Історія значень у пам'яті Portal — для трендів без запитів до PostgreSQL.
+
+Кожен канал має кільце фіксованого розміру (NumPy: час float64 + значення
+float32, 12 байт на семпл), яке наповнює ZeroMQ listener. GET /api/history
+віддає вікно, стиснуте до заданої кількості кошиків (avg/min/max — min/max
+зберігають короткі сплески, які усереднення б сховало).
+
+Розмір кільця — у семплах: PORTAL_HISTORY_POINTS=21600 — 6 годин при 1 Гц.
+"""
+
+from typing import Iterable
+
+import numpy as np
+
+_NAN = float("nan")
+
+
+class ChannelRing:
+    """Останні capacity семплів одного каналу."""
+
+    __slots__ = ("t", "v", "head", "count")
+
+    def __init__(self, capacity: int):
+        self.t = np.zeros(capacity)
+        self.v = np.zeros(capacity, np.float32)
+        self.head = 0       # індекс наступного запису
+        self.count = 0
+
+    def append(self, t: float, value: float | None) -> None:
+        if self.count and t < self.t[self.head - 1]:
+            # Час пішов назад (корекція годинника) — історія вже не впорядкована
+            self.head = self.count = 0
+        self.t[self.head] = t
+        self.v[self.head] = _NAN if value is None else value
+        self.head = (self.head + 1) % len(self.t)
+        self.count = min(self.count + 1, len(self.t))
+
+    def window(self, since: float, until: float) -> tuple[np.ndarray, np.ndarray]:
+        """Семпли since < t <= until у порядку часу (без null)."""
+        if self.count < len(self.t):
+            t, v = self.t[:self.count], self.v[:self.count]
+        else:
+            t = np.concatenate((self.t[self.head:], self.t[:self.head]))
+            v = np.concatenate((self.v[self.head:], self.v[:self.head]))
+        lo = np.searchsorted(t, since, side="right")
+        hi = np.searchsorted(t, until, side="right")
+        t, v = t[lo:hi], v[lo:hi]
+        ok = ~np.isnan(v)
+        return t[ok], v[ok]
+
+
+def downsample(t: np.ndarray, v: np.ndarray, since: float, bucket: float, points: int) -> dict:
+    """
+    Семпли since < t <= since + points·bucket → кошики (since + k·bucket, since + (k+1)·bucket]:
+    {t (epoch мс, початок кошика), avg, min, max}; порожні кошики пропускаються.
+    """
+    if not len(t):
+        return {"t": [], "avg": [], "min": [], "max": []}
+    idx = np.clip(np.ceil((t - since) / bucket) - 1, 0, points - 1).astype(np.int64)
+    # t впорядкований → межі кошиків там, де змінюється idx
+    starts = np.flatnonzero(np.r_[True, idx[1:] != idx[:-1]])
+    counts = np.diff(np.r_[starts, len(v)])
+    v64 = v.astype(np.float64)
+    avg = np.add.reduceat(v64, starts) / counts
+    return {
+        "t":   ((since + idx[starts] * bucket) * 1000).astype(np.int64).tolist(),
+        "avg": np.round(avg, 3).tolist(),
+        "min": np.round(np.minimum.reduceat(v64, starts), 3).tolist(),
+        "max": np.round(np.maximum.reduceat(v64, starts), 3).tolist(),
+    }
+
+
+class History:
+    """Кільця всіх каналів; канал з'являється з першим показом."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._rings: dict[int, ChannelRing] = {}
+        self.last_t: float | None = None
+
+    def append(self, t: float, readings: Iterable[tuple[int, float | None]]) -> None:
+        rings = self._rings
+        for cid, value in readings:
+            ring = rings.get(cid)
+            if ring is None:
+                ring = rings[cid] = ChannelRing(self.capacity)
+            ring.append(t, value)
+        self.last_t = t
+
+    def query(self, channel_ids: Iterable[int], seconds: float, points: int) -> dict:
+        """Останні seconds секунд (відносно останнього циклу) по каналах, ≤ points кошиків."""
+        until = self.last_t if self.last_t is not None else 0.0
+        since = until - seconds
+        points = max(points, 1)
+        bucket = max(seconds / points, 1e-3)
+        series = {}
+        for cid in channel_ids:
+            ring = self._rings.get(cid)
+            if ring is None:
+                continue
+            series[cid] = downsample(*ring.window(since, until), since, bucket, points)
+        return {"since": int(since * 1000), "until": int(until * 1000),
+                "bucket_sec": bucket, "series": series}
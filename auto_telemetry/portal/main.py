@@ -1,6 +1,10 @@
 """
 Portal — операторський інтерфейс.
 
+Запити до PostgreSQL виконуються в пулі потоків (portal/db.py) — event loop
+з ZeroMQ listener і SSE-потоками не блокується. Назви/одиниці каналів —
+кеш, який оновлює LISTEN config_changed.
+
 Запуск: uvicorn portal.main:app --reload --port 8100
 """
 
@@ -8,28 +12,42 @@ import asyncio
 import json
 import os
 import sys
+import time
 from contextlib import asynccontextmanager
+from datetime import datetime
 
 if sys.platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-import psycopg2
 import zmq.asyncio
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.responses import StreamingResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
 
+from collector.frames import TOPIC_BINARY, TOPIC_JSON, decode_frame, iter_readings, ns_to_iso
+from collector.notify_batch import NotifyBatch
+from portal import db
+from portal.fanout import Broadcaster
+from portal.history import History
+
 load_dotenv()
 
 CONFIG_PIN = os.getenv("CONFIG_PIN", "1234")
+# ZMQ_BINARY_FRAMES=1 — читати бінарний topic колектора замість JSON (ADR-001)
+ZMQ_BINARY = os.getenv("ZMQ_BINARY_FRAMES", "0") == "1"
+# Семплів на канал в історії пам'яті (/api/history); 21600 — 6 год при 1 Гц
+HISTORY_POINTS = int(os.getenv("PORTAL_HISTORY_POINTS", "21600"))
 
 # ── In-memory стан ─────────────────────────────────────────────────────────────
 
-current_values: dict[int, dict] = {}   # channel_id → {value, time}
-channel_meta: dict[int, dict] = {}     # channel_id → {name, unit}
-sse_clients: list[asyncio.Queue] = []
+# channel_id → {name, unit}; оновлюється listen_config
+channel_meta = db.ChannelMeta()
+# Поточні значення + SSE-кадри (full/delta) для всіх клієнтів
+broadcaster = Broadcaster(channel_meta.get)
+# Тренди каналів з шини даних — без запитів до БД
+history = History(HISTORY_POINTS)
 
 
 # ── DB ─────────────────────────────────────────────────────────────────────────
@@ -44,61 +62,88 @@ def _dsn() -> str:
     )
 
 
-def load_channel_meta() -> None:
-    """Завантажує назви та одиниці каналів з БД."""
-    try:
-        conn = psycopg2.connect(_dsn())
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT channel_id, name, unit FROM channel_config "
-            "WHERE enabled ORDER BY channel_id"
-        )
-        for channel_id, name, unit in cur.fetchall():
-            channel_meta[channel_id] = {"name": name, "unit": unit or ""}
-        conn.close()
-    except Exception as e:
-        print(f"[portal] DB помилка при завантаженні каналів: {e}")
+database = db.Database(_dsn())
 
 
-# ── ZeroMQ listener ────────────────────────────────────────────────────────────
+def _apply_meta(rows, channel_ids=None) -> None:
+    for cid in channel_meta.apply(rows, channel_ids):
+        broadcaster.touch(cid)
+
 
-def _build_snapshot() -> str:
-    rows = []
-    for cid in sorted(current_values):
-        meta = channel_meta.get(cid, {"name": f"CH{cid}", "unit": ""})
-        v = current_values[cid]
-        val = v["value"]
-        rows.append({
-            "channel_id": cid,
-            "name": meta["name"],
-            "value": round(val, 3) if val is not None else None,
-            "unit": meta["unit"],
-            "time": v["time"],
-        })
-    return json.dumps(rows)
+async def listen_config() -> None:
+    """
+    Фонова задача: LISTEN config_changed → перечитати назви/одиниці змінених каналів.
 
+    З'єднання LISTEN читається через loop.add_reader, запити — через пул.
+    Після (пере)підключення — повне перечитування: повідомлення за час розриву втрачено.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        conn = None
+        try:
+            conn = await asyncio.to_thread(db.listen_connection, _dsn())
+            _apply_meta(await database.run(db.fetch_meta))
+            print(f"[portal] LISTEN config_changed, каналів {len(channel_meta)}")
+            ready = asyncio.Event()
+            loop.add_reader(conn.fileno(), ready.set)
+            try:
+                batch = NotifyBatch(debounce=0.3, max_delay=2.0)
+                while True:
+                    deadline = batch.deadline()
+                    timeout = 30.0 if deadline is None else max(0.0, deadline - time.monotonic())
+                    try:
+                        await asyncio.wait_for(ready.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                    ready.clear()
+                    conn.poll()     # не блокує; кидає виняток, якщо з'єднання розірвано
+                    now = time.monotonic()
+                    for n in conn.notifies:
+                        batch.add(n.payload, now)
+                    conn.notifies.clear()
+                    deadline = batch.deadline()
+                    if deadline is not None and time.monotonic() >= deadline:
+                        ids, full = batch.take()
+                        rows = await database.run(db.fetch_meta, None if full else ids)
+                        _apply_meta(rows, None if full else ids)
+            finally:
+                loop.remove_reader(conn.fileno())
+        except Exception as e:
+            print(f"[portal] LISTEN config_changed: {e} — повтор через 5 с")
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            await asyncio.sleep(5)
+
+
+# ── ZeroMQ listener ────────────────────────────────────────────────────────────
 
 async def zmq_listener() -> None:
-    """Фонова задача: ZeroMQ SUB → current_values → SSE клієнти."""
+    """Фонова задача: ZeroMQ SUB → history + broadcaster → SSE клієнти."""
     zmq_addr = os.getenv("ZMQ_COLLECTOR_PUB", "tcp://127.0.0.1:5555")
     ctx = zmq.asyncio.Context.instance()
     sock = ctx.socket(zmq.SUB)
     sock.connect(zmq_addr)
-    sock.setsockopt(zmq.SUBSCRIBE, b"data")
-    print(f"[portal] ZeroMQ SUB підключено до {zmq_addr}")
+    sock.setsockopt(zmq.SUBSCRIBE, TOPIC_BINARY if ZMQ_BINARY else TOPIC_JSON)
+    print(f"[portal] ZeroMQ SUB підключено до {zmq_addr}"
+          f"{' (бінарний формат)' if ZMQ_BINARY else ''}")
 
     while True:
         try:
             parts = await sock.recv_multipart()
-            payload = json.loads(parts[1])
-            for r in payload["readings"]:
-                current_values[r["channel_id"]] = {
-                    "value": r["value"],
-                    "time": payload["cycle_time"],
-                }
-            snapshot = _build_snapshot()
-            for q in sse_clients:
-                await q.put(snapshot)
+            if parts[0] == TOPIC_BINARY:
+                cycle_time_ns, ids, values = decode_frame(parts[1])
+                cycle_time, t = ns_to_iso(cycle_time_ns), cycle_time_ns / 1e9
+                readings = list(iter_readings(ids, values))
+            else:
+                payload = json.loads(parts[1])
+                cycle_time = payload["cycle_time"]
+                t = datetime.fromisoformat(cycle_time.replace("Z", "+00:00")).timestamp()
+                readings = [(r["channel_id"], r["value"]) for r in payload["readings"]]
+            history.append(t, readings)
+            broadcaster.update(cycle_time, readings)
         except Exception as e:
             print(f"[portal] ZeroMQ помилка: {e}")
             await asyncio.sleep(1)
@@ -108,9 +153,11 @@ async def zmq_listener() -> None:
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    load_channel_meta()
-    asyncio.create_task(zmq_listener())
+    tasks = [asyncio.create_task(listen_config()), asyncio.create_task(zmq_listener())]
     yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.to_thread(database.close)
 
 
 app = FastAPI(lifespan=lifespan)
@@ -138,17 +185,7 @@ class ChannelUpdate(BaseModel):
 @app.get("/api/channels")
 async def get_channels():
     try:
-        conn = psycopg2.connect(_dsn())
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT channel_id, module, channel_index, signal_type, name, unit, "
-            "raw_min, raw_max, phys_min, phys_max, enabled "
-            "FROM channel_config ORDER BY channel_id"
-        )
-        cols = [d[0] for d in cur.description]
-        rows = [dict(zip(cols, row)) for row in cur.fetchall()]
-        conn.close()
-        return rows
+        return await database.run(db.fetch_channels)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -160,27 +197,41 @@ async def update_channel(channel_id: int, update: ChannelUpdate):
     if update.raw_max == update.raw_min:
         raise HTTPException(status_code=422, detail="raw_max не може дорівнювати raw_min")
     try:
-        conn = psycopg2.connect(_dsn())
-        cur = conn.cursor()
-        cur.execute(
-            "UPDATE channel_config SET name=%s, unit=%s, raw_min=%s, raw_max=%s, "
-            "phys_min=%s, phys_max=%s, enabled=%s WHERE channel_id=%s",
-            (update.name, update.unit, update.raw_min, update.raw_max,
-             update.phys_min, update.phys_max, update.enabled, channel_id)
-        )
-        conn.commit()
-        conn.close()
-        channel_meta[channel_id] = {"name": update.name, "unit": update.unit or ""}
-        return {"ok": True}
+        found = await database.run(db.update_channel, channel_id,
+                                   update.model_dump(exclude={"pin"}))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if not found:
+        raise HTTPException(status_code=404, detail=f"Канал {channel_id} не знайдено")
+    # Одразу, не чекаючи config_changed (той самий результат прийде й через LISTEN)
+    if update.enabled:
+        _apply_meta([(channel_id, update.name, update.unit)], [channel_id])
+    else:
+        _apply_meta([], [channel_id])
+    return {"ok": True}
+
+
+@app.get("/api/history")
+async def get_history(
+    channel_id: list[int] = Query(...),
+    minutes: float = Query(60, gt=0, le=24 * 60),
+    points: int = Query(600, ge=1, le=5000),
+):
+    """
+    Тренд з пам'яті Portal (portal/history.py): останні minutes хвилин,
+    стиснуті до ≤ points кошиків {t (epoch мс), avg, min, max} на канал.
+    Глибина обмежена PORTAL_HISTORY_POINTS семплами на канал.
+    """
+    return history.query(channel_id, minutes * 60, points)
 
 
 @app.get("/stream")
 async def stream(request: Request):
-    """SSE endpoint — пуш поточних значень у браузер."""
-    q: asyncio.Queue = asyncio.Queue()
-    sse_clients.append(q)
+    """
+    SSE endpoint — пуш поточних значень у браузер (portal/fanout.py):
+    перший кадр full, далі delta; повільний клієнт пропускає цикли, а не накопичує їх.
+    """
+    client = broadcaster.subscribe()
 
     async def generator():
         try:
@@ -188,11 +239,14 @@ async def stream(request: Request):
                 if await request.is_disconnected():
                     break
                 try:
-                    data = await asyncio.wait_for(q.get(), timeout=5.0)
-                    yield f"data: {data}\n\n"
+                    await asyncio.wait_for(client.event.wait(), timeout=5.0)
                 except asyncio.TimeoutError:
                     yield ": heartbeat\n\n"
+                    continue
+                frame = broadcaster.frame_for(client)
+                if frame is not None:
+                    yield f"data: {frame}\n\n"
         finally:
-            sse_clients.remove(q)
+            broadcaster.unsubscribe(client)
 
     return StreamingResponse(generator(), media_type="text/event-stream")
@@ -5,6 +5,7 @@ Dev runner — запускає всі сервіси auto_telemetry в одно
     python run_dev.py                  # все
     python run_dev.py --no-sims        # без симуляторів
     python run_dev.py --no-collector   # без колектора
+    python run_dev.py --monitor        # + Monitor (тривоги, ZeroMQ :5556)
     python run_dev.py --no-api         # без API
     python run_dev.py --outbound       # + Outbound API :8001 (для Fleet Server)
 """
@@ -19,6 +20,7 @@ from pathlib import Path
 ROOT = Path(__file__).parent
 SIM_DIR = ROOT / "simulators"
 COLLECTOR_DIR = ROOT / "collector"
+MONITOR_DIR = ROOT / "monitor"
 API_DIR = ROOT / "api"
 
 # ANSI кольори для диференціації процесів
@@ -27,6 +29,7 @@ _C = {
     "sim2":      "\033[96m",    # bright cyan
     "sim3":      "\033[35m",    # magenta
     "collector": "\033[33m",    # yellow
+    "monitor":   "\033[91m",    # bright red
     "api":       "\033[32m",    # green
     "outbound":  "\033[34m",    # blue
 }
@@ -76,6 +79,7 @@ def main() -> None:
     parser = argparse.ArgumentParser(description="Dev runner для auto_telemetry")
     parser.add_argument("--no-sims",      action="store_true", help="Не запускати симулятори")
     parser.add_argument("--no-collector", action="store_true", help="Не запускати колектор")
+    parser.add_argument("--monitor",      action="store_true", help="Запустити Monitor (тривоги)")
     parser.add_argument("--api",          action="store_true", help="Запустити API (uvicorn)")
     parser.add_argument("--api-port",     type=int, default=8100, help="Порт API (default: 8100)")
     parser.add_argument("--outbound",     action="store_true", help="Запустити Outbound API :8001 (для Fleet Server)")
@@ -112,6 +116,14 @@ def main() -> None:
         time.sleep(0.5)
         _log("Колектор запущено")
 
+    # ── Monitor (правила тривог) ──────────────────────────────────────────────
+    if opts.monitor:
+        procs.append(("monitor", _start(
+            [py, "main.py"],
+            "monitor", MONITOR_DIR,
+        )))
+        _log("Monitor: тривоги → ZeroMQ :5556")
+
     # ── API (uvicorn) ─────────────────────────────────────────────────────────
     if opts.api:
         procs.append(("api", _start(
@@ -3,15 +3,23 @@ conftest.py — спільне налаштування для pytest.
 
 Виконується ПЕРЕД імпортом тестових файлів:
 - виставляє env-змінні до того як outbound.main їх зчитає
+- додає collector/ і monitor/ у sys.path (модулі імпортуються як скрипти)
 - надає спільні fixtures
 """
 
 import os
+import sys
+from pathlib import Path
 
 # Встановити до імпорту outbound.main (load_dotenv не перезапише вже встановлені)
 os.environ['OUTBOUND_API_KEY'] = 'test-key'
 os.environ['VEHICLE_ID_HINT'] = 'test-vehicle'
 
+# collector/main.py робить те саме: python collector/main.py
+sys.path.insert(0, str(Path(__file__).parent.parent / 'collector'))
+# monitor/ — у кінець: його main.py не повинен затіняти collector/main.py
+sys.path.append(str(Path(__file__).parent.parent / 'monitor'))
+
 import pytest
 
 
@@ -0,0 +1,127 @@
+"""
+Тести API експорту (api/main.py, api/export.py).
+
+Запуск з кореня auto_telemetry/:
+    pytest tests/test_api.py -v
+
+Не потребує живої БД — psycopg2 мокується, COPY імітується записом у pipe.
+"""
+
+import gzip
+import io
+import threading
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+from starlette.testclient import TestClient
+
+from api import export
+from api.main import app
+
+_CHANNELS = [(1, 'Тиск'), (2, 'Темп')]
+_URL = '/export?from=2026-02-22T22:00:00Z&to=2026-02-23T02:00:00Z'
+
+
+@pytest.fixture(scope='module')
+def client():
+    return TestClient(app, raise_server_exceptions=True)
+
+
+def _mock_conn(copy_chunks):
+    """copy_chunks — байти, які «повертає» кожен COPY (по черзі)."""
+    cur = MagicMock()
+    cur.__enter__ = MagicMock(return_value=cur)
+    cur.__exit__ = MagicMock(return_value=False)
+    cur.fetchall.return_value = _CHANNELS
+    cur.mogrify.side_effect = lambda q, params: q.encode()
+    chunks = iter(copy_chunks)
+    cur.copy_expert.side_effect = lambda statement, out: out.write(next(chunks))
+    conn = MagicMock()
+    conn.cursor.return_value = cur
+    return conn, cur
+
+
+class TestExportHelpers:
+
+    def test_day_windows_split_at_utc_midnight(self):
+        utc = timezone.utc
+        windows = export.day_windows(datetime(2026, 2, 22, 22, tzinfo=utc),
+                                     datetime(2026, 2, 24, 1, tzinfo=utc))
+        assert [(lo.day, lo.hour, hi.day, hi.hour) for lo, hi in windows] == \
+            [(22, 22, 23, 0), (23, 0, 24, 0), (24, 0, 24, 1)]
+
+    def test_copy_per_day_with_single_header(self):
+        cur = MagicMock()
+        cur.mogrify.side_effect = lambda q, params: q.encode()
+        utc = timezone.utc
+        out = export.copy_statements(cur, 'long', _CHANNELS, datetime(2026, 2, 22, 22, tzinfo=utc),
+                                     datetime(2026, 2, 23, 2, tzinfo=utc))
+        assert len(out) == 2
+        assert out[0].endswith('(FORMAT csv, HEADER)') and out[1].endswith('(FORMAT csv)')
+        assert 'measurements_all' in out[0] and 'ORDER BY m.time, m.channel_id' in out[0]
+
+    def test_wide_pivot_column_per_channel(self):
+        cur = MagicMock()
+        cur.mogrify.side_effect = lambda q, params: q.encode()
+        utc = timezone.utc
+        with patch('api.export.sql.Identifier') as ident:
+            ident.side_effect = lambda name: MagicMock(as_string=lambda c: f'"{name}"')
+            (stmt,) = export.copy_statements(cur, 'wide', _CHANNELS,
+                                             datetime(2026, 2, 22, tzinfo=utc),
+                                             datetime(2026, 2, 22, 1, tzinfo=utc))
+        assert 'FILTER (WHERE m.channel_id = 2) AS "2_Темп"' in stmt
+        assert 'GROUP BY m.time' in stmt
+
+    def test_reader_closing_early_stops_copy(self):
+        conn = MagicMock()
+        cur = conn.cursor.return_value.__enter__.return_value
+        stop = threading.Event()
+
+        def endless(statement, out):
+            while not stop.is_set():
+                out.write(b'x' * 65536)
+
+        cur.copy_expert.side_effect = endless
+        with export.copy_pipe(conn, ['COPY']) as src:
+            assert src.read(10) == b'x' * 10
+        stop.set()
+
+
+class TestExportEndpoint:
+
+    def test_csv_streams_all_copies(self, client):
+        conn, cur = _mock_conn([b'time,channel_id,value\na,1,1.5\n', b'b,2,\n'])
+        with patch('api.main.psycopg2.connect', return_value=conn):
+            r = client.get(_URL)
+        assert r.status_code == 200
+        assert r.text == 'time,channel_id,value\na,1,1.5\nb,2,\n'
+        assert 'measurements_long_20260222T220000' in r.headers['content-disposition']
+        assert cur.copy_expert.call_count == 2
+        conn.close.assert_called()
+
+    def test_gzip(self, client):
+        conn, _ = _mock_conn([b'time,channel_id,value\n', b'b,2,\n'])
+        with patch('api.main.psycopg2.connect', return_value=conn):
+            r = client.get(_URL + '&format=csv.gz')
+        assert r.headers['content-type'] == 'application/gzip'
+        assert gzip.decompress(r.content) == b'time,channel_id,value\nb,2,\n'
+
+    def test_parquet(self, client):
+        pq = pytest.importorskip('pyarrow.parquet')
+        conn, _ = _mock_conn([b'1771797600000000,1,1.5\n', b'1771804800000000,2,\n'])
+        with patch('api.main.psycopg2.connect', return_value=conn):
+            r = client.get(_URL + '&format=parquet')
+        rows = pq.read_table(io.BytesIO(r.content)).to_pylist()
+        assert [(row['time'].hour, row['channel_id'], row['value']) for row in rows] == \
+            [(22, 1, 1.5), (0, 2, None)]
+
+    def test_invalid_params(self, client):
+        assert client.get('/export?from=2026-02-23T00:00:00Z&to=2026-02-22T00:00:00Z') \
+            .status_code == 400
+        assert client.get(_URL + '&layout=tall').status_code == 400
+        assert client.get(_URL + '&format=xlsx').status_code == 400
+
+    def test_db_unavailable_returns_503(self, client):
+        with patch('api.main.psycopg2.connect', side_effect=Exception('no db')):
+            assert client.get(_URL).status_code == 503
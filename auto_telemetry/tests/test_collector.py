@@ -0,0 +1,547 @@
+"""
+Тести чистої логіки колектора (collector/*.py).
+
+Запуск з кореня auto_telemetry/:
+    pytest tests/test_collector.py -v
+
+Не потребує Modbus, БД чи ZeroMQ (з'єднання з БД — mock).
+"""
+
+import math
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import modbus_reader
+from channel_plan import ChannelPlan
+from config_snapshot import load_snapshot, save_snapshot
+from db import ChannelConfig, PartitionMaintainer, WideWriter
+from frames import datetime_to_ns, decode_frame, encode_frame, iter_readings, ns_to_iso
+from metrics import Histogram, Metrics
+from modbus_reader import MODULE_TYPES, ModuleType, decode_et7017, plan_reads, register_module_type
+from notify_batch import NotifyBatch
+from replay import recorded_regs, run_replay, scale_modules, synthetic_configs, synthetic_regs
+from scheduler import RateScheduler
+from settings import ModuleSpec, parse_modules
+from shm_ring import RingReader, RingWriter
+from storage_policy import StoragePolicy
+
+_TS = datetime(2026, 2, 22, 10, 30, 0, tzinfo=timezone.utc)
+
+
+def _cfg(channel_id=1, module='et7017_1', **kw) -> ChannelConfig:
+    return ChannelConfig(channel_id, module, 0, 'analog_420',
+                         6400, 32000, 0.0, 100.0, **kw)
+
+
+# ── StoragePolicy (deadband) ──────────────────────────────────────────────────
+
+class TestStoragePolicy:
+
+    def test_without_deadband_stores_every_sample(self):
+        p, cfg = StoragePolicy(), _cfg()
+        assert all(p.should_store(cfg, 5.0, t) for t in range(5))
+
+    def test_first_sample_always_stored(self):
+        assert StoragePolicy().should_store(_cfg(deadband_abs=10.0), 1.0, 0.0)
+
+    def test_absolute_deadband(self):
+        p, cfg = StoragePolicy(), _cfg(deadband_abs=0.5)
+        assert p.should_store(cfg, 10.0, 0)
+        assert not p.should_store(cfg, 10.4, 1)
+        assert not p.should_store(cfg, 9.6, 2)
+        assert p.should_store(cfg, 10.6, 3)
+        # порівняння з останнім ЗБЕРЕЖЕНИМ, а не з останнім семплом
+        assert not p.should_store(cfg, 10.2, 4)
+
+    def test_relative_deadband(self):
+        p, cfg = StoragePolicy(), _cfg(deadband_rel=0.01)
+        assert p.should_store(cfg, 200.0, 0)
+        assert not p.should_store(cfg, 201.5, 1)
+        assert p.should_store(cfg, 202.5, 2)
+
+    def test_heartbeat_forces_store(self):
+        p, cfg = StoragePolicy(), _cfg(deadband_abs=1.0, heartbeat_sec=60)
+        assert p.should_store(cfg, 50.0, 0)
+        assert not p.should_store(cfg, 50.0, 59)
+        assert p.should_store(cfg, 50.0, 60)
+        assert not p.should_store(cfg, 50.0, 61)
+
+    def test_null_transitions_stored_once(self):
+        p, cfg = StoragePolicy(), _cfg(deadband_abs=1.0)
+        assert p.should_store(cfg, 50.0, 0)
+        assert p.should_store(cfg, None, 1)
+        assert not p.should_store(cfg, None, 2)
+        assert p.should_store(cfg, 50.0, 3)
+
+    def test_channels_tracked_independently(self):
+        p = StoragePolicy()
+        a, b = _cfg(1, deadband_abs=1.0), _cfg(2, deadband_abs=1.0)
+        assert p.should_store(a, 1.0, 0)
+        assert p.should_store(b, 1.0, 0)
+        assert not p.should_store(a, 1.5, 1)
+
+    def test_store_period_decimates_fast_channel(self):
+        p, cfg = StoragePolicy(), _cfg(store_period_sec=1.0)
+        ticks = [i * 0.1 for i in range(30)]                    # опитування 10 Гц
+        stored = [t for t in ticks if p.should_store(cfg, t, t)]
+        assert len(stored) == 3
+        assert stored[0] == 0.0
+
+    def test_store_period_applies_before_deadband(self):
+        p, cfg = StoragePolicy(), _cfg(store_period_sec=1.0, deadband_abs=0.1)
+        assert p.should_store(cfg, 1.0, 0.0)
+        assert not p.should_store(cfg, 50.0, 0.5)              # зміна, але період не минув
+        assert p.should_store(cfg, 50.0, 1.0)
+        assert not p.should_store(cfg, 50.0, 2.0)              # період минув, але без змін
+
+    def test_forget_forces_next_store_for_channel(self):
+        p = StoragePolicy()
+        a, b = _cfg(1, deadband_abs=1.0), _cfg(2, deadband_abs=1.0)
+        p.should_store(a, 1.0, 0)
+        p.should_store(b, 1.0, 0)
+        p.forget(1)
+        assert p.should_store(a, 1.0, 1)
+        assert not p.should_store(b, 1.0, 1)
+
+    def test_reset_forces_next_store(self):
+        p, cfg = StoragePolicy(), _cfg(deadband_abs=1.0)
+        p.should_store(cfg, 1.0, 0)
+        p.reset()
+        assert p.should_store(cfg, 1.0, 1)
+
+
+# ── Бінарний пакет шини даних (frames) ───────────────────────────────────────
+
+class TestFrames:
+
+    _READINGS = [
+        {'channel_id': 1, 'value': 4.72},
+        {'channel_id': 2, 'value': None},
+        {'channel_id': 18, 'value': -0.5},
+    ]
+
+    def test_roundtrip(self):
+        ns = 1_771_756_200_123_000_000
+        cycle_time_ns, ids, values = decode_frame(encode_frame(ns, self._READINGS))
+        assert cycle_time_ns == ns
+        assert list(iter_readings(ids, values)) == [(1, 4.72), (2, None), (18, -0.5)]
+
+    def test_layout_size(self):
+        assert len(encode_frame(0, self._READINGS)) == 16 + 3 * 8 + 3 * 2
+
+    def test_empty_frame(self):
+        _, ids, values = decode_frame(encode_frame(0, []))
+        assert len(ids) == len(values) == 0
+
+    def test_bad_magic_rejected(self):
+        with pytest.raises(ValueError):
+            decode_frame(b'XX' + encode_frame(0, self._READINGS)[2:])
+
+    def test_truncated_rejected(self):
+        with pytest.raises(ValueError):
+            decode_frame(encode_frame(0, self._READINGS)[:-1])
+
+    def test_time_conversion_matches_json_format(self):
+        dt = datetime(2026, 2, 22, 10, 30, 0, 123456, tzinfo=timezone.utc)
+        assert ns_to_iso(datetime_to_ns(dt)) == '2026-02-22T10:30:00.123Z'
+
+
+# ── Кільце циклів у mmap (shm_ring) ──────────────────────────────────────────
+
+class TestShmRing:
+
+    _READINGS = [
+        {'channel_id': 1, 'value': 4.72},
+        {'channel_id': 2, 'value': None},
+        {'channel_id': 18, 'value': -0.5},
+    ]
+
+    def test_roundtrip_with_stored_flags(self, tmp_path):
+        w = RingWriter(tmp_path / 'r.ring', slots=4, max_channels=8)
+        w.write(1000, self._READINGS, stored_ids=[2])
+        c = RingReader(tmp_path / 'r.ring').latest()
+        assert c.cycle_time_ns == 1000
+        assert list(iter_readings(c.ids, c.values)) == [(1, 4.72), (2, None), (18, -0.5)]
+        assert list(c.stored) == [0, 1, 0]
+
+    def test_keeps_last_slots_cycles(self, tmp_path):
+        w = RingWriter(tmp_path / 'r.ring', slots=4, max_channels=8)
+        r = RingReader(tmp_path / 'r.ring')
+        for t in range(10):
+            w.write(t, self._READINGS)
+        assert [c.cycle_time_ns for c in r.cycles()] == [6, 7, 8, 9]
+        assert [c.cycle_time_ns for c in r.cycles(since_ns=8)] == [8, 9]
+
+    def test_window_only_when_covered(self, tmp_path):
+        w = RingWriter(tmp_path / 'r.ring', slots=4, max_channels=8)
+        r = RingReader(tmp_path / 'r.ring')
+        for t in range(10, 20):
+            w.write(t, self._READINGS)
+        assert [c.cycle_time_ns for c in r.window(18)] == [18, 19]
+        # Цикл 15 уже витіснено — кільце не знає, що було до 16
+        assert r.window(16) is None
+
+    def test_slot_being_overwritten_is_skipped(self, tmp_path):
+        w = RingWriter(tmp_path / 'r.ring', slots=4, max_channels=8)
+        for t in range(4):
+            w.write(t, self._READINGS)
+        r = RingReader(tmp_path / 'r.ring')
+        # Писач почав цикл 4 у слоті циклу 0 (seq непарний), written ще не оновлено
+        w._mm[64:72] = (2 * 4 + 1).to_bytes(8, 'little')
+        assert [c.cycle_time_ns for c in r.cycles()] == [1, 2, 3]
+        assert r.window(0) is None and r.window(1) is None
+        assert [c.cycle_time_ns for c in r.window(2)] == [2, 3]
+
+    def test_reader_follows_restarted_writer(self, tmp_path):
+        path = tmp_path / 'r.ring'
+        RingWriter(path, slots=4, max_channels=8).write(1, self._READINGS)
+        r = RingReader(path)
+        assert r.latest().cycle_time_ns == 1
+        RingWriter(path, slots=8, max_channels=4).write(2, self._READINGS[:2])
+        assert r.latest().cycle_time_ns == 2 and r.slots == 8
+
+    def test_latest_values_incremental(self, tmp_path):
+        path = tmp_path / 'r.ring'
+        w = RingWriter(path, slots=4, max_channels=8)
+        r = RingReader(path)
+        w.write(1, self._READINGS)
+        w.write(2, [{'channel_id': 1, 'value': 5.0}])     # модуль каналу 1 — частіше
+        latest = r.latest_values()
+        assert latest[1] == (2, 5.0) and latest[18] == (1, -0.5)
+        assert latest[2][0] == 1 and math.isnan(latest[2][1])
+        w.write(3, [{'channel_id': 18, 'value': 0.25}])
+        assert r.latest_values()[18] == (3, 0.25)
+        # Цикл 1 витіснено — канал 2 більше ніде в кільці
+        for t in range(4, 6):
+            w.write(t, [{'channel_id': 1, 'value': float(t)}])
+        assert r.latest_values() == {1: (5, 5.0), 18: (3, 0.25)}
+        RingWriter(path, slots=4, max_channels=8).write(9, self._READINGS[:1])
+        assert r.latest_values() == {1: (9, 4.72)}
+
+    def test_too_many_readings_rejected(self, tmp_path):
+        w = RingWriter(tmp_path / 'r.ring', slots=2, max_channels=2)
+        with pytest.raises(ValueError):
+            w.write(0, self._READINGS)
+
+
+# ── RateScheduler (багатошвидкісне опитування) ───────────────────────────────
+
+class TestRateScheduler:
+
+    def test_all_modules_due_at_start(self):
+        sched = RateScheduler({'fast': 0.1, 'slow': 1.0}, now=0.0)
+        names, lag = sched.due(0.0)
+        assert sorted(names) == ['fast', 'slow']
+        assert lag == 0.0
+
+    def test_modules_polled_at_own_rates(self):
+        sched = RateScheduler({'fast': 0.1, 'slow': 1.0}, now=0.0)
+        counts = {'fast': 0, 'slow': 0}
+        while sched.next_deadline() < 2.0 - 1e-6:
+            for name in sched.due(sched.next_deadline())[0]:
+                counts[name] += 1
+        assert counts == {'fast': 20, 'slow': 2}
+
+    def test_next_deadline_is_earliest(self):
+        sched = RateScheduler({'fast': 0.1, 'slow': 1.0}, now=0.0)
+        sched.due(0.0)
+        assert sched.next_deadline() == pytest.approx(0.1)
+
+    def test_overrun_skips_missed_ticks(self):
+        sched = RateScheduler({'m': 0.1}, now=0.0)
+        sched.due(0.0)
+        names, lag = sched.due(0.55)
+        assert names == ['m']
+        assert lag == pytest.approx(0.45)
+        assert sched.next_deadline() == pytest.approx(0.65)
+
+
+# ── Реєстр модулів і злиття FC04 запитів ─────────────────────────────────────
+
+def _mod(name, type_='et7017', ip='10.0.0.1', unit_id=1, poll_hz=1.0):
+    return ModuleSpec(name, type_, ip, 502, unit_id, poll_hz)
+
+
+class TestModuleRegistry:
+
+    def test_default_modules_match_legacy_config(self):
+        cfg = {'MODBUS_ET7017_2_IP': '10.0.0.2', 'MODBUS_ET7284_POLL_HZ': '10'}
+        mods = parse_modules(lambda k, d='': cfg.get(k, d), '1.0')
+        assert [(m.name, m.type, m.port) for m in mods] == [
+            ('et7017_1', 'et7017', 5020), ('et7017_2', 'et7017', 5021), ('et7284', 'et7284', 5022)]
+        assert mods[1].ip == '10.0.0.2'
+        assert mods[2].poll_hz == 10.0
+
+    def test_extra_module_from_config(self):
+        cfg = {'MODBUS_MODULES': 'et7017_1, ai_rack', 'MODBUS_AI_RACK_TYPE': 'et7017',
+               'MODBUS_AI_RACK_UNIT_ID': '7'}
+        mods = parse_modules(lambda k, d='': cfg.get(k, d), '2.0')
+        assert [m.name for m in mods] == ['et7017_1', 'ai_rack']
+        assert mods[1].type == 'et7017' and mods[1].unit_id == 7 and mods[1].poll_hz == 2.0
+
+    def test_separate_hosts_not_merged(self):
+        blocks = plan_reads([_mod('a', ip='10.0.0.1'), _mod('b', ip='10.0.0.2')])
+        assert len(blocks) == 2
+
+    def test_adjacent_ranges_merged(self, monkeypatch):
+        monkeypatch.setitem(MODULE_TYPES, 'upper', ModuleType(8, 8, decode_et7017))
+        blocks = plan_reads([_mod('lo'), _mod('hi', type_='upper')])
+        assert len(blocks) == 1
+        b = blocks[0]
+        assert (b.address, b.count) == (0, 16)
+        regs = b.split(list(range(16)))
+        assert regs == {'lo': list(range(8)), 'hi': list(range(8, 16))}
+
+    def test_gap_respected(self):
+        mods = [_mod('ai'), _mod('cnt', type_='et7284')]      # 0..7 та 16..31
+        assert len(plan_reads(mods, gap=0)) == 2
+        merged = plan_reads(mods, gap=8)
+        assert len(merged) == 1
+        assert (merged[0].address, merged[0].count) == (0, 32)
+        assert merged[0].split(list(range(32)))['cnt'] == list(range(16, 32))
+
+    def test_different_unit_or_rate_not_merged(self):
+        assert len(plan_reads([_mod('a'), _mod('b', unit_id=2)], gap=100)) == 2
+        assert len(plan_reads([_mod('a'), _mod('b', poll_hz=10)], gap=100)) == 2
+
+    def test_failed_read_yields_none_for_all_members(self):
+        block = plan_reads([_mod('ai'), _mod('cnt', type_='et7284')], gap=8)[0]
+        assert block.split(None) == {'ai': None, 'cnt': None}
+
+    def test_register_module_type(self, monkeypatch):
+        monkeypatch.setattr(modbus_reader, 'MODULE_TYPES', dict(MODULE_TYPES))
+        register_module_type('dio', 32, 1, lambda regs, i: None if regs is None else (regs[0] >> i) & 1)
+        assert modbus_reader.MODULE_TYPES['dio'].decode([0b100], 2) == 1
+
+
+# ── Інкрементальне оновлення конфігу ─────────────────────────────────────────
+
+class TestNotifyBatch:
+
+    def test_empty_batch_has_no_deadline(self):
+        assert NotifyBatch(0.3, 2.0).deadline() is None
+
+    def test_burst_coalesced_with_debounce(self):
+        b = NotifyBatch(0.3, 2.0)
+        for i, t in enumerate([0.0, 0.1, 0.2]):
+            b.add(str(i + 1), t)
+        assert b.deadline() == pytest.approx(0.5)
+        assert b.take() == ({1, 2, 3}, False)
+        assert b.deadline() is None
+
+    def test_max_delay_caps_long_burst(self):
+        b = NotifyBatch(0.3, 2.0)
+        for i in range(30):
+            b.add('5', i * 0.1)
+        assert b.deadline() == pytest.approx(2.0)
+
+    def test_non_numeric_payload_requests_full_reload(self):
+        b = NotifyBatch(0.3, 2.0)
+        b.add('all', 0.0)
+        assert b.take() == (set(), True)
+
+
+class TestChannelPlan:
+
+    def test_grouped_by_module(self):
+        plan = ChannelPlan([_cfg(1), _cfg(17, module='et7284'), _cfg(2)])
+        assert [c.channel_id for c in plan.for_modules(['et7017_1'])] == [1, 2]
+        assert [c.channel_id for c in plan.for_modules(['et7284', 'missing'])] == [17]
+
+    def test_incremental_update_and_removal(self):
+        plan = ChannelPlan([_cfg(1), _cfg(2)])
+        diff = plan.apply({1: _cfg(1, deadband_abs=0.5), 2: None, 3: _cfg(3, module='et7284')})
+        assert sorted(diff) == [1, 2, 3]
+        assert [c.channel_id for c in plan.for_modules(['et7017_1'])] == [1]
+        assert plan.for_modules(['et7017_1'])[0].deadband_abs == 0.5
+        assert plan.modules() == {'et7017_1', 'et7284'}
+
+    def test_unchanged_rows_not_reported(self):
+        plan = ChannelPlan([_cfg(1), _cfg(2)])
+        assert plan.apply({1: _cfg(1), 2: _cfg(2, deadband_abs=1.0)}) == [2]
+
+    def test_module_move(self):
+        plan = ChannelPlan([_cfg(1)])
+        plan.apply({1: _cfg(1, module='et7017_2')})
+        assert plan.for_modules(['et7017_1']) == []
+        assert plan.modules() == {'et7017_2'}
+
+    def test_full_reload_drops_missing(self):
+        plan = ChannelPlan([_cfg(1), _cfg(2)])
+        assert plan.apply({2: _cfg(2)}, full=True) == [1]
+        assert len(plan) == 1
+
+    def test_channel_ids_follow_changes(self):
+        plan = ChannelPlan([_cfg(3), _cfg(1)])
+        assert plan.channel_ids() == (1, 3)
+        plan.apply({2: _cfg(2), 3: None})
+        assert plan.channel_ids() == (1, 2)
+
+
+# ── Знімок конфігу для холодного старту ──────────────────────────────────────
+
+class TestConfigSnapshot:
+
+    def test_roundtrip(self, tmp_path):
+        path = tmp_path / 'data' / 'channel_config.json'
+        configs = [_cfg(1, deadband_abs=0.5), _cfg(17, module='et7284', heartbeat_sec=60.0)]
+        save_snapshot(path, configs)
+        assert load_snapshot(path) == configs
+        assert not path.with_suffix('.json.tmp').exists()
+
+    def test_missing_file_returns_none(self, tmp_path):
+        assert load_snapshot(tmp_path / 'none.json') is None
+
+    def test_corrupt_file_returns_none(self, tmp_path):
+        path = tmp_path / 'bad.json'
+        path.write_text('{"channels": [', encoding='utf-8')
+        assert load_snapshot(path) is None
+
+    def test_unknown_fields_ignored(self, tmp_path):
+        path = tmp_path / 'old.json'
+        save_snapshot(path, [_cfg(1)])
+        text = path.read_text(encoding='utf-8').replace('"channel_id": 1', '"channel_id": 1, "legacy": 0')
+        path.write_text(text, encoding='utf-8')
+        assert load_snapshot(path) == [_cfg(1)]
+
+
+# ── Runtime-метрики ──────────────────────────────────────────────────────────
+
+class TestMetrics:
+
+    def test_histogram_quantiles_are_bucket_bounds(self):
+        h = Histogram()
+        for _ in range(90):
+            h.observe(0.0008)     # кошик ≤ 1 мс
+        for _ in range(10):
+            h.observe(0.04)       # кошик ≤ 50 мс
+        assert h.quantile(0.5) == pytest.approx(0.001)
+        assert h.quantile(0.95) == pytest.approx(0.04)   # обмежено max
+        assert h.summary()['count'] == 100
+
+    def test_histogram_above_last_bound_reports_max(self):
+        h = Histogram()
+        h.observe(42.0)
+        assert h.quantile(0.99) == 42.0
+
+    def test_empty_summary(self):
+        assert Histogram().summary()['mean_ms'] is None
+
+    def test_snapshot_summary(self):
+        m = Metrics()
+        m.observe('cycle', 0.01)
+        m.observe('modbus', 0.005)
+        m.observe('modbus_rtt.et7017_1', 0.004)
+        m.inc('modbus_errors.et7017_1')
+        m.inc('modbus_errors.et7284', 2)
+        m.inc('db_errors')
+        summary = m.snapshot()['summary']
+        assert summary['cycles'] == 1
+        assert summary['modbus_errors'] == 3
+        assert summary['db_errors'] == 1
+        assert summary['late_ticks'] == 0
+        assert set(summary['stage_p95_ms']) == {'modbus'}
+
+
+# ── Replay-бенчмарк ──────────────────────────────────────────────────────────
+
+class TestReplay:
+
+    _MODULES = [ModuleSpec('et7017_1', 'et7017', 'localhost', 5020, 1, 1.0),
+                ModuleSpec('et7284', 'et7284', 'localhost', 5022, 1, 1.0)]
+
+    def test_synthetic_regs_decode_to_expected_ranges(self):
+        src = synthetic_regs(self._MODULES, seed=1)
+        first, second = next(src), next(src)
+        assert all(0 <= r <= 0xFFFF for regs in first.values() for r in regs)
+        assert decode_et7017(first['et7017_1'], 7) < 6400       # канал біля нуля
+        # лічильник ET-7284 росте (mod 2^32)
+        a = modbus_reader.decode_et7284(first['et7284'], 0)
+        b = modbus_reader.decode_et7284(second['et7284'], 0)
+        assert (b - a) % 2 ** 32 < 5000
+
+    def test_run_replay_report(self):
+        modules = scale_modules(self._MODULES, 2)
+        configs = synthetic_configs(modules)
+        decoders = {m.name: MODULE_TYPES[m.type].decode for m in modules}
+        report = run_replay(configs, decoders, synthetic_regs(modules), cycles=50)
+        assert report['channels'] == 32
+        assert report['readings'] == report['rows_stored'] == 50 * 32
+        assert set(report['stages']) == {'normalize', 'cycle'}   # без БД і ZeroMQ
+        assert report['cycles_per_sec'] > 0
+
+    def test_deadband_reduces_stored_rows(self):
+        configs = synthetic_configs(self._MODULES[:1], deadband=50.0)
+        decoders = {'et7017_1': decode_et7017}
+        report = run_replay(configs, decoders, synthetic_regs(self._MODULES[:1]), cycles=100)
+        assert report['rows_stored'] < report['readings']
+
+    def test_recorded_regs_loop(self, tmp_path):
+        path = tmp_path / 'regs.jsonl'
+        path.write_text('{"regs": {"et7017_1": [1]}}\n{"regs": {"et7017_1": null}}\n',
+                        encoding='utf-8')
+        src = recorded_regs(path)
+        assert [next(src)['et7017_1'] for _ in range(3)] == [[1], None, [1]]
+
+
+# ── Партиції measurements ────────────────────────────────────────────────────
+
+class TestPartitionMaintainer:
+
+    def test_creates_and_drops(self):
+        conn = MagicMock()
+        cur = conn.cursor.return_value.__enter__.return_value
+        cur.fetchone.side_effect = [(2,), (1,)]
+        with patch('db.psycopg2.connect', return_value=conn):
+            result = PartitionMaintainer('dsn', 3, 90, 7).run_once()
+        assert result == (2, 1)
+        assert [c.args for c in cur.execute.call_args_list] == [
+            ('SELECT ensure_measurement_partitions(%s)', (3,)),
+            ('SELECT drop_old_measurement_partitions(%s, %s)', (90, 7)),
+        ]
+        conn.commit.assert_called_once()
+        conn.close.assert_called_once()
+
+
+# ── Широкий формат measurements_wide ─────────────────────────────────────────
+
+class TestWideWriter:
+
+    def _conn(self):
+        conn = MagicMock()
+        cur = conn.cursor.return_value.__enter__.return_value
+        cur.fetchone.return_value = (7,)
+        return conn, cur
+
+    def test_row_per_cycle_with_nan_for_not_stored(self):
+        conn, cur = self._conn()
+        WideWriter().insert(conn, _TS, (1, 2, 3), [{'channel_id': 3, 'value': 1.5},
+                                                    {'channel_id': 1, 'value': None}])
+        sql, (ts, layout_id, vals) = cur.execute.call_args.args
+        assert 'measurements_wide' in sql
+        assert (ts, layout_id) == (_TS, 7)
+        assert vals[0] is None and vals[2] == 1.5
+        assert math.isnan(vals[1])
+
+    def test_layout_cached_per_channel_set(self):
+        conn, cur = self._conn()
+        w = WideWriter()
+        for _ in range(3):
+            w.insert(conn, _TS, (1, 2), [{'channel_id': 1, 'value': 0.0}])
+        layout_sql = [c for c in cur.execute.call_args_list if 'measurement_layouts' in c.args[0]]
+        assert len(layout_sql) == 1
+        w.insert(conn, _TS, (1, 2, 5), [{'channel_id': 5, 'value': 0.0}])
+        layout_sql = [c for c in cur.execute.call_args_list if 'measurement_layouts' in c.args[0]]
+        assert len(layout_sql) == 2
+
+    def test_empty_cycle_writes_nothing(self):
+        conn, cur = self._conn()
+        WideWriter().insert(conn, _TS, (1, 2), [])
+        cur.execute.assert_not_called()
+
+    def test_unknown_channel_ignored(self):
+        conn, cur = self._conn()
+        WideWriter().insert(conn, _TS, (1,), [{'channel_id': 9, 'value': 1.0}])
+        assert math.isnan(cur.execute.call_args.args[1][2][0])
@@ -0,0 +1,213 @@
+"""
+Тести логіки Monitor (monitor/rules.py, monitor/vector_rules.py, monitor/alarm_store.py).
+
+Запуск з кореня auto_telemetry/:
+    pytest tests/test_monitor.py -v
+
+Не потребує БД чи ZeroMQ (з'єднання з БД — mock).
+"""
+
+import math
+import random
+import statistics
+from array import array
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+from alarm_store import AlarmLog
+from rules import Rule, RuleEngine, Transition, Window
+from vector_rules import VectorEngine
+
+_TS = datetime(2026, 2, 22, 10, 30, 0, tzinfo=timezone.utc)
+
+
+def _rule(id=1, channel_id=1, rule_type='above', threshold=10.0, gradient=None, window_sec=None):
+    return Rule(id, channel_id, f'R{id}', rule_type, threshold, gradient, window_sec)
+
+
+def _events(transitions):
+    return sorted((t.event, t.rule.id, None if t.value is None else round(t.value, 9))
+                  for t in transitions)
+
+
+class TestWindow:
+
+    def test_std_matches_statistics(self):
+        w = Window(span=5)
+        vals = [1000.1, 1000.4, 999.8, 1000.0, 1000.3, 999.9, 1000.6, 1000.2]
+        for t, v in enumerate(vals):
+            w.add(float(t), v)
+        # Вікно [t-5, t] — останні 6 семплів
+        assert len(w) == 6
+        assert math.isclose(w.std(), statistics.stdev(vals[-6:]), rel_tol=1e-9)
+
+    def test_rate_over_window(self):
+        w = Window(span=10)
+        for t in range(20):
+            w.add(float(t), 2.0 * t)
+        assert w.rate() == 2.0
+
+    def test_single_sample_has_no_stats(self):
+        w = Window(span=10)
+        w.add(0.0, 5.0)
+        assert w.rate() is None and w.std() is None
+
+    def test_time_going_back_resets(self):
+        w = Window(span=10)
+        for t in range(5):
+            w.add(100.0 + t, float(t))
+        w.add(50.0, 7.0)
+        assert len(w) == 1
+
+
+class TestRuleEngine:
+
+    def test_threshold_triggers_once_and_resolves(self):
+        e = RuleEngine([_rule(rule_type='above', threshold=10.0)])
+        assert [t.event for t in e.feed(0, [(1, 11.0)])] == ['triggered']
+        assert e.feed(1, [(1, 12.0)]) == []
+        out = e.feed(2, [(1, 9.0)])
+        assert [(t.event, t.value) for t in out] == [('resolved', 9.0)]
+
+    def test_below_and_other_channels_ignored(self):
+        e = RuleEngine([_rule(rule_type='below', threshold=4.0)])
+        assert e.feed(0, [(2, 0.0)]) == []
+        assert e.feed(1, [(1, 3.0)])[0].rule.alarm_type == 'low_limit'
+
+    def test_null_value_keeps_state(self):
+        e = RuleEngine([_rule()])
+        e.feed(0, [(1, 20.0)])
+        assert e.feed(1, [(1, None)]) == []
+        assert len(e.active()) == 1
+
+    def test_rate_of_change_uses_gradient(self):
+        e = RuleEngine([_rule(rule_type='rate_of_change', threshold=None,
+                              gradient=1.0, window_sec=5)])
+        assert e.feed(0, [(1, 0.0)]) == []
+        out = e.feed(1, [(1, -3.0)])
+        assert out[0].rule.alarm_type == 'rate_of_change' and out[0].value == -3.0
+        # Значення стабілізувалось — швидкість за вікно падає нижче межі
+        events = []
+        for t in range(2, 9):
+            events += e.feed(t, [(1, -3.0)])
+        assert [x.event for x in events] == ['resolved'] and not e.active()
+
+    def test_std_deviation(self):
+        e = RuleEngine([_rule(rule_type='std_deviation', threshold=1.0, window_sec=10)])
+        events = []
+        for t, v in enumerate([5.0, 5.1, 4.9, 5.0, 9.0]):
+            events += e.feed(t, [(1, v)])
+        assert [t.event for t in events] == ['triggered']
+        assert events[0].rule.alarm_type == 'std_deviation'
+
+    def test_rules_share_window(self):
+        e = RuleEngine([_rule(1, rule_type='std_deviation', threshold=1.0, window_sec=10),
+                        _rule(2, rule_type='rate_of_change', threshold=None, gradient=5.0,
+                              window_sec=10)])
+        assert len(e._windows) == 1
+
+    def test_rules_sharing_window_both_fire(self):
+        e = RuleEngine([_rule(1, rule_type='std_deviation', threshold=1.0, window_sec=10),
+                        _rule(2, rule_type='rate_of_change', threshold=None, gradient=1.0,
+                              window_sec=10)])
+        events = []
+        for t, v in enumerate([5.0, 5.0, 5.0, 5.0, 20.0]):
+            events += e.feed(t, [(1, v)])
+        assert sorted((x.event, x.rule.id) for x in events) == \
+            [('triggered', 1), ('triggered', 2)]
+
+    def test_invalid_rules_skipped(self):
+        e = RuleEngine([_rule(1, rule_type='bogus'), _rule(2, threshold=None)])
+        assert len(e) == 0
+
+    def test_reload_keeps_window_and_resolves_removed(self):
+        r = _rule(1, rule_type='std_deviation', threshold=100.0, window_sec=10)
+        e = RuleEngine([r, _rule(2)])
+        for t in range(5):
+            e.feed(t, [(1, float(t % 2))])
+        e.feed(5, [(1, 50.0)])
+        assert [x.id for x in e.active()] == [2]
+        out = e.load([r])
+        assert out == [Transition('resolved', _rule(2), None)]
+        assert len(e._windows[(1, 10)]) == 6
+
+    def test_reload_updates_limit_of_active_alarm(self):
+        e = RuleEngine([_rule(threshold=10.0)])
+        e.feed(0, [(1, 15.0)])
+        e.load([_rule(threshold=20.0)])
+        assert [t.event for t in e.feed(1, [(1, 15.0)])] == ['resolved']
+
+    def test_restore_open_alarms(self):
+        e = RuleEngine([_rule(1)])
+        assert e.restore([1, 99]) == [99]
+        # Відкрита до рестарту тривога не дублюється, а закривається
+        assert e.feed(0, [(1, 20.0)]) == []
+        assert [t.event for t in e.feed(1, [(1, 0.0)])] == ['resolved']
+
+
+class TestAlarmLog:
+
+    def test_batch_insert_and_resolve(self):
+        conn = MagicMock()
+        cur = conn.cursor.return_value.__enter__.return_value
+        log = AlarmLog({3: 400})
+        with patch('alarm_store.psycopg2.extras.execute_values',
+                   return_value=[(1, 501), (2, 502)]) as ev:
+            ids = log.write(conn, _TS, [Transition('triggered', _rule(1), 11.0),
+                                        Transition('triggered', _rule(2), 12.0),
+                                        Transition('resolved', _rule(3), 1.0)])
+        assert ids == {1: 501, 2: 502, 3: 400}
+        assert log.open == {1: 501, 2: 502}
+        # Обидві нові тривоги — одним INSERT, закриття — одним UPDATE
+        ev.assert_called_once()
+        assert len(ev.call_args.args[2]) == 2
+        sql, (at, alarm_ids) = cur.execute.call_args.args
+        assert 'UPDATE alarms_log' in sql and alarm_ids == [400]
+        conn.commit.assert_called_once()
+
+    def test_no_transitions_no_roundtrip(self):
+        conn = MagicMock()
+        AlarmLog().write(conn, _TS, [])
+        conn.cursor.assert_not_called()
+
+
+class TestVectorEngine:
+
+    def test_same_transitions_as_rule_engine(self):
+        rng = random.Random(7)
+        kinds = ('above', 'below', 'rate_of_change', 'std_deviation')
+        rules = [_rule(i, rng.randrange(1, 20), kind, rng.uniform(0.2, 2.0),
+                       rng.uniform(0.1, 2.0), rng.choice([None, 3, 5, 10]))
+                 for i, kind in ((i, rng.choice(kinds)) for i in range(1, 80))]
+        scalar, vector = RuleEngine(rules), VectorEngine(rules, capacity=4)
+        t = 0.0
+        for cycle in range(800):
+            t += rng.choice([0.5, 1.0, 1.0, 7.0])
+            readings = [(cid, None if rng.random() < 0.1 else rng.gauss(1, 1))
+                        for cid in range(1, 25) if rng.random() < 0.9]
+            if cycle == 400:
+                assert _events(scalar.load(rules[::2])) == _events(vector.load(rules[::2]))
+            assert _events(scalar.feed(t, readings)) == _events(vector.feed(t, readings))
+
+    def test_feed_batch_from_frame_arrays(self):
+        e = VectorEngine([_rule(1, channel_id=3, threshold=10.0)])
+        ids = array('H', [1, 3])
+        rows = [array('d', [0.0, 5.0]), array('d', [0.0, 11.0]), array('d', [0.0, math.nan]),
+                array('d', [0.0, 9.0])]
+        out = e.feed_batch([0.0, 1.0, 2.0, 3.0], ids, rows)
+        assert [[t.event for t in c] for c in out] == [[], ['triggered'], [], ['resolved']]
+
+    def test_severity_counts(self):
+        rules = [Rule(1, 1, 'a', 'above', 0.0, None, None, 'critical'),
+                 Rule(2, 1, 'b', 'above', 5.0, None, None, 'warning'),
+                 Rule(3, 2, 'c', 'below', 0.0, None, None, 'warning')]
+        e = VectorEngine(rules)
+        e.feed(0.0, [(1, 1.0), (2, -1.0)])
+        assert e.active_counts() == {'critical': 1, 'warning': 1}
+
+    def test_reload_resolves_removed_rule(self):
+        e = VectorEngine([_rule(1), _rule(2, channel_id=2)])
+        e.feed(0.0, [(1, 20.0), (2, 20.0)])
+        out = e.load([_rule(2, channel_id=2)])
+        assert [(t.event, t.rule.id) for t in out] == [('resolved', 1)]
+        assert [r.id for r in e.active()] == [2]
@@ -4,16 +4,31 @@
 Запуск з кореня auto_telemetry/:
     pytest tests/test_outbound.py -v
 
-Не потребує запущеного сервера і живої БД —
-psycopg2 та _port_listening мокуються через unittest.mock.
+Не потребує запущеного сервера і живої БД — пул asyncpg підміняється
+_FakeDB, psycopg2 фонових проб /status та _port_listening мокуються
+через unittest.mock.
 """
 
-from datetime import datetime, timezone
+import asyncio
+import json
+import time
+import zlib
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from unittest.mock import MagicMock, patch
 
 import pytest
 from starlette.testclient import TestClient
 
+import outbound.main
+from collector.frames import datetime_to_ns, encode_frame
+from collector.shm_ring import RingWriter
+from outbound import blocks as block_codec
+from outbound import compression
+from outbound.blocks import BlockCache
+from outbound.db import DatabaseUnavailable
+from outbound.health import HealthMonitor, parse_cycle_time
+from outbound.lanes import Lane, Overloaded, SingleFlight
 from outbound.main import app
 
 # ── Константи ─────────────────────────────────────────────────────────────────
@@ -33,19 +48,32 @@ def client():
     return TestClient(app, raise_server_exceptions=True)
 
 
-# ── Хелпер: мок psycopg2 connection ──────────────────────────────────────────
+@pytest.fixture(autouse=True)
+def ring_path(tmp_path, monkeypatch):
+    """Кільце циклів — у tmp (за замовчуванням файлу немає → відповіді з БД)."""
+    path = tmp_path / 'cycles.ring'
+    monkeypatch.setattr(outbound.main, '_RING_PATH', path)
+    monkeypatch.setattr(outbound.main, '_ring', None)
+    return path
 
-def _mock_conn(rows=None, one=None):
+
+@pytest.fixture(autouse=True)
+def no_block_cache(monkeypatch):
+    """Кеш блоків /data вимкнено (моки БД не фільтрують рядки за вікном); TestBlocks вмикає."""
+    monkeypatch.setattr(outbound.main, 'blocks', None)
+
+
+# ── Хелпер: мок psycopg2 connection (фонові проби /status) ────────────────────
+
+def _mock_conn(one=None):
     """
-    Повертає мок psycopg2 connection.
+    Повертає мок psycopg2 connection для _probe.
 
-    rows — що повертає cur.fetchall() (для /channels, /data/latest, /data, /alarms)
-    one  — що повертає cur.fetchone() (для /status: кортеж (timestamp,))
+    one — що повертає cur.fetchone() (кортеж (timestamp,) — MAX(time))
     """
     cur = MagicMock()
     cur.__enter__ = MagicMock(return_value=cur)
     cur.__exit__ = MagicMock(return_value=False)
-    cur.fetchall.return_value = rows if rows is not None else []
     cur.fetchone.return_value = one
 
     conn = MagicMock()
@@ -53,6 +81,43 @@ def _mock_conn(rows=None, one=None):
     return conn
 
 
+# ── Хелпер: мок пулу asyncpg ──────────────────────────────────────────────────
+
+class _FakeConn:
+    """З'єднання asyncpg: кожен fetch/fetchval повертає наступний результат з черги."""
+
+    def __init__(self, results=()):
+        self._results = list(results)
+        self.calls = []         # (sql, args) кожного запиту
+
+    async def fetch(self, sql, *args):
+        self.calls.append((sql, args))
+        return self._results.pop(0)
+
+    fetchval = fetch
+
+
+class _FakeDB:
+    """Замість outbound.main.database; fail — БД недоступна."""
+
+    def __init__(self, *results, conn=None, fail=False):
+        self.conn = conn or _FakeConn(results)
+        self.fail = fail
+        self.acquired = 0
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self.fail:
+            raise DatabaseUnavailable('no db')
+        self.acquired += 1
+        yield self.conn
+
+
+def _db(*results, conn=None, fail=False):
+    """patch пулу: результати запитів по черзі (rows для fetch, значення для fetchval)."""
+    return patch.object(outbound.main, 'database', _FakeDB(*results, conn=conn, fail=fail))
+
+
 # ── Автентифікація ────────────────────────────────────────────────────────────
 
 class TestAuth:
@@ -85,20 +150,27 @@ class TestAuth:
         url = '/alarms?from=2026-02-01T00:00:00Z&to=2026-03-01T00:00:00Z'
         assert client.get(url, headers=BADKEY).status_code == 401
 
+    def test_auth_applied_to_sync_ack(self, client):
+        r = client.post('/sync/ack', json={'acked_to': _TS_STR}, headers=BADKEY)
+        assert r.status_code == 401
+
 
 # ── GET /status ───────────────────────────────────────────────────────────────
 
 class TestStatus:
 
-    def _get(self, client, *, one=(None,), port=False, db_fail=False):
+    def _get(self, client, *, one=(None,), port=False, db_fail=False, metrics=None):
         if db_fail:
             cm_connect = patch('outbound.main.psycopg2.connect',
                                side_effect=Exception('db error'))
         else:
             cm_connect = patch('outbound.main.psycopg2.connect',
                                return_value=_mock_conn(one=one))
-        with cm_connect, patch('outbound.main._port_listening', return_value=port):
-            return client.get('/status', headers=AUTH)
+        # /status віддає знімок HealthMonitor — один прохід проб під моками
+        with cm_connect, patch('outbound.main._port_listening', return_value=port), \
+                patch('outbound.main._collector_metrics', return_value=metrics):
+            outbound.main.health.refresh()
+        return client.get('/status', headers=AUTH)
 
     def test_response_has_all_fields(self, client):
         r = self._get(client)
@@ -106,6 +178,7 @@ class TestStatus:
         assert set(r.json()) == {
             'vehicle_id_hint', 'software_version', 'uptime_sec',
             'collector_running', 'agent_running', 'db_ok', 'last_measurement_at',
+            'collector_metrics',
         }
 
     def test_vehicle_id_hint(self, client):
@@ -130,12 +203,71 @@ class TestStatus:
         assert body['collector_running'] is True
         assert body['agent_running'] is True
 
+    def test_collector_metrics_none_when_unavailable(self, client):
+        assert self._get(client).json()['collector_metrics'] is None
+
+    def test_collector_metrics_passthrough(self, client):
+        summary = {'cycles': 10, 'cycle_p95_ms': 12.5, 'db_errors': 0}
+        assert self._get(client, metrics=summary).json()['collector_metrics'] == summary
+
+    def test_status_does_not_probe_per_request(self, client):
+        self._get(client, one=(_TS,), port=True)
+        with patch('outbound.main.psycopg2.connect') as connect, \
+                patch('outbound.main._port_listening') as probe:
+            body = client.get('/status', headers=AUTH).json()
+        connect.assert_not_called()
+        probe.assert_not_called()
+        assert body['db_ok'] is True and body['last_measurement_at'] == _TS_STR
+
     def test_uptime_sec_is_non_negative_int(self, client):
         uptime = self._get(client).json()['uptime_sec']
         assert isinstance(uptime, int)
         assert uptime >= 0
 
 
+class TestHealthMonitor:
+
+    def _probe(self, calls):
+        def probe(scan_db):
+            calls.append(scan_db)
+            out = {'collector_port': False, 'agent_running': True,
+                   'collector_metrics': None, 'db_ok': True}
+            if scan_db:
+                out['last_measurement_at'] = _TS
+            return out
+        return probe
+
+    def test_bus_heartbeat_overrides_db_scan(self):
+        calls = []
+        h = HealthMonitor(self._probe(calls))
+        h.refresh()
+        later = datetime(2026, 2, 22, 10, 31, tzinfo=timezone.utc)
+        h.on_cycle(later)
+        snap = h.snapshot()
+        assert snap['last_measurement_at'] == later and snap['collector_running'] is True
+        # Шина жива — важкий MAX(time) у БД не потрібен
+        assert h._needs_scan(time.monotonic()) is False
+
+    def test_silent_bus_rescans_db_after_interval(self):
+        h = HealthMonitor(self._probe([]), db_scan_interval=60.0)
+        assert h._needs_scan(0.0) is True
+        h.refresh()
+        now = time.monotonic()
+        assert h._needs_scan(now) is False and h._needs_scan(now + 61) is True
+
+    def test_liveness_probe_keeps_scanned_time(self):
+        h = HealthMonitor(self._probe([]))
+        h.refresh(scan_db=True)
+        h.refresh(scan_db=False)
+        assert h.snapshot()['last_measurement_at'] == _TS
+
+    def test_parse_cycle_time_json_and_binary(self):
+        payload = b'{"cycle_time": "2026-02-22T10:30:00.123Z", "readings": []}'
+        assert parse_cycle_time(b'data', payload) == _TS
+        frame = encode_frame(datetime_to_ns(_TS), [{'channel_id': 1, 'value': 1.0}])
+        assert parse_cycle_time(b'bdata', frame) == _TS
+
+
 # ── GET /channels ─────────────────────────────────────────────────────────────
 
 class TestChannels:
@@ -154,13 +286,13 @@ class TestChannels:
     }
 
     def test_returns_list(self, client):
-        with patch('outbound.main.psycopg2.connect', return_value=_mock_conn(rows=[self._ROW])):
+        with _db([self._ROW]):
             r = client.get('/channels', headers=AUTH)
         assert r.status_code == 200
         assert isinstance(r.json(), list)
 
     def test_channel_fields_present(self, client):
-        with patch('outbound.main.psycopg2.connect', return_value=_mock_conn(rows=[self._ROW])):
+        with _db([self._ROW]):
             ch = client.get('/channels', headers=AUTH).json()[0]
         assert ch['channel_id'] == 1
         assert ch['name'] == 'Тиск масла'
@@ -172,11 +304,11 @@ class TestChannels:
         assert ch['updated_at'] == _TS_STR
 
     def test_empty_db_returns_empty_list(self, client):
-        with patch('outbound.main.psycopg2.connect', return_value=_mock_conn(rows=[])):
+        with _db([]):
             assert client.get('/channels', headers=AUTH).json() == []
 
     def test_db_unavailable_returns_503(self, client):
-        with patch('outbound.main.psycopg2.connect', side_effect=Exception('no db')):
+        with _db(fail=True):
             assert client.get('/channels', headers=AUTH).status_code == 503
 
 
@@ -184,25 +316,26 @@ class TestChannels:
 
 class TestDataLatest:
 
+    # asyncpg.Record — кортеж (channel_id, value, time)
     _ROWS = [
-        {'channel_id': 1, 'value': 4.72, 'time': _TS},
-        {'channel_id': 2, 'value': None, 'time': _TS},
+        (1, 4.72, _TS),
+        (2, None, _TS),
     ]
 
     def test_returns_list(self, client):
-        with patch('outbound.main.psycopg2.connect', return_value=_mock_conn(rows=self._ROWS)):
+        with _db(self._ROWS):
             r = client.get('/data/latest', headers=AUTH)
         assert r.status_code == 200
         assert len(r.json()) == 2
 
     def test_value_and_time_formatted(self, client):
-        with patch('outbound.main.psycopg2.connect', return_value=_mock_conn(rows=self._ROWS)):
+        with _db(self._ROWS):
             body = client.get('/data/latest', headers=AUTH).json()
         assert body[0] == {'channel_id': 1, 'value': 4.72,  'time': _TS_STR}
         assert body[1] == {'channel_id': 2, 'value': None,   'time': _TS_STR}
 
     def test_empty_db_returns_empty_list(self, client):
-        with patch('outbound.main.psycopg2.connect', return_value=_mock_conn(rows=[])):
+        with _db([]):
             assert client.get('/data/latest', headers=AUTH).json() == []
 
 
@@ -212,12 +345,12 @@ class TestData:
 
     _URL   = '/data?from=2026-02-22T10:00:00Z&to=2026-02-22T10:05:00Z'
     _ROWS  = [
-        {'channel_id': 1, 'value': 4.72, 'time': _TS},
-        {'channel_id': 2, 'value': 3.10, 'time': _TS},
+        (1, 4.72, _TS),
+        (2, 3.10, _TS),
     ]
 
     def test_valid_request_structure(self, client):
-        with patch('outbound.main.psycopg2.connect', return_value=_mock_conn(rows=self._ROWS)):
+        with _db(self._ROWS):
             r = client.get(self._URL, headers=AUTH)
         assert r.status_code == 200
         body = r.json()
@@ -227,7 +360,7 @@ class TestData:
         assert 'from' in body and 'to' in body
 
     def test_row_fields(self, client):
-        with patch('outbound.main.psycopg2.connect', return_value=_mock_conn(rows=self._ROWS)):
+        with _db(self._ROWS):
             row = client.get(self._URL, headers=AUTH).json()['rows'][0]
         assert row == {'channel_id': 1, 'value': 4.72, 'time': _TS_STR}
 
@@ -249,22 +382,69 @@ class TestData:
 
     def test_truncated_true_when_limit_exceeded(self, client):
         # DB повертає 2 рядки, але limit=1 → truncated
-        with patch('outbound.main.psycopg2.connect', return_value=_mock_conn(rows=self._ROWS)):
+        with _db(self._ROWS):
             body = client.get(self._URL + '&limit=1', headers=AUTH).json()
         assert body['truncated'] is True
         assert body['count'] == 1
         assert len(body['rows']) == 1
 
     def test_channel_id_filter_is_accepted(self, client):
-        with patch('outbound.main.psycopg2.connect', return_value=_mock_conn(rows=self._ROWS[:1])):
+        with _db(self._ROWS[:1]):
             r = client.get(self._URL + '&channel_id=1', headers=AUTH)
         assert r.status_code == 200
 
     def test_db_unavailable_returns_503(self, client):
-        with patch('outbound.main.psycopg2.connect', side_effect=Exception('no db')):
+        with _db(fail=True):
             assert client.get(self._URL, headers=AUTH).status_code == 503
 
 
+# ── /data/latest і /data з кільця циклів колектора ──────────────────────────
+
+class TestRing:
+
+    _URL = '/data?from={}&to={}'
+
+    def _fill(self, path, start_ns):
+        w = RingWriter(path, slots=8, max_channels=4)
+        for i in range(5):
+            w.write(start_ns + i * 10**9,
+                    [{'channel_id': 1, 'value': float(i)}, {'channel_id': 2, 'value': None}],
+                    stored_ids=[1] if i % 2 == 0 else [1, 2])
+        return w
+
+    def test_latest_from_fresh_ring_without_db(self, client, ring_path):
+        self._fill(ring_path, time.time_ns() - 4 * 10**9)
+        with _db(fail=True):
+            body = client.get('/data/latest', headers=AUTH).json()
+        assert [(r['channel_id'], r['value']) for r in body] == [(1, 4.0), (2, None)]
+
+    def test_stale_ring_falls_back_to_db(self, client, ring_path):
+        self._fill(ring_path, time.time_ns() - 3600 * 10**9)
+        with _db([]) as db:
+            assert client.get('/data/latest', headers=AUTH).json() == []
+        assert db.acquired == 1
+
+    def test_data_returns_only_stored_values(self, client, ring_path):
+        start = (time.time_ns() - 4 * 10**9) // 10**6 * 10**6
+        self._fill(ring_path, start)
+        t0 = datetime.fromtimestamp((start + 10**9) / 1e9, timezone.utc)
+        t1 = datetime.fromtimestamp((start + 3 * 10**9) / 1e9, timezone.utc)
+        with _db(fail=True):
+            body = client.get('/data', params={'from': t0.isoformat(), 'to': t1.isoformat()},
+                              headers=AUTH).json()
+        # Цикли 1..2 (from включно, to виключно); null каналу 2 записаний лише в циклі 1
+        assert [(r['channel_id'], r['value']) for r in body['rows']] == \
+            [(1, 1.0), (2, None), (1, 2.0)]
+        assert body['truncated'] is False
+
+    def test_window_older_than_ring_reads_db(self, client, ring_path):
+        self._fill(ring_path, time.time_ns() - 4 * 10**9)
+        with _db([]) as db:
+            r = client.get(TestData._URL, headers=AUTH)
+        assert r.status_code == 200
+        assert db.acquired == 1
+
+
 # ── GET /alarms ───────────────────────────────────────────────────────────────
 
 class TestAlarms:
@@ -282,7 +462,7 @@ class TestAlarms:
     ]
 
     def test_valid_request(self, client):
-        with patch('outbound.main.psycopg2.connect', return_value=_mock_conn(rows=self._ROWS)):
+        with _db(self._ROWS):
             r = client.get(self._URL, headers=AUTH)
         assert r.status_code == 200
         body = r.json()
@@ -303,21 +483,456 @@ class TestAlarms:
         assert r.status_code == 422
 
     def test_unresolved_only_accepted(self, client):
-        with patch('outbound.main.psycopg2.connect', return_value=_mock_conn(rows=[])):
+        with _db([]):
             r = client.get(self._URL + '&unresolved_only=true', headers=AUTH)
         assert r.status_code == 200
 
     def test_severity_null_when_no_rule(self, client):
         """alarm_id без rule_id → severity=null (NULL у JOIN)."""
         row = {**self._ROWS[0], 'severity': None}
-        with patch('outbound.main.psycopg2.connect', return_value=_mock_conn(rows=[row])):
+        with _db([row]):
             alarm = client.get(self._URL, headers=AUTH).json()[0]
         assert alarm['severity'] is None
 
     def test_empty_result(self, client):
-        with patch('outbound.main.psycopg2.connect', return_value=_mock_conn(rows=[])):
+        with _db([]):
             assert client.get(self._URL, headers=AUTH).json() == []
 
     def test_db_unavailable_returns_503(self, client):
-        with patch('outbound.main.psycopg2.connect', side_effect=Exception('no db')):
+        with _db(fail=True):
             assert client.get(self._URL, headers=AUTH).status_code == 503
+
+
+# ── GET /data/agg ─────────────────────────────────────────────────────────────
+
+class TestDataAgg:
+
+    _URL = '/data/agg?from=2026-02-22T10:00:00Z&to=2026-02-22T11:00:00Z&bucket=60'
+
+    def test_rows_per_channel_and_bucket(self, client):
+        conn = _FakeConn([[(1, _TS, 1.0, 5.0, 2.5, 4.0, 60)]])
+        with _db(conn=conn):
+            body = client.get(self._URL, headers=AUTH).json()
+        assert body['bucket_sec'] == 60 and body['truncated'] is False
+        assert body['rows'] == [{'channel_id': 1, 'time': _TS_STR, 'min': 1.0, 'max': 5.0,
+                                 'avg': 2.5, 'last': 4.0, 'samples': 60}]
+        sql, args = conn.calls[0]
+        assert 'date_bin' in sql and args[2] == 60.0
+
+    def test_truncated_on_bucket_boundary(self, client):
+        t1, t2 = _TS, _TS + timedelta(minutes=1)
+        rows = [(i, t1, 0.0, 1.0, 0.5, 1.0, 60) for i in range(999)] + \
+               [(i, t2, 0.0, 1.0, 0.5, 1.0, 60) for i in range(2)]
+        with _db(rows):
+            body = client.get(self._URL + '&limit=1000', headers=AUTH).json()
+        assert body['truncated'] is True and body['count'] == 999
+        assert body['to'] == '2026-02-22T10:31:00.123Z'
+
+    def test_channel_id_filter(self, client):
+        conn = _FakeConn([[]])
+        with _db(conn=conn):
+            client.get(self._URL + '&channel_id=3', headers=AUTH)
+        sql, args = conn.calls[0]
+        assert 'channel_id = $5' in sql and args[4] == 3
+
+    def test_bucket_out_of_range_returns_422(self, client):
+        r = client.get(self._URL.replace('bucket=60', 'bucket=0'), headers=AUTH)
+        assert r.status_code == 422
+
+    def test_from_after_to_returns_400(self, client):
+        r = client.get('/data/agg?from=2026-02-22T11:00:00Z&to=2026-02-22T10:00:00Z',
+                       headers=AUTH)
+        assert r.status_code == 400
+
+
+# ── POST /sync/ack ────────────────────────────────────────────────────────────
+
+class TestSyncAck:
+
+    def _post(self, client, body, stored=_TS):
+        conn = _FakeConn([stored])
+        with _db(conn=conn):
+            return client.post('/sync/ack', json=body, headers=AUTH), conn
+
+    def test_returns_stored_high_water_mark(self, client):
+        r, _ = self._post(client, {'acked_to': _TS_STR})
+        assert r.status_code == 200
+        assert r.json() == {'acked_to': _TS_STR}
+
+    def test_upsert_is_monotonic_and_clamped(self, client):
+        _, conn = self._post(client, {'acked_to': _TS_STR})
+        sql, args = conn.calls[0]
+        assert 'GREATEST(sync_ack.acked_to' in sql
+        assert 'LEAST($1::timestamptz, NOW())' in sql
+        assert args == (_TS,)
+
+    def test_naive_datetime_treated_as_utc(self, client):
+        _, conn = self._post(client, {'acked_to': '2026-02-22T10:30:00.123'})
+        assert conn.calls[0][1] == (_TS,)
+
+    def test_missing_field_returns_422(self, client):
+        r, _ = self._post(client, {})
+        assert r.status_code == 422
+
+    def test_db_unavailable_returns_503(self, client):
+        with _db(fail=True):
+            r = client.post('/sync/ack', json={'acked_to': _TS_STR}, headers=AUTH)
+        assert r.status_code == 503
+
+
+# ── GET /sync ─────────────────────────────────────────────────────────────────
+
+class TestSync:
+
+    _URL = '/sync?since=2026-02-22T10:00:00Z&to=2026-02-22T10:05:00Z'
+    _ALARM = {**TestAlarms._ROWS[0], 'change_seq': 7}
+
+    def _get(self, client, url, *, etag='abc', seq=5, channels=(), data=(), alarms=()):
+        # Порядок запитів _sync: etag, [канали], дані, [MAX(change_seq)], тривоги
+        results = [etag]
+        if f'channels_etag={etag}' not in url:
+            results.append(list(channels))
+        results.append(list(data))
+        if 'alarm_seq=' not in url:
+            results.append(seq)
+        results.append(list(alarms))
+        conn = _FakeConn(results)
+        with _db(conn=conn), \
+                patch('outbound.main._status_body', return_value={'db_ok': True}):
+            r = client.get(url, headers=AUTH)
+        assert r.status_code == 200
+        return r.json(), conn
+
+    def test_combines_all_sections(self, client):
+        body, _ = self._get(client, self._URL, channels=[TestChannels._ROW],
+                            data=TestData._ROWS, alarms=[self._ALARM])
+        assert body['status'] == {'db_ok': True}
+        assert body['channels_etag'] == 'abc'
+        assert body['channels'][0]['name'] == 'Тиск масла'
+        assert [r['channel_id'] for r in body['data']['rows']] == [1, 2]
+        assert body['data']['truncated'] is False
+        assert body['data']['to'] == '2026-02-22T10:05:00.000Z'
+        assert body['alarms'][0]['alarm_id'] == 42
+        # Перший запит без alarm_seq — курсор з MAX(change_seq) до вибірки
+        assert body['alarm_seq'] == 5
+
+    def test_unchanged_etag_skips_channels(self, client):
+        body, conn = self._get(client, self._URL + '&channels_etag=abc')
+        assert body['channels'] is None
+        assert not any('raw_min' in sql for sql, _ in conn.calls)
+
+    def test_alarm_seq_returns_changes_and_advances(self, client):
+        body, conn = self._get(client, self._URL + '&alarm_seq=3', alarms=[self._ALARM])
+        sql, args = conn.calls[-1]
+        assert 'al.change_seq > $1' in sql and args == (3,)
+        assert body['alarm_seq'] == 7
+
+    def test_truncated_data_ends_on_timestamp_boundary(self, client):
+        t1, t2 = _TS, _TS.replace(second=1)
+        rows = [(i, 1.0, t1) for i in range(999)] + [(i, 2.0, t2) for i in range(2)]
+        body, _ = self._get(client, self._URL + '&limit=1000', data=rows)
+        assert body['data']['truncated'] is True
+        assert body['data']['count'] == 999
+        assert body['data']['to'] == '2026-02-22T10:30:01.123Z'
+
+    def test_cut_past_single_oversized_timestamp(self):
+        rows = [{'channel_id': i, 'value': 1.0, 'time': _TS_STR} for i in range(3)]
+        kept, covered = outbound.main._cut_at_time(rows, 2)
+        assert len(kept) == 2 and covered == '2026-02-22T10:30:00.124Z'
+
+    def test_since_after_to_returns_400(self, client):
+        r = client.get('/sync?since=2026-02-22T10:05:00Z&to=2026-02-22T10:00:00Z',
+                       headers=AUTH)
+        assert r.status_code == 400
+
+    def test_requires_auth(self, client):
+        assert client.get(self._URL, headers=BADKEY).status_code == 401
+
+
+# ── Пули запитів і злиття однакових запитів ──────────────────────────────────
+
+class TestLanes:
+
+    def test_single_flight_runs_identical_requests_once(self):
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {'rows': []}
+
+        async def main():
+            sf = SingleFlight()
+            results = await asyncio.gather(*(sf.do('latest', fetch) for _ in range(5)))
+            return sf, results
+
+        sf, results = asyncio.run(main())
+        assert len(calls) == 1 and len(sf) == 0
+        assert all(r is results[0] for r in results)
+
+    def test_serve_refuses_to_share_response(self):
+        async def build():
+            return outbound.main.Response(b'{}')
+
+        with pytest.raises(AssertionError):
+            asyncio.run(outbound.main._serve(Lane('t', workers=1), 'resp', build))
+
+    def test_lane_rejects_beyond_queue(self):
+        async def main():
+            gate = asyncio.Event()
+            lane = Lane('t', workers=1, queue=1)
+            first = asyncio.ensure_future(lane.run(gate.wait))
+            second = asyncio.ensure_future(lane.run(gate.wait))
+            await asyncio.sleep(0)
+            with pytest.raises(Overloaded):
+                await lane.run(gate.wait)
+            gate.set()
+            await asyncio.gather(first, second)
+            return lane
+
+        lane = asyncio.run(main())
+        assert lane.active == 0 and lane.rejected == 1
+
+    def test_overloaded_heavy_lane_returns_503(self, client, monkeypatch):
+        lane = Lane('t', workers=1, queue=0)
+        lane.active = 1
+        monkeypatch.setattr(outbound.main, 'heavy_lane', lane)
+        r = client.get(TestData._URL, headers=AUTH)
+        assert r.status_code == 503
+        assert r.headers['retry-after'] == '5'
+
+    def test_latest_uses_fast_lane_while_heavy_is_full(self, client, monkeypatch):
+        lane = Lane('t', workers=1, queue=0)
+        lane.active = 1
+        monkeypatch.setattr(outbound.main, 'heavy_lane', lane)
+        with _db([]):
+            assert client.get('/data/latest', headers=AUTH).status_code == 200
+
+
+# ── Кеш закритих блоків /data ─────────────────────────────────────────────────
+
+class _RangeConn:
+    """З'єднання-мок, що справді фільтрує рядки за вікном запиту /data ($1, $2, LIMIT $3)."""
+
+    def __init__(self, rows):
+        self._rows = rows
+        self.queries = 0
+
+    async def fetch(self, sql, from_, to, limit):
+        self.queries += 1
+        return [r for r in self._rows if from_ <= r[2] < to][:limit]
+
+
+_T0 = datetime(2026, 2, 22, 10, 0, tzinfo=timezone.utc)
+
+
+class TestBlocks:
+
+    _ROWS = [(ch, float(i), _T0 + timedelta(seconds=20 * i))
+             for i in range(15) for ch in (1, 2)]
+
+    @pytest.fixture
+    def cache(self, tmp_path, monkeypatch):
+        cache = BlockCache(tmp_path / 'blocks', block_sec=60)
+        monkeypatch.setattr(outbound.main, 'blocks', cache)
+        return cache
+
+    def _get(self, client, url, encoding='gzip, deflate'):
+        conn = _RangeConn(self._ROWS)
+        with _db(conn=conn):
+            r = client.get(url, headers={**AUTH, 'Accept-Encoding': encoding})
+        assert r.status_code == 200
+        return r, conn
+
+    def test_split_marks_only_settled_full_blocks(self):
+        t = _T0
+        segments = block_codec.split(t + timedelta(seconds=30), t + timedelta(minutes=3),
+                                     60, settled=t + timedelta(minutes=2))
+        assert [(lo.minute, lo.second, hi.minute, ok) for lo, hi, ok in segments] == \
+            [(0, 30, 1, False), (1, 0, 2, True), (2, 0, 3, False)]
+
+    def test_chunks_concatenate_into_valid_stream(self):
+        parts = [b'{"rows":[', b'1,2', b'', b',3]}']
+        stream = block_codec.zlib_stream([block_codec.deflate_chunk(p, 0) for p in parts])
+        assert zlib.decompress(stream) == b'{"rows":[1,2,3]}'
+
+    def test_same_body_as_uncached_path(self, client, cache, monkeypatch):
+        url = '/data?from=2026-02-22T10:00:30Z&to=2026-02-22T10:03:10Z'
+        cached, _ = self._get(client, url)
+        assert cached.headers['content-encoding'] == 'deflate'
+        monkeypatch.setattr(outbound.main, 'blocks', None)
+        plain, _ = self._get(client, url)
+        assert cached.json() == plain.json()
+        assert cached.json()['count'] == 2 * 8
+        assert len(cache) == 2
+
+    def test_zstd_client_gets_inflated_blocks_recompressed(self, client, cache):
+        pytest.importorskip('zstandard')
+        url = '/data?from=2026-02-22T10:00:30Z&to=2026-02-22T10:03:10Z'
+        deflated, _ = self._get(client, url)
+        r, _ = self._get(client, url, encoding='zstd, gzip, deflate')
+        assert r.headers['content-encoding'] == 'zstd'
+        assert r.json() == deflated.json()
+
+    def test_deflate_q0_not_served_deflate(self, client, cache):
+        url = '/data?from=2026-02-22T10:00:30Z&to=2026-02-22T10:03:10Z'
+        deflated, _ = self._get(client, url)
+        r, _ = self._get(client, url, encoding='gzip, deflate;q=0')
+        assert r.headers.get('content-encoding') != 'deflate'
+        assert r.json() == deflated.json()
+
+    @pytest.mark.parametrize('encoding', ['gzip', 'zstd'])
+    def test_concurrent_identical_requests_each_compressed_once(self, cache, encoding):
+        # SingleFlight віддає спільний результат — middleware не має зіпсувати
+        # відповідь другого запиту, стиснувши заголовки першого
+        if encoding == 'zstd':
+            pytest.importorskip('zstandard')
+        import httpx
+        url = '/data?from=2026-02-22T10:00:30Z&to=2026-02-22T10:03:10Z'
+
+        async def main():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://t') as c:
+                return await asyncio.gather(*(
+                    c.get(url, headers={**AUTH, 'Accept-Encoding': encoding})
+                    for _ in range(2)))
+
+        with _db(conn=_RangeConn(self._ROWS)):
+            first, second = asyncio.run(main())
+        assert first.headers['content-encoding'] == encoding
+        assert second.headers['content-encoding'] == encoding
+        assert first.json() == second.json()
+        assert first.json()['count'] == 2 * 8
+
+    def test_complete_blocks_served_without_db(self, client, cache):
+        url = '/data?from=2026-02-22T10:01:00Z&to=2026-02-22T10:03:00Z'
+        first, conn = self._get(client, url)
+        assert conn.queries == 1
+        with _db(fail=True):
+            again = client.get(url, headers=AUTH)
+        assert again.json() == first.json()
+        assert [r['value'] for r in again.json()['rows']][:4] == [3.0, 3.0, 4.0, 4.0]
+
+    def test_over_limit_falls_back_to_truncated(self, client, cache):
+        r, _ = self._get(client, '/data?from=2026-02-22T10:00:00Z&to=2026-02-22T10:05:00Z'
+                                 '&limit=10')
+        body = r.json()
+        assert body['truncated'] is True and body['count'] == 10
+
+    def test_lru_evicts_oldest_over_budget(self, tmp_path):
+        chunk = block_codec.deflate_chunk(b'x' * 1000, 1)
+        cache = BlockCache(tmp_path, block_sec=60, max_bytes=2 * (len(chunk.data) + 18))
+        for i in range(3):
+            cache.put(_T0 + timedelta(minutes=i), chunk)
+        assert cache.get(_T0 + timedelta(minutes=1)) is not None     # свіжіший за хв. 2
+        cache.put(_T0 + timedelta(minutes=3), chunk)
+        assert len(cache) == 2
+        assert cache.get(_T0) is None and cache.get(_T0 + timedelta(minutes=2)) is None
+        assert cache.get(_T0 + timedelta(minutes=1)) is not None
+
+
+# ── Стиснення zstd / dcz ──────────────────────────────────────────────────────
+
+def _compression_mw() -> compression.CompressionMiddleware:
+    """Екземпляр CompressionMiddleware у зібраному стеку застосунку."""
+    if app.middleware_stack is None:
+        app.middleware_stack = app.build_middleware_stack()
+    node = app.middleware_stack
+    while not isinstance(node, compression.CompressionMiddleware):
+        node = node.app
+    return node
+
+
+class TestCompression:
+
+    _ROWS = [(ch, 1.5 * i, _TS + timedelta(seconds=i)) for i in range(60) for ch in range(1, 4)]
+
+    @pytest.fixture
+    def zstd(self):
+        return pytest.importorskip('zstandard')
+
+    @pytest.fixture
+    def dictionary(self, zstd, monkeypatch):
+        samples = [json.dumps({'rows': [{'channel_id': ch, 'value': i * ch, 'time': _TS_STR}
+                                        for ch in range(1, 19)], 'n': i}).encode()
+                   for i in range(200)]
+        d = compression.make_dictionary(compression.train(samples, 4096))
+        monkeypatch.setattr(outbound.main, 'zstd_dict', d)
+        monkeypatch.setattr(_compression_mw(), 'dictionary', d)
+        return d
+
+    def _get(self, client, headers):
+        with _db(list(self._ROWS)):
+            r = client.get('/data?from=2026-02-22T10:00:00Z&to=2026-02-22T11:00:00Z',
+                           headers={**AUTH, **headers})
+        assert r.status_code == 200
+        return r
+
+    def test_negotiate_prefers_dictionary_then_zstd(self, dictionary):
+        avail = dictionary.available
+        assert compression.negotiate('dcz, zstd, gzip', avail, dictionary) == 'dcz'
+        assert compression.negotiate('dcz, zstd, gzip', ':AAAA:', dictionary) == 'zstd'
+        assert compression.negotiate('dcz, zstd;q=0, gzip', '', dictionary) == 'gzip'
+        assert compression.negotiate('br', avail, dictionary) == 'identity'
+
+    def test_zstd_decoded_by_client(self, client, zstd):
+        r = self._get(client, {'Accept-Encoding': 'zstd, gzip'})
+        assert r.headers['content-encoding'] == 'zstd'
+        assert 'accept-encoding' in r.headers['vary'].lower()
+        assert r.json()['count'] == len(self._ROWS)
+
+    def test_dcz_round_trip(self, client, dictionary):
+        r = self._get(client, {'Accept-Encoding': 'dcz, zstd, gzip',
+                               'Available-Dictionary': dictionary.available})
+        assert r.headers['content-encoding'] == 'dcz'
+        assert 'available-dictionary' in r.headers['vary'].lower()
+        body = compression.decompress(r.content, 'dcz', dictionary)
+        assert json.loads(body)['count'] == len(self._ROWS)
+
+    def test_stale_dictionary_falls_back_to_zstd(self, client, dictionary):
+        r = self._get(client, {'Accept-Encoding': 'dcz, zstd',
+                               'Available-Dictionary': ':c3RhbGU=:'})
+        assert r.headers['content-encoding'] == 'zstd'
+
+    def test_gzip_when_zstd_not_accepted(self, client):
+        r = self._get(client, {'Accept-Encoding': 'gzip'})
+        assert r.headers['content-encoding'] == 'gzip'
+        assert r.json()['count'] == len(self._ROWS)
+
+    def test_zstd_leaves_shared_response_headers_untouched(self, zstd):
+        resp = outbound.main.Response(b'{"x":1}' * 200, media_type='application/json')
+        before = list(resp.raw_headers)
+        mw = compression.CompressionMiddleware(resp, minimum_size=1)
+        scope = {'type': 'http', 'method': 'GET', 'path': '/',
+                 'headers': [(b'accept-encoding', b'zstd')]}
+
+        async def send_twice():
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+
+            for _ in range(2):
+                await mw(scope, None, send)
+            return sent
+
+        sent = asyncio.run(send_twice())
+        assert resp.raw_headers == before
+        bodies = [m['body'] for m in sent if m['type'] == 'http.response.body']
+        assert [compression.decompress(b, 'zstd', None) for b in bodies] == [resp.body] * 2
+
+    def test_small_response_not_compressed(self, client, zstd):
+        with _db([]):
+            r = client.get('/data?from=2026-02-22T10:00:00Z&to=2026-02-22T11:00:00Z',
+                           headers={**AUTH, 'Accept-Encoding': 'zstd'})
+        assert 'content-encoding' not in r.headers
+
+    def test_dictionary_endpoint(self, client, dictionary):
+        r = client.get('/compression/dictionary', headers=AUTH)
+        assert r.status_code == 200
+        assert r.content == dictionary.data
+        assert r.headers['use-as-dictionary'] == 'match="/*"'
+
+    def test_dictionary_endpoint_404_without_dictionary(self, client, monkeypatch):
+        monkeypatch.setattr(outbound.main, 'zstd_dict', None)
+        assert client.get('/compression/dictionary', headers=AUTH).status_code == 404
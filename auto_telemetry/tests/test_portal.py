@@ -0,0 +1,212 @@
+"""
+Тести чистої логіки Portal (portal/fanout.py, portal/history.py, portal/db.py).
+
+Запуск з кореня auto_telemetry/:
+    pytest tests/test_portal.py -v
+
+Не потребує БД (з'єднання — mock), ZeroMQ чи шаблонів (portal/main.py не імпортується).
+"""
+
+import asyncio
+import json
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import psycopg2.pool
+import pytest
+
+from portal.db import ChannelMeta, Database
+from portal.fanout import Broadcaster
+from portal.history import History
+
+
+def _meta(cid):
+    return {'name': f'CH{cid}', 'unit': 'бар'}
+
+
+def _frame(b, c):
+    raw = b.frame_for(c)
+    return None if raw is None else json.loads(raw)
+
+
+class TestBroadcaster:
+
+    def test_first_frame_full_then_delta_of_changed(self):
+        b = Broadcaster(_meta)
+        c = b.subscribe()
+        b.update('T1', [(1, 1.0), (2, 2.0)])
+        f = _frame(b, c)
+        assert f['type'] == 'full' and [r['channel_id'] for r in f['rows']] == [1, 2]
+        b.update('T2', [(1, 1.0), (2, 2.5)])
+        f = _frame(b, c)
+        assert f['type'] == 'delta' and [(r['channel_id'], r['value']) for r in f['rows']] == [(2, 2.5)]
+
+    def test_row_time_is_last_seen_and_frame_carries_cycle_time(self):
+        b = Broadcaster(_meta)
+        c = b.subscribe()
+        b.update('T1', [(1, 1.0), (2, 2.0)])
+        _frame(b, c)
+        b.update('T2', [(1, 1.0)])          # канал 2 не прочитано в цьому циклі
+        f = _frame(b, c)
+        assert f['time'] == 'T2' and f['rows'] == [] and f['seen'] == [1]
+        b.update('T3', [(1, 1.5)])
+        f = _frame(b, c)
+        assert f['rows'][0]['changed'] == 'T3'
+        rows = {r['channel_id']: r for r in json.loads(b.full())['rows']}
+        # Стале значення — свіжий time; канал без показів — time відстає
+        assert (rows[1]['time'], rows[2]['time'], rows[2]['changed']) == ('T3', 'T1', 'T1')
+
+    def test_touch_keeps_changed_time(self):
+        names = {1: 'Тиск'}
+        b = Broadcaster(lambda cid: {'name': names[cid], 'unit': ''})
+        b.update('T1', [(1, 1.0)])
+        names[1] = 'Тиск масла'
+        b.touch(1)
+        b.update('T2', [(1, 1.0)])
+        row = json.loads(b.full())['rows'][0]
+        assert (row['name'], row['time'], row['changed']) == ('Тиск масла', 'T2', 'T1')
+
+    def test_slow_client_skips_cycles_and_gets_full(self):
+        b = Broadcaster(_meta)
+        c = b.subscribe()
+        for i in range(100):
+            b.update(f'T{i}', [(1, float(i))])
+        # Нічого не накопичено — один кадр з останнім станом
+        f = _frame(b, c)
+        assert f['type'] == 'full' and f['seq'] == 100 and f['rows'][0]['value'] == 99.0
+        assert _frame(b, c) is None
+
+    def test_frames_encoded_once_per_cycle(self):
+        b = Broadcaster(_meta)
+        clients = [b.subscribe() for _ in range(3)]
+        b.update('T1', [(1, 1.0)])
+        frames = [b.frame_for(c) for c in clients]
+        assert frames[0] is frames[1] is frames[2]
+        b.update('T2', [(1, 2.0)])
+        frames = [b.frame_for(c) for c in clients]
+        assert frames[0] is frames[1] is frames[2]
+        assert all(c.event.is_set() is False for c in clients)
+
+    def test_touch_sends_renamed_channel(self):
+        names = {1: 'Тиск'}
+        b = Broadcaster(lambda cid: {'name': names[cid], 'unit': ''})
+        c = b.subscribe()
+        b.update('T1', [(1, 1.0)])
+        _frame(b, c)
+        names[1] = 'Тиск масла'
+        b.touch(1)
+        b.update('T2', [(1, 1.0)])
+        assert _frame(b, c)['rows'][0]['name'] == 'Тиск масла'
+
+    def test_unsubscribe(self):
+        b = Broadcaster(_meta)
+        c = b.subscribe()
+        b.unsubscribe(c)
+        assert len(b) == 0
+
+
+class TestHistory:
+
+    def test_ring_keeps_last_samples_in_order(self):
+        h = History(capacity=10)
+        for i in range(25):
+            h.append(float(i), [(1, float(i))])
+        r = h.query([1], seconds=100, points=100)
+        assert r['series'][1]['avg'] == [float(i) for i in range(15, 25)]
+
+    def test_downsample_avg_min_max(self):
+        h = History(capacity=100)
+        for i, v in enumerate([1, 5, 3, 2, 10, 4]):
+            h.append(float(i + 1), [(1, float(v))])
+        # 6 секунд → 2 кошики по 3 с: [1, 5, 3] і [2, 10, 4]
+        s = h.query([1], seconds=6, points=2)['series'][1]
+        assert s['avg'] == [3.0, round(16 / 3, 3)]
+        assert s['min'] == [1.0, 2.0] and s['max'] == [5.0, 10.0]
+
+    def test_nulls_and_unknown_channels_skipped(self):
+        h = History(capacity=10)
+        h.append(1.0, [(1, None), (2, 1.0)])
+        r = h.query([1, 2, 3], seconds=10, points=10)
+        assert r['series'][1]['t'] == [] and 3 not in r['series']
+
+    def test_clock_going_back_resets_ring(self):
+        h = History(capacity=10)
+        for t in (100.0, 101.0, 50.0):
+            h.append(t, [(1, t)])
+        assert h.query([1], seconds=10, points=10)['series'][1]['avg'] == [50.0]
+
+
+class TestChannelMeta:
+
+    def test_full_load_and_unknown_fallback(self):
+        m = ChannelMeta()
+        assert m.apply([(1, 'Тиск', 'бар'), (2, 'Темп', None)]) == {1, 2}
+        assert m.get(2) == {'name': 'Темп', 'unit': ''}
+        assert m.get(9) == {'name': 'CH9', 'unit': ''}
+
+    def test_partial_reload_reports_only_changes(self):
+        m = ChannelMeta()
+        m.apply([(1, 'Тиск', 'бар'), (2, 'Темп', '°C'), (3, 'Рівень', '%')])
+        # Канал 1 без змін, 2 перейменовано, 3 вимкнено (немає серед рядків)
+        changed = m.apply([(1, 'Тиск', 'бар'), (2, 'Темп. масла', '°C')], [1, 2, 3])
+        assert changed == {2, 3}
+        assert m.get(3)['name'] == 'CH3' and len(m) == 2
+
+    def test_full_reload_drops_missing(self):
+        m = ChannelMeta()
+        m.apply([(1, 'A', ''), (2, 'B', '')])
+        assert m.apply([(2, 'B', '')]) == {1}
+
+
+class TestDatabase:
+
+    def test_runs_in_thread_and_reuses_connection(self):
+        pool = MagicMock()
+        conn = pool.getconn.return_value
+        with patch('portal.db.psycopg2.pool.ThreadedConnectionPool', return_value=pool) as cls:
+            database = Database('dsn')
+            assert asyncio.run(database.run(lambda c, x: (c, x), 5)) == (conn, 5)
+            asyncio.run(database.run(lambda c: None))
+        cls.assert_called_once()
+        pool.putconn.assert_called_with(conn)
+
+    def test_failed_query_closes_connection(self):
+        pool = MagicMock()
+        conn = pool.getconn.return_value
+
+        def boom(c):
+            raise RuntimeError('db down')
+
+        with patch('portal.db.psycopg2.pool.ThreadedConnectionPool', return_value=pool):
+            database = Database('dsn')
+            with pytest.raises(RuntimeError):
+                asyncio.run(database.run(boom))
+        pool.putconn.assert_called_once_with(conn, close=True)
+
+    def test_queries_beyond_maxconn_wait_for_connection(self):
+        # ThreadedConnectionPool кидає PoolError, коли видано maxconn з'єднань
+        out, peak, lock = [0], [0], threading.Lock()
+
+        def getconn():
+            with lock:
+                if out[0] >= 4:
+                    raise psycopg2.pool.PoolError('connection pool exhausted')
+                out[0] += 1
+                peak[0] = max(peak[0], out[0])
+            return object()
+
+        def putconn(conn, close=False):
+            with lock:
+                out[0] -= 1
+
+        pool = MagicMock(getconn=getconn, putconn=putconn)
+
+        async def main():
+            return await asyncio.gather(*(database.run(lambda c, i: time.sleep(0.02) or i, i)
+                                          for i in range(12)))
+
+        with patch('portal.db.psycopg2.pool.ThreadedConnectionPool', return_value=pool):
+            database = Database('dsn', maxconn=4)
+            assert asyncio.run(main()) == list(range(12))
+        assert peak[0] == 4 and out[0] == 0
@@ -139,6 +139,24 @@ BEGIN
     );
 END $$;
 
+-- ────────────────────────────────────────────────────────────────────
+-- MEASUREMENTS AGG  (min/max/avg/last по інтервалах — GET /data/agg)
+-- ────────────────────────────────────────────────────────────────────
+-- Sync Service записує агрегати довгого gap, поки повна роздільність
+-- докачується у фоні (sync_backfill); дашборди показують gap одразу.
+CREATE TABLE measurements_agg (
+    vehicle_id  UUID             NOT NULL REFERENCES vehicles (id) ON DELETE CASCADE,
+    channel_id  INTEGER          NOT NULL,
+    time        TIMESTAMPTZ      NOT NULL,       -- початок інтервалу
+    bucket_sec  INTEGER          NOT NULL,
+    min_value   DOUBLE PRECISION NOT NULL,
+    max_value   DOUBLE PRECISION NOT NULL,
+    avg_value   DOUBLE PRECISION NOT NULL,
+    last_value  DOUBLE PRECISION NOT NULL,
+    samples     INTEGER          NOT NULL,
+    PRIMARY KEY (vehicle_id, channel_id, bucket_sec, time)
+);
+
 -- ────────────────────────────────────────────────────────────────────
 -- ALARMS LOG
 -- ────────────────────────────────────────────────────────────────────
@@ -177,6 +195,17 @@ CREATE TABLE sync_journal (
 CREATE INDEX idx_sync_journal_vehicle_time
     ON sync_journal (vehicle_id, started_at DESC);
 
+-- ────────────────────────────────────────────────────────────────────
+-- SYNC BACKFILL  (gap, для якого вже є агрегати, але ще не всі вимірювання)
+-- ────────────────────────────────────────────────────────────────────
+CREATE TABLE sync_backfill (
+    vehicle_id UUID        NOT NULL REFERENCES vehicles (id) ON DELETE CASCADE,
+    from_time  TIMESTAMPTZ NOT NULL,        -- курсор: до цього моменту вже докачано
+    to_time    TIMESTAMPTZ NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (vehicle_id, to_time)
+);
+
 -- ────────────────────────────────────────────────────────────────────
 -- ROW LEVEL SECURITY
 -- ────────────────────────────────────────────────────────────────────
@@ -214,6 +243,22 @@ CREATE POLICY measurements_owner ON measurements
         )
     );
 
+-- measurements_agg: аналогічно
+ALTER TABLE measurements_agg ENABLE ROW LEVEL SECURITY;
+ALTER TABLE measurements_agg FORCE ROW LEVEL SECURITY;
+
+CREATE POLICY measurements_agg_superuser ON measurements_agg
+    USING (current_setting('app.user_role', true) = 'superuser');
+
+CREATE POLICY measurements_agg_owner ON measurements_agg
+    USING (
+        current_setting('app.user_role', true) = 'owner'
+        AND vehicle_id IN (
+            SELECT vehicle_id FROM vehicle_access
+            WHERE user_id = NULLIF(current_setting('app.user_id', true), '')::UUID
+        )
+    );
+
 -- alarms_log: аналогічно
 ALTER TABLE alarms_log ENABLE ROW LEVEL SECURITY;
 ALTER TABLE alarms_log FORCE ROW LEVEL SECURITY;
@@ -0,0 +1,52 @@
+-- Агрегати довгого gap (measurements_agg) і черга докачування (sync_backfill)
+-- для існуючої БД fleet — без них sync падає на кожному авто (v1.7).
+-- Ідемпотентна: docker виконує її й при першому старті після 01_init.sql
+-- (каталог db/ змонтовано в initdb) — там вона нічого не змінює.
+--
+-- Запуск:
+--   psql -U postgres -d fleet -f db/migrate_sync_agg_backfill.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS measurements_agg (
+    vehicle_id  UUID             NOT NULL REFERENCES vehicles (id) ON DELETE CASCADE,
+    channel_id  INTEGER          NOT NULL,
+    time        TIMESTAMPTZ      NOT NULL,       -- початок інтервалу
+    bucket_sec  INTEGER          NOT NULL,
+    min_value   DOUBLE PRECISION NOT NULL,
+    max_value   DOUBLE PRECISION NOT NULL,
+    avg_value   DOUBLE PRECISION NOT NULL,
+    last_value  DOUBLE PRECISION NOT NULL,
+    samples     INTEGER          NOT NULL,
+    PRIMARY KEY (vehicle_id, channel_id, bucket_sec, time)
+);
+
+CREATE TABLE IF NOT EXISTS sync_backfill (
+    vehicle_id UUID        NOT NULL REFERENCES vehicles (id) ON DELETE CASCADE,
+    from_time  TIMESTAMPTZ NOT NULL,        -- курсор: до цього моменту вже докачано
+    to_time    TIMESTAMPTZ NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (vehicle_id, to_time)
+);
+
+-- measurements_agg: RLS як у measurements
+ALTER TABLE measurements_agg ENABLE ROW LEVEL SECURITY;
+ALTER TABLE measurements_agg FORCE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS measurements_agg_superuser ON measurements_agg;
+CREATE POLICY measurements_agg_superuser ON measurements_agg
+    USING (current_setting('app.user_role', true) = 'superuser');
+
+DROP POLICY IF EXISTS measurements_agg_owner ON measurements_agg;
+CREATE POLICY measurements_agg_owner ON measurements_agg
+    USING (
+        current_setting('app.user_role', true) = 'owner'
+        AND vehicle_id IN (
+            SELECT vehicle_id FROM vehicle_access
+            WHERE user_id = NULLIF(current_setting('app.user_id', true), '')::UUID
+        )
+    );
+
+GRANT ALL ON measurements_agg, sync_backfill TO fleet_app;
+
+COMMIT;
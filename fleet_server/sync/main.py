@@ -42,7 +42,11 @@ from writer import (
     update_last_sync_at,
     upsert_channels,
     write_measurements,
+    write_measurements_agg,
     upsert_alarms,
+    start_backfill,
+    get_backfill,
+    advance_backfill,
     write_journal,
 )
 
@@ -61,6 +65,18 @@ SYNC_INTERVAL_SEC = int(os.getenv('SYNC_INTERVAL_SEC', '30'))
 PULL_TIMEOUT_SEC  = float(os.getenv('PULL_TIMEOUT_SEC', '10'))
 PULL_WINDOW_SEC   = int(os.getenv('PULL_WINDOW_SEC', '60'))
 DEFAULT_API_KEY   = os.getenv('VEHICLE_DEFAULT_API_KEY', '')
+# combined — цикл одним GET /sync (авто зі старим ПЗ автоматично → legacy);
+# legacy — окремі /status, /channels, /data, /alarms
+SYNC_MODE         = os.getenv('SYNC_MODE', 'combined')
+# Gap довший за AGG_GAP_SEC (0 — вимкнено): спершу агрегати /data/agg по
+# AGG_BUCKET_SEC за весь gap, повна роздільність — докачуванням у фоні,
+# не більше BACKFILL_KB_PER_CYCLE стиснутих КБ на авто за цикл
+AGG_GAP_SEC          = int(os.getenv('AGG_GAP_SEC', '900'))
+AGG_BUCKET_SEC       = int(os.getenv('AGG_BUCKET_SEC', '60'))
+BACKFILL_KB_PER_CYCLE = int(os.getenv('BACKFILL_KB_PER_CYCLE', '512'))
+
+# Сторінка докачування — вирівняна по 10 хв (закриті хвилини /data на авто кешуються)
+_BACKFILL_STEP_SEC = 600
 
 _DB_DSN = (
     f"host={os.getenv('DB_HOST', 'localhost')} "
@@ -75,6 +91,54 @@ def _build_pool() -> psycopg2.pool.ThreadedConnectionPool:
     return psycopg2.pool.ThreadedConnectionPool(minconn=2, maxconn=20, dsn=_DB_DSN)
 
 
+# Курсори combined-режиму між циклами, по vehicle id. Лише в пам'яті:
+# після рестарту — повний список каналів і тривоги за вікном, як у legacy.
+_channels_etag: dict[str, str] = {}
+_alarm_seq: dict[str, int] = {}
+# Авто, що відповіли 404 на GET /sync — legacy до рестарту сервісу
+_legacy_only: set[str] = set()
+
+
+def _ack_mark(vehicle: dict, committed: datetime) -> datetime:
+    """Позначка для POST /sync/ack: не далі за початок недокачаного gap.
+
+    Інакше retention авто видалить дані, яких на сервері ще немає.
+    """
+    pending = vehicle.get('backfill_from')
+    return min(committed, pending) if pending is not None else committed
+
+
+async def _record_failure(
+    pool: psycopg2.pool.ThreadedConnectionPool,
+    vid: str,
+    started: datetime,
+    status: str,
+    error_msg: str,
+) -> None:
+    """Авто не відповіло: sync_status + sync_journal з помилкою."""
+    await asyncio.to_thread(update_vehicle_error, pool, vid, status)
+    await asyncio.to_thread(
+        write_journal, pool, vid,
+        started, datetime.now(timezone.utc),
+        status, 0, error_msg,
+    )
+
+
+async def _record_done(
+    pool: psycopg2.pool.ThreadedConnectionPool,
+    vid: str,
+    started: datetime,
+    rows_done: int,
+    errors: list[str],
+) -> None:
+    """Цикл пройдено: sync_journal 'ok' або 'error' зі збоями кроків (дані, тривоги)."""
+    await asyncio.to_thread(
+        write_journal, pool, vid,
+        started, datetime.now(timezone.utc),
+        'error' if errors else 'ok', rows_done, '; '.join(errors) or None,
+    )
+
+
 # ── Sync для одного авто ──────────────────────────────────────────────────────
 
 async def sync_vehicle(
@@ -91,29 +155,30 @@ async def sync_vehicle(
 
     started   = datetime.now(timezone.utc)
     rows_done = 0
+    errors: list[str] = []      # збої кроків циклу — у sync_journal замість 'ok'
 
     async with VehiclePuller(vehicle, api_key, PULL_TIMEOUT_SEC) as puller:
 
+        # Довгий gap: агрегати зараз, повна роздільність — у фоні
+        if not await _catch_up_aggregates(vehicle, pool, puller, started):
+            return
+
+        if SYNC_MODE == 'combined' and vid not in _legacy_only:
+            if await _sync_combined(vehicle, pool, puller, started):
+                return
+            _legacy_only.add(vid)
+            log.info('[%s] /sync not supported by vehicle — legacy mode', vname)
+
         # ── 1. GET /status ─────────────────────────────────────────────────────
         try:
             status_data = await puller.pull_status()
         except httpx.TimeoutException:
             log.warning('[%s] timeout on /status', vname)
-            await asyncio.to_thread(update_vehicle_error, pool, vid, 'timeout')
-            await asyncio.to_thread(
-                write_journal, pool, vid,
-                started, datetime.now(timezone.utc),
-                'timeout', 0, 'Request timed out',
-            )
+            await _record_failure(pool, vid, started, 'timeout', 'Request timed out')
             return
         except Exception as exc:
             log.error('[%s] error on /status: %s', vname, exc)
-            await asyncio.to_thread(update_vehicle_error, pool, vid, 'error')
-            await asyncio.to_thread(
-                write_journal, pool, vid,
-                started, datetime.now(timezone.utc),
-                'error', 0, str(exc),
-            )
+            await _record_failure(pool, vid, started, 'error', str(exc))
             return
 
         now = datetime.now(timezone.utc)
@@ -147,9 +212,22 @@ async def sync_vehicle(
             # Оновити last_sync_at навіть якщо рядків не було —
             # щоб наступний цикл не повторював те ж саме вікно
             await asyncio.to_thread(update_last_sync_at, pool, vid, to)
+            data_committed = True
         except Exception as exc:
             log.error('[%s] data sync failed: %s', vname, exc)
+            errors.append(f'data: {exc}')
             # Не оновлюємо last_sync_at — при наступному циклі gap заповниться
+            data_committed = False
+
+        # ── 4a. POST /sync/ack (некритично) ────────────────────────────────────
+        # Тільки після commit last_sync_at: авто може видалити підтверджене
+        if data_committed:
+            try:
+                acked = await puller.ack(_ack_mark(vehicle, to))
+                if acked is None:
+                    log.debug('[%s] /sync/ack not supported by vehicle', vname)
+            except Exception as exc:
+                log.warning('[%s] sync ack failed: %s', vname, exc)
 
         # ── 5. GET /alarms (некритично) ────────────────────────────────────────
         try:
@@ -159,13 +237,247 @@ async def sync_vehicle(
                 log.info('[%s] upserted %d alarms', vname, len(alarms))
         except Exception as exc:
             log.warning('[%s] alarms sync failed: %s', vname, exc)
+            errors.append(f'alarms: {exc}')
+
+        # ── 5a. Докачування gap під бюджет трафіку ────────────────────────────
+        rows_done += await _backfill(vehicle, pool, puller)
 
         # ── 6. sync_journal ────────────────────────────────────────────────────
-        await asyncio.to_thread(
-            write_journal, pool, vid,
-            started, datetime.now(timezone.utc),
-            'ok', rows_done, None,
+        await _record_done(pool, vid, started, rows_done, errors)
+
+
+async def _sync_combined(
+    vehicle: dict,
+    pool: psycopg2.pool.ThreadedConnectionPool,
+    puller: VehiclePuller,
+    started: datetime,
+) -> bool:
+    """Цикл синхронізації через GET /sync — один round trip на вікно.
+
+    Обрізана відповідь покриває вікно до data.to — наступний запит
+    продовжує звідти (канали й тривоги вже не повторюються: курсори
+    оновлені). Повертає False, якщо авто не підтримує /sync (404).
+    """
+    vid   = str(vehicle['id'])
+    vname = vehicle.get('name', vid)
+
+    now = datetime.now(timezone.utc)
+    last_sync: datetime | None = vehicle.get('last_sync_at')
+    from_ = last_sync if last_sync else now - timedelta(seconds=PULL_WINDOW_SEC)
+    since = from_
+    to    = now
+
+    rows_done = 0
+    requests  = 0
+    committed: datetime | None = None
+    errors: list[str] = []
+    while True:
+        try:
+            body = await puller.pull_sync(
+                since, to, _channels_etag.get(vid), _alarm_seq.get(vid))
+        except httpx.TimeoutException:
+            log.warning('[%s] timeout on /sync', vname)
+            if not requests:
+                await _record_failure(pool, vid, started, 'timeout', 'Request timed out')
+                return True
+            errors.append('sync: Request timed out')
+            break
+        except Exception as exc:
+            log.error('[%s] error on /sync: %s', vname, exc)
+            if not requests:
+                await _record_failure(pool, vid, started, 'error', str(exc))
+                return True
+            errors.append(f'sync: {exc}')
+            break
+        if body is None:
+            if not requests:
+                return False
+            break
+        requests += 1
+
+        if requests == 1:
+            status_data = body['status']
+            sw_ver = status_data.get('software_version')
+            await asyncio.to_thread(update_vehicle_seen, pool, vid, now, sw_ver)
+            log.info('[%s] online  sw=%s  db_ok=%s', vname, sw_ver, status_data.get('db_ok'))
+
+        # Канали (некритично): null — ETag не змінився
+        if body['channels'] is not None:
+            try:
+                await asyncio.to_thread(upsert_channels, pool, vid, body['channels'])
+                _channels_etag[vid] = body['channels_etag']
+                log.debug('[%s] channels synced (%d)', vname, len(body['channels']))
+            except Exception as exc:
+                log.warning('[%s] channels sync failed: %s', vname, exc)
+
+        # Дані: last_sync_at — до межі, яку покрила відповідь
+        data    = body['data']
+        covered = datetime.fromisoformat(data['to'].replace('Z', '+00:00'))
+        try:
+            if data['rows']:
+                rows_done += await asyncio.to_thread(
+                    write_measurements, pool, vid, data['rows'])
+            await asyncio.to_thread(update_last_sync_at, pool, vid, covered)
+            committed = covered
+        except Exception as exc:
+            log.error('[%s] data sync failed: %s', vname, exc)
+            errors.append(f'data: {exc}')
+            break
+
+        # Тривоги (некритично): курсор рухається лише після запису
+        try:
+            if body['alarms']:
+                await asyncio.to_thread(upsert_alarms, pool, vid, body['alarms'])
+                log.info('[%s] upserted %d alarms', vname, len(body['alarms']))
+            _alarm_seq[vid] = body['alarm_seq']
+        except Exception as exc:
+            log.warning('[%s] alarms sync failed: %s', vname, exc)
+            errors.append(f'alarms: {exc}')
+
+        if not data['truncated']:
+            break
+        since = covered
+
+    if rows_done:
+        log.info(
+            '[%s] wrote %d measurements  window=%.0fs  requests=%d',
+            vname, rows_done, (to - from_).total_seconds(), requests,
+        )
+
+    rows_done += await _backfill(vehicle, pool, puller)
+
+    # POST /sync/ack (некритично) — тільки після commit last_sync_at
+    if committed is not None:
+        try:
+            if await puller.ack(_ack_mark(vehicle, committed)) is None:
+                log.debug('[%s] /sync/ack not supported by vehicle', vname)
+        except Exception as exc:
+            log.warning('[%s] sync ack failed: %s', vname, exc)
+
+    await _record_done(pool, vid, started, rows_done, errors)
+    return True
+
+
+async def _catch_up_aggregates(
+    vehicle: dict,
+    pool: psycopg2.pool.ThreadedConnectionPool,
+    puller: VehiclePuller,
+    started: datetime,
+) -> bool:
+    """Gap довший за AGG_GAP_SEC: агрегати /data/agg за весь gap одним кроком.
+
+    Сам gap стає в чергу sync_backfill, last_sync_at переноситься на його
+    кінець — звичайний цикл тягне лише свіже вікно. Авто зі старим ПЗ (404)
+    або збій агрегатів — звичайний догін повною роздільністю.
+    Повертає False, якщо авто недоступне (збій уже записано).
+    """
+    vid   = str(vehicle['id'])
+    vname = vehicle.get('name', vid)
+
+    last_sync: datetime | None = vehicle.get('last_sync_at')
+    now = datetime.now(timezone.utc)
+    if not AGG_GAP_SEC or last_sync is None \
+            or (now - last_sync).total_seconds() <= AGG_GAP_SEC:
+        return True
+
+    # Кінець gap — на межі інтервалу агрегатів, останні PULL_WINDOW_SEC — живе вікно
+    end = now - timedelta(seconds=PULL_WINDOW_SEC)
+    end -= timedelta(seconds=end.timestamp() % AGG_BUCKET_SEC)
+    if end <= last_sync:
+        return True
+
+    try:
+        rows = await puller.pull_data_agg(last_sync, end, AGG_BUCKET_SEC)
+    except httpx.TimeoutException:
+        log.warning('[%s] timeout on /data/agg', vname)
+        await _record_failure(pool, vid, started, 'timeout', 'Request timed out')
+        return False
+    except httpx.TransportError as exc:
+        log.error('[%s] error on /data/agg: %s', vname, exc)
+        await _record_failure(pool, vid, started, 'error', str(exc))
+        return False
+    except Exception as exc:
+        log.warning('[%s] /data/agg failed: %s — full-resolution catch-up', vname, exc)
+        return True
+    if rows is None:
+        log.debug('[%s] /data/agg not supported by vehicle', vname)
+        return True
+
+    try:
+        written = await asyncio.to_thread(
+            write_measurements_agg, pool, vid, rows, AGG_BUCKET_SEC)
+        await asyncio.to_thread(start_backfill, pool, vid, last_sync, end)
+    except Exception as exc:
+        log.error('[%s] aggregates write failed: %s', vname, exc)
+        return True
+
+    vehicle['last_sync_at'] = end
+    pending = vehicle.get('backfill_from')
+    vehicle['backfill_from'] = min(pending, last_sync) if pending else last_sync
+    log.info(
+        '[%s] gap %.0fs: wrote %d aggregates (%ds), backfill queued',
+        vname, (end - last_sync).total_seconds(), written, AGG_BUCKET_SEC,
+    )
+    return True
+
+
+async def _backfill(
+    vehicle: dict,
+    pool: psycopg2.pool.ThreadedConnectionPool,
+    puller: VehiclePuller,
+) -> int:
+    """Докачати повну роздільність gap із sync_backfill, найстаріші першими.
+
+    Не більше BACKFILL_KB_PER_CYCLE стиснутих КБ за цикл — решта наступного
+    циклу з курсора. Некритично: збій лише відкладає докачування.
+    Повертає кількість записаних рядків.
+    """
+    vid   = str(vehicle['id'])
+    vname = vehicle.get('name', vid)
+    if vehicle.get('backfill_from') is None:
+        return 0
+
+    budget    = BACKFILL_KB_PER_CYCLE * 1024
+    rows_done = 0
+    pending: dict[datetime, datetime] | None = None     # to_time → курсор
+    try:
+        pending = dict((to, from_) for from_, to in
+                       await asyncio.to_thread(get_backfill, pool, vid))
+        for to, cursor in sorted(pending.items(), key=lambda p: p[1]):
+            while cursor < to and budget > 0:
+                step_end = cursor.timestamp() // _BACKFILL_STEP_SEC * _BACKFILL_STEP_SEC \
+                    + _BACKFILL_STEP_SEC
+                page_to = min(datetime.fromtimestamp(step_end, timezone.utc), to)
+                body, nbytes = await puller.pull_data_page(cursor, page_to)
+                budget -= nbytes
+                rows = body['rows']
+                if rows:
+                    rows_done += await asyncio.to_thread(write_measurements, pool, vid, rows)
+                if body['truncated']:
+                    # Рядки за time ASC: з мітки останнього (повтори — ON CONFLICT)
+                    last = datetime.fromisoformat(rows[-1]['time'].replace('Z', '+00:00'))
+                    cursor = last if last > cursor else cursor + timedelta(milliseconds=1)
+                else:
+                    cursor = page_to
+                await asyncio.to_thread(advance_backfill, pool, vid, to, cursor)
+                pending[to] = cursor
+            if cursor >= to:
+                del pending[to]
+            if budget <= 0:
+                break
+    except Exception as exc:
+        log.warning('[%s] backfill failed: %s', vname, exc)
+
+    # Черга не прочиталась — позначка /sync/ack лишається як була
+    if pending is not None:
+        vehicle['backfill_from'] = min(pending.values(), default=None)
+    if rows_done:
+        log.info(
+            '[%s] backfilled %d measurements  %d KB  pending=%d gap(s)',
+            vname, rows_done, (BACKFILL_KB_PER_CYCLE * 1024 - budget) // 1024,
+            len(pending or ()),
         )
+    return rows_done
 
 
 # ── Головний цикл ─────────────────────────────────────────────────────────────
@@ -208,8 +520,8 @@ async def sync_once(pool: psycopg2.pool.ThreadedConnectionPool) -> None:
 
 async def main() -> None:
     log.info(
-        'Sync service starting  interval=%ds  timeout=%gs  window=%ds',
-        SYNC_INTERVAL_SEC, PULL_TIMEOUT_SEC, PULL_WINDOW_SEC,
+        'Sync service starting  interval=%ds  timeout=%gs  window=%ds  mode=%s',
+        SYNC_INTERVAL_SEC, PULL_TIMEOUT_SEC, PULL_WINDOW_SEC, SYNC_MODE,
     )
     if not DEFAULT_API_KEY:
         log.warning('VEHICLE_DEFAULT_API_KEY is not set — vehicles without api_key will get 401')
@@ -3,16 +3,35 @@ Async HTTP client for pulling telemetry data from one vehicle's Outbound API.
 
 Порт: 8001
 Контракт: DATA_CONTRACT.md (корінь монорепо)
+
+Стиснення (DATA_CONTRACT §9): з пакетом zstandard клієнт приймає zstd
+і dcz — zstd зі словником авто (GET /compression/dictionary, кешується
+до рестарту сервісу); без нього — gzip/deflate як раніше.
 """
 from __future__ import annotations
 
+import base64
+import hashlib
+import json
 import logging
 from datetime import datetime, timedelta, timezone
 
 import httpx
 
+try:
+    import zstandard
+except ImportError:     # без zstandard — лише gzip/deflate
+    zstandard = None
+
 log = logging.getLogger(__name__)
 
+_ACCEPT_ENCODING = 'dcz, zstd, gzip, deflate' if zstandard else 'gzip, deflate'
+# RFC 9842: тіло dcz = магічне число + SHA-256 словника + zstd-кадр
+_DCZ_MAGIC = b'\x5e\x2a\x4d\x18\x20\x00\x00\x00'
+
+# base_url → (SHA-256, словник) або None (авто без словника); спільний для циклів
+_dictionaries: dict[str, tuple[bytes, object] | None] = {}
+
 
 def _iso(dt: datetime) -> str:
     """datetime → ISO8601 UTC рядок з міліскундами."""
@@ -43,10 +62,14 @@ class VehiclePuller:
         base_url = f"http://{vehicle['vpn_ip']}:{vehicle['api_port']}"
         self._client = httpx.AsyncClient(
             base_url=base_url,
-            headers={"X-API-Key": api_key, "Accept-Encoding": "gzip"},
+            headers={"X-API-Key": api_key, "Accept-Encoding": _ACCEPT_ENCODING},
             timeout=timeout,
         )
+        self._base_url = base_url
         self._name = vehicle.get('name', str(vehicle.get('id', '?')))
+        # Словник не отримано (мережа, 401, 503) — до кінця циклу без нього:
+        # без цього кожен _get платив би зайвий запит; наступний цикл — нова спроба
+        self._no_dictionary = False
 
     async def __aenter__(self) -> VehiclePuller:
         return self
@@ -54,19 +77,70 @@ class VehiclePuller:
     async def __aexit__(self, *_) -> None:
         await self._client.aclose()
 
+    # ── Стиснення ─────────────────────────────────────────────────────────────
+
+    async def _dictionary(self) -> tuple[bytes, object] | None:
+        """Словник zstd авто; перший запит — GET /compression/dictionary."""
+        if zstandard is None or self._no_dictionary:
+            return None
+        if self._base_url not in _dictionaries:
+            try:
+                r = await self._client.get('/compression/dictionary')
+            except httpx.TransportError:
+                self._no_dictionary = True
+                return None
+            if r.status_code == 404:
+                _dictionaries[self._base_url] = None
+            elif r.status_code == 200:
+                data = r.content
+                _dictionaries[self._base_url] = (
+                    hashlib.sha256(data).digest(), zstandard.ZstdCompressionDict(data))
+                log.info('[%s] zstd dictionary loaded (%d bytes)', self._name, len(data))
+            else:
+                log.warning('[%s] zstd dictionary: HTTP %d, this cycle without it',
+                            self._name, r.status_code)
+                self._no_dictionary = True
+                return None
+        return _dictionaries[self._base_url]
+
+    async def _get(self, url: str, **kwargs) -> httpx.Response:
+        """GET з Available-Dictionary, якщо словник авто відомий."""
+        dictionary = await self._dictionary()
+        if dictionary is None:
+            return await self._client.get(url, **kwargs)
+        sha = dictionary[0]
+        r = await self._client.get(url, headers={
+            'Available-Dictionary': ':' + base64.b64encode(sha).decode() + ':'}, **kwargs)
+        if r.headers.get('content-encoding') == 'zstd':
+            # Авто не впізнало словник (оновлено) — завантажимо заново
+            _dictionaries.pop(self._base_url, None)
+        return r
+
+    def _json(self, r: httpx.Response):
+        """r.json() з розпакуванням dcz (httpx його не декодує)."""
+        if r.headers.get('content-encoding') != 'dcz':
+            return r.json()
+        dictionary = _dictionaries.get(self._base_url)
+        body = r.content
+        if (dictionary is None or body[:len(_DCZ_MAGIC)] != _DCZ_MAGIC
+                or body[8:40] != dictionary[0]):
+            raise httpx.DecodingError('dcz: unknown dictionary', request=r.request)
+        dctx = zstandard.ZstdDecompressor(dict_data=dictionary[1])
+        return json.loads(dctx.decompressobj().decompress(body[40:]))
+
     # ── Ендпоінти ─────────────────────────────────────────────────────────────
 
     async def pull_status(self) -> dict:
         """GET /status → dict зі станом авто."""
-        r = await self._client.get('/status')
+        r = await self._get('/status')
         r.raise_for_status()
-        return r.json()
+        return self._json(r)
 
     async def pull_channels(self) -> list[dict]:
         """GET /channels → список конфігурацій каналів."""
-        r = await self._client.get('/channels')
+        r = await self._get('/channels')
         r.raise_for_status()
-        return r.json()
+        return self._json(r)
 
     async def pull_data(self, from_: datetime, to: datetime) -> list[dict]:
         """GET /data → всі рядки вимірювань у вікні.
@@ -84,11 +158,11 @@ class VehiclePuller:
     async def _fetch_data_window(
         self, from_: datetime, to: datetime
     ) -> list[dict]:
-        r = await self._client.get(
+        r = await self._get(
             '/data', params={'from': _iso(from_), 'to': _iso(to)}
         )
         r.raise_for_status()
-        body = r.json()
+        body = self._json(r)
         if not body.get('truncated'):
             return body['rows']
 
@@ -102,10 +176,83 @@ class VehiclePuller:
             all_rows.extend(await self._fetch_data_window(wf, wt))
         return all_rows
 
+    async def pull_data_page(
+        self, from_: datetime, to: datetime, limit: int = 50000
+    ) -> tuple[dict, int]:
+        """GET /data одним запитом, без розбиття → (тіло, байтів отримано).
+
+        Для докачування під бюджет трафіку: рахуються стиснуті байти з мережі.
+        truncated=true — продовжувати з мітки часу останнього рядка.
+        """
+        r = await self._get(
+            '/data', params={'from': _iso(from_), 'to': _iso(to), 'limit': limit}
+        )
+        r.raise_for_status()
+        return self._json(r), r.num_bytes_downloaded
+
+    async def pull_data_agg(
+        self, from_: datetime, to: datetime, bucket_sec: int
+    ) -> list[dict] | None:
+        """GET /data/agg → min/max/avg/last по інтервалах bucket_sec за все вікно.
+
+        Обрізана відповідь продовжується з from=data.to. Повертає None
+        якщо ПЗ авто ще не підтримує ендпоінт (404).
+        """
+        all_rows: list[dict] = []
+        while True:
+            r = await self._get('/data/agg', params={
+                'from': _iso(from_), 'to': _iso(to),
+                'bucket': bucket_sec, 'limit': 50000,
+            })
+            if r.status_code == 404:
+                return None
+            r.raise_for_status()
+            body = self._json(r)
+            all_rows.extend(body['rows'])
+            if not body['truncated']:
+                return all_rows
+            from_ = datetime.fromisoformat(body['to'].replace('Z', '+00:00'))
+
     async def pull_alarms(self, from_: datetime, to: datetime) -> list[dict]:
         """GET /alarms → список тривог у вікні."""
-        r = await self._client.get(
+        r = await self._get(
             '/alarms', params={'from': _iso(from_), 'to': _iso(to)}
         )
         r.raise_for_status()
-        return r.json()
+        return self._json(r)
+
+    async def pull_sync(
+        self,
+        since: datetime,
+        to: datetime,
+        channels_etag: str | None = None,
+        alarm_seq: int | None = None,
+    ) -> dict | None:
+        """GET /sync — status, змінені канали, дані й зміни тривог одним запитом.
+
+        Повертає тіло відповіді або None якщо ПЗ авто ще не підтримує
+        ендпоінт (404). Обрізане data (truncated=true) покриває вікно лише
+        до data.to — продовження: наступний pull_sync з since=data.to.
+        """
+        params: dict = {'since': _iso(since), 'to': _iso(to)}
+        if channels_etag is not None:
+            params['channels_etag'] = channels_etag
+        if alarm_seq is not None:
+            params['alarm_seq'] = alarm_seq
+        r = await self._get('/sync', params=params)
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        return self._json(r)
+
+    async def ack(self, acked_to: datetime) -> datetime | None:
+        """POST /sync/ack — дані з time < acked_to надійно записані на сервері.
+
+        Повертає позначку, збережену на авто, або None якщо ПЗ авто
+        ще не підтримує ендпоінт (404).
+        """
+        r = await self._client.post('/sync/ack', json={'acked_to': _iso(acked_to)})
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        return datetime.fromisoformat(r.json()['acked_to'].replace('Z', '+00:00'))
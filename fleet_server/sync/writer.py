@@ -54,7 +54,9 @@ def get_all_vehicles(pool: Pool) -> list[dict]:
         with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
             cur.execute("""
                 SELECT id, name, host(vpn_ip) AS vpn_ip,
-                       api_port, api_key, last_sync_at
+                       api_port, api_key, last_sync_at,
+                       (SELECT MIN(b.from_time) FROM sync_backfill b
+                        WHERE b.vehicle_id = vehicles.id) AS backfill_from
                 FROM vehicles
                 ORDER BY name
             """)
@@ -158,6 +160,49 @@ def write_measurements(pool: Pool, vehicle_id: str, rows: list[dict]) -> int:
     return len(data)
 
 
+def write_measurements_agg(
+    pool: Pool,
+    vehicle_id: str,
+    rows: list[dict],
+    bucket_sec: int,
+) -> int:
+    """Upsert агрегатів GET /data/agg. Повертає кількість рядків.
+
+    Інтервал, отриманий повторно (неповний край gap), перезаписується.
+    """
+    data = [
+        (
+            vehicle_id,
+            r['channel_id'],
+            _parse_dt(r['time']),
+            bucket_sec,
+            r['min'],
+            r['max'],
+            r['avg'],
+            r['last'],
+            r['samples'],
+        )
+        for r in rows
+    ]
+    if not data:
+        return 0
+    with _conn(pool) as conn:
+        with conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO measurements_agg
+                    (vehicle_id, channel_id, time, bucket_sec,
+                     min_value, max_value, avg_value, last_value, samples)
+                VALUES %s
+                ON CONFLICT (vehicle_id, channel_id, bucket_sec, time) DO UPDATE
+                    SET min_value  = EXCLUDED.min_value,
+                        max_value  = EXCLUDED.max_value,
+                        avg_value  = EXCLUDED.avg_value,
+                        last_value = EXCLUDED.last_value,
+                        samples    = EXCLUDED.samples
+            """, data)
+    return len(data)
+
+
 def upsert_alarms(pool: Pool, vehicle_id: str, alarms: list[dict]) -> None:
     """INSERT / UPDATE alarms_log. При повторному отриманні — оновлює resolved_at."""
     if not alarms:
@@ -186,6 +231,55 @@ def upsert_alarms(pool: Pool, vehicle_id: str, alarms: list[dict]) -> None:
             """, data)
 
 
+# ── Докачування gap (sync_backfill) ───────────────────────────────────────────
+
+def start_backfill(pool: Pool, vehicle_id: str, from_: datetime, to: datetime) -> None:
+    """Gap [from_, to) — у чергу докачування, last_sync_at = to (одна транзакція)."""
+    with _conn(pool) as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO sync_backfill (vehicle_id, from_time, to_time)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (vehicle_id, to_time) DO UPDATE
+                    SET from_time = LEAST(sync_backfill.from_time, EXCLUDED.from_time)
+            """, (vehicle_id, from_, to))
+            cur.execute(
+                "UPDATE vehicles SET last_sync_at = %s WHERE id = %s",
+                (to, vehicle_id),
+            )
+
+
+def get_backfill(pool: Pool, vehicle_id: str) -> list[tuple[datetime, datetime]]:
+    """Недокачані gap авто (from_time, to_time), найстаріші першими."""
+    with _conn(pool) as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT from_time, to_time FROM sync_backfill
+                WHERE vehicle_id = %s
+                ORDER BY from_time
+            """, (vehicle_id,))
+            return cur.fetchall()
+
+
+def advance_backfill(pool: Pool, vehicle_id: str, to_time: datetime, cursor: datetime) -> None:
+    """Gap докачано до cursor; повністю докачаний — видаляється."""
+    with _conn(pool) as conn:
+        with conn.cursor() as cur:
+            if cursor >= to_time:
+                cur.execute(
+                    "DELETE FROM sync_backfill WHERE vehicle_id = %s AND to_time = %s",
+                    (vehicle_id, to_time),
+                )
+            else:
+                cur.execute(
+                    "UPDATE sync_backfill SET from_time = %s "
+                    "WHERE vehicle_id = %s AND to_time = %s",
+                    (cursor, vehicle_id, to_time),
+                )
+
+
+# ── Журнал ────────────────────────────────────────────────────────────────────
+
 def write_journal(
     pool: Pool,
     vehicle_id: str,
@@ -12,6 +12,10 @@ from writer import (
     update_vehicle_seen,
     update_last_sync_at,
     write_journal,
+    write_measurements_agg,
+    start_backfill,
+    get_backfill,
+    advance_backfill,
 )
 
 
@@ -149,3 +153,42 @@ def test_write_journal_records_cycle(client, test_vehicle):
             row = cur.fetchone()
     assert row[0] == "ok"
     assert row[1] == 5
+
+
+# ── measurements_agg / sync_backfill ───────────────────────────────────────────
+
+def test_write_measurements_agg_upserts_bucket(client, test_vehicle):
+    pool = _pool()
+    ts = now_utc().replace(second=0, microsecond=0)
+    row = {"channel_id": 1, "time": ts.isoformat(), "min": 1.0, "max": 5.0,
+           "avg": 2.5, "last": 4.0, "samples": 30}
+    write_measurements_agg(pool, test_vehicle, [row], 60)
+    # Той самий інтервал повторно (повний замість неповного краю) — перезапис
+    written = write_measurements_agg(pool, test_vehicle, [{**row, "samples": 60}], 60)
+    assert written == 1
+
+    from database import get_conn
+    with get_conn(user_id="00000000-0000-0000-0000-000000000001", user_role="superuser") as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT count(*), max(samples) FROM measurements_agg WHERE vehicle_id = %s",
+                (test_vehicle,),
+            )
+            row = cur.fetchone()
+    assert row[0] == 1
+    assert row[1] == 60
+
+
+def test_backfill_queue_advances_and_completes(client, test_vehicle):
+    pool = _pool()
+    end = now_utc().replace(microsecond=0)
+    start = end - timedelta(hours=2)
+    start_backfill(pool, test_vehicle, start, end)
+    assert get_backfill(pool, test_vehicle) == [(start, end)]
+
+    mid = start + timedelta(hours=1)
+    advance_backfill(pool, test_vehicle, end, mid)
+    assert get_backfill(pool, test_vehicle) == [(mid, end)]
+
+    advance_backfill(pool, test_vehicle, end, end)
+    assert get_backfill(pool, test_vehicle) == []